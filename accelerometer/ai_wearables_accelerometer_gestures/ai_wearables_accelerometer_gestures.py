@@ -1,5 +1,6 @@
 """ai_wearables_accelerometer_gestures dataset."""
 
+import numpy as np
 import tensorflow as tf
 import tensorflow_datasets as tfds
 
@@ -15,13 +16,39 @@ It should also contain any processing which has been applied (if any),
 _CITATION = """
 """
 
+# number of csv rows parsed at a time, bounds peak memory during `_generate_examples`
+_CHUNK_SIZE = 1024
+
+# records are written in key order (no shuffling), key = user * _USER_STRIDE + csv row, so every
+# user is one contiguous range of records (see `common.splits.load_splits`)
+_USER_STRIDE = 1 << 32
+
+
+def _parse_list_column(column):
+    """parse a column of "[a, b, ...]" strings without calling `eval` on each cell
+
+    returns a flat float32 array of every value in the column and the length of each row,
+    use `np.split(values, np.cumsum(lengths)[:-1])` to recover the per row arrays
+    """
+    column = column.str.strip("[] ")
+
+    lengths = np.where(column.str.len() > 0, column.str.count(",") + 1, 0)
+
+    values = np.fromstring(",".join(column[lengths > 0]), sep=",", dtype=np.float32)
+
+    if values.size != lengths.sum():
+        raise ValueError(f"could not parse column {column.name!r}, malformed list found")
+
+    return values, lengths
+
 
 class AiWearablesAccelerometerGestures(tfds.core.GeneratorBasedBuilder):
     """DatasetBuilder for ai_wearables_accelerometer_gestures dataset."""
 
-    VERSION = tfds.core.Version('1.0.0')
+    VERSION = tfds.core.Version('1.1.0')
     RELEASE_NOTES = {
         '1.0.0': 'Initial release.',
+        '1.1.0': 'Records sorted by user, every user is a contiguous range (shuffle when training).',
     }
 
     def _info(self) -> tfds.core.DatasetInfo:
@@ -41,6 +68,7 @@ class AiWearablesAccelerometerGestures(tfds.core.GeneratorBasedBuilder):
             # features, specify them here. They'll be used if
             # `as_supervised=True` in `builder.as_dataset`.
             supervised_keys=('accel', 'label'),  # Set to `None` to disable
+            disable_shuffling=True,  # keep the records sorted by key (user)
             homepage=None,
             citation=_CITATION,
         )
@@ -58,20 +86,38 @@ class AiWearablesAccelerometerGestures(tfds.core.GeneratorBasedBuilder):
 
     def _generate_examples(self, path):
         """Yields examples."""
-        # TODO(ai_wearables_accelerometer_gestures): Yields (key, example) tuples from the dataset
         
         pd = tfds.core.lazy_imports.pandas
         
-        df = pd.read_table(path, sep=",", converters={'x': eval, 'y': eval, 'z': eval})
+        reader = pd.read_csv(
+            path,
+            sep=",",
+            dtype={'x': str, 'y': str, 'z': str},
+            chunksize=_CHUNK_SIZE,
+        )
         
-        if 'gesture' not in df.columns:
-            df["gesture"] = -1
+        for df in reader:
+            
+            if 'gesture' not in df.columns:
+                df["gesture"] = -1
+            
+            x, lengths = _parse_list_column(df["x"])
+            y, y_lengths = _parse_list_column(df["y"])
+            z, z_lengths = _parse_list_column(df["z"])
+            
+            if not (np.array_equal(lengths, y_lengths) and np.array_equal(lengths, z_lengths)):
+                raise ValueError(f"x, y and z lengths differ in {path}")
             
-        for row in df.itertuples():
+            # (n_samples_in_chunk, 3), then one view per row
+            xyz = np.split(np.stack([x, y, z], axis=1), np.cumsum(lengths)[:-1])
             
-            yield row.Index, {
-                'xyz': [[x,y,z] for x,y,z in zip(row.x, row.y, row.z)],
-                'gesture': row.gesture,
-                'id': row.id,
-                'user': row.user                
-            } 
\ No newline at end of file
+            for key, sample, gesture, id_, user in zip(
+                df.index, xyz, df["gesture"], df["id"], df["user"]
+            ):
+                
+                yield int(user) * _USER_STRIDE + int(key), {
+                    'xyz': sample,
+                    'gesture': gesture,
+                    'id': id_,
+                    'user': user
+                }
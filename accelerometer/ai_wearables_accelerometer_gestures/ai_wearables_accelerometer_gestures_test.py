@@ -1,8 +1,21 @@
 """ai_wearables_accelerometer_gestures dataset."""
 
+import json
+import sys
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
 import tensorflow_datasets as tfds
 from . import ai_wearables_accelerometer_gestures
 
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common import splits
+from common import synthetic
+
 
 class AiWearablesAccelerometerGesturesTest(tfds.testing.DatasetBuilderTestCase):
   """Tests for ai_wearables_accelerometer_gestures dataset."""
@@ -19,6 +32,74 @@ class AiWearablesAccelerometerGesturesTest(tfds.testing.DatasetBuilderTestCase):
   # fake data directory
   # DL_EXTRACT_RESULT = {'some_key': 'output_file1.txt', ...}
 
+  # `download_kaggle_data` returns the dummy_data directory itself
+  # (regenerate it with `common.synthetic`)
+  DL_DOWNLOAD_RESULT = ''
+
+
+class ParseListColumnTest(tf.test.TestCase):
+  """the CSV list cells are parsed without `eval`, the size check catches malformed cells"""
+
+  def test_values_and_lengths(self):
+    column = pd.Series(['[0.5, -1.25, 3.0]', '[2.0]', '[ 1e-3,4 ]'], name='x')
+
+    values, lengths = ai_wearables_accelerometer_gestures._parse_list_column(column)
+
+    self.assertEqual(values.dtype, np.float32)
+    self.assertAllClose(values, [0.5, -1.25, 3.0, 2.0, 1e-3, 4.0])
+    self.assertAllEqual(lengths, [3, 1, 2])
+
+  def test_empty_cell(self):
+    column = pd.Series(['[1.0, 2.0]', '[]', '[3.0]'], name='x')
+
+    values, lengths = ai_wearables_accelerometer_gestures._parse_list_column(column)
+
+    self.assertAllClose(values, [1.0, 2.0, 3.0])
+    self.assertAllEqual(lengths, [2, 0, 1])
+
+  def test_malformed_cell(self):
+    for cell in ['[1.0, abc, 3.0]', '[1.0 2.0, 3.0]']:
+      column = pd.Series(['[0.5, 1.5]', cell], name='y')
+
+      with self.assertRaisesRegex(ValueError, "could not parse column 'y'"):
+        ai_wearables_accelerometer_gestures._parse_list_column(column)
+
+
+class UserOrderTest(tf.test.TestCase):
+  """every user is one contiguous range of records, also across shards"""
+
+  def test_users_are_contiguous(self):
+    root = Path(self.get_temp_dir())
+    synthetic.write_accelerometer_corpus(root / 'corpus', train=140, test=20, users=7)
+
+    with mock.patch.object(
+        tfds.download.DownloadManager, 'download_kaggle_data', lambda self, name: root / 'corpus'
+    ):
+      builder = ai_wearables_accelerometer_gestures.AiWearablesAccelerometerGestures(data_dir=root / 'data')
+      builder.download_and_prepare(download_config=tfds.download.DownloadConfig(num_shards=3))
+
+    self.assertEqual(builder.info.splits['train'].num_shards, 3)
+
+    ds = builder.as_dataset(split='train', shuffle_files=False, read_config=tfds.ReadConfig(interleave_cycle_length=1))
+    users = np.array([example['user'] for example in ds.as_numpy_iterator()])
+    self.assertTrue((np.diff(users) >= 0).all())
+
+    groups = {'train': [0, 1, 2, 3, 4], 'val': [5, 6]}
+    loaded = splits.load_splits(
+        'ai_wearables_accelerometer_gestures', 'train', by='user', groups=groups,
+        data_dir=root / 'data', index_path=root / 'index.json',
+    )
+
+    # one slice per group
+    index = json.loads((root / 'index.json').read_text())['index']
+    self.assertEqual({group: len(ranges) for group, ranges in index.items()}, {'train': 1, 'val': 1})
+
+    for group, members in groups.items():
+      self.assertAllEqual(
+          np.sort([example['user'] for example in loaded[group].as_numpy_iterator()]),
+          np.sort(users[np.isin(users, members)]),
+      )
+
 
 if __name__ == '__main__':
   tfds.testing.test_main()
@@ -0,0 +1,179 @@
+""" leave-users-out k-fold cross validation
+
+the train split is loaded into contiguous numpy arrays once, each fold trains
+in its own worker process on slices of those arrays (no tf.data pipeline per epoch)
+
+    python cross_validation.py
+
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import pandas as pd
+
+import tensorflow_datasets as tfds
+import tensorflow as tf
+
+import ai_wearables_accelerometer_gestures.ai_wearables_accelerometer_gestures
+
+import models
+
+
+MAX_LENGTH = 51
+NUM_CLASSES = 20
+
+
+def load_arrays(ds: tf.data.Dataset, max_length: int = MAX_LENGTH, truncate: bool = False) -> dict:
+    """one pass over `ds`, returns contiguous arrays
+
+    xyz: float32 (n, max_length, 3, 1), zero padded like `train.format(..., max_length=51)`
+    gesture, user, id: (n,)
+
+    gestures longer than `max_length` raise a ValueError, unless `truncate` (their tail is dropped, counted in the log)
+    """
+
+    examples = list(ds.as_numpy_iterator())
+
+    truncated = sum(len(example["xyz"]) > max_length for example in examples)
+    if truncated:
+        if not truncate:
+            raise ValueError(f"{truncated} of {len(examples)} gestures are longer than max_length={max_length}")
+        tf.get_logger().warning(f"truncated {truncated} of {len(examples)} gestures to max_length={max_length}")
+
+    xyz = np.zeros((len(examples), max_length, 3, 1), dtype=np.float32)
+    for i, example in enumerate(examples):
+        xyz[i, : len(example["xyz"]), :, 0] = example["xyz"][:max_length]
+
+    return {
+        "xyz": xyz,
+        "gesture": np.array([example["gesture"] for example in examples], dtype=np.int64),
+        "user": np.array([example["user"] for example in examples], dtype=np.int64),
+        "id": np.array([example["id"] for example in examples], dtype=np.int64),
+    }
+
+
+def leave_users_out(users: np.ndarray, k: int) -> list:
+    """k folds of (held out users, train indices, validation indices), every user is held out once"""
+
+    folds = []
+    for held_out in np.array_split(np.unique(users), k):
+        val = np.isin(users, held_out)
+        folds.append((held_out.tolist(), np.flatnonzero(~val), np.flatnonzero(val)))
+
+    return folds
+
+
+def _limit_threads(threads: int):
+    """worker initializer, cap the threads of each fold so folds do not oversubscribe the cores"""
+
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def train_fold(fold: int, held_out: list, train: tuple, val: tuple, epochs: int, batch_size: int) -> dict:
+    """train a fresh ConvLSTM1D_a on one fold, returns the fold's best validation metrics"""
+
+    x_train, y_train = train
+    x_val, y_val = val
+
+    data_shape = (batch_size,) + x_train.shape[1:]
+
+    model = models.ConvLSTM1D_a(data_shape)
+    model.build_graph(data_shape)
+    model.compile(optimizer="Adam", loss="categorical_crossentropy", metrics=["accuracy"])
+
+    hist = model.fit(
+        x_train,
+        tf.one_hot(y_train, NUM_CLASSES),
+        validation_data=(x_val, tf.one_hot(y_val, NUM_CLASSES)),
+        batch_size=batch_size,
+        epochs=epochs,
+        verbose=0,
+        callbacks=[
+            tf.keras.callbacks.EarlyStopping(
+                monitor="val_loss", min_delta=0.001, patience=20, restore_best_weights=True,
+            ),
+        ],
+    )
+
+    best = int(np.argmin(hist.history["val_loss"]))
+
+    return {
+        "fold": fold,
+        "held_out_users": held_out,
+        "epochs": len(hist.history["val_loss"]),
+        "best_epoch": best + 1,
+        "val_loss": hist.history["val_loss"][best],
+        "val_accuracy": hist.history["val_accuracy"][best],
+        "train_examples": len(x_train),
+        "val_examples": len(x_val),
+    }
+
+
+def cross_validate(arrays: dict, k: int = 7, epochs: int = 400, batch_size: int = 32, workers: int = None) -> pd.DataFrame:
+    """train the k folds in parallel worker processes, returns one row per fold (+ mean & std)
+
+    params:
+        arrays: output of `load_arrays`
+        k: number of folds (users are split into k groups)
+        workers: number of folds trained at once (default: min(k, cpu count))
+    """
+
+    cpus = os.cpu_count() or 1
+    workers = workers or min(k, cpus)
+    threads = max(1, cpus // workers)
+
+    folds = leave_users_out(arrays["user"], k)
+
+    # spawn: forked tensorflow runtimes are not safe
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_limit_threads,
+        initargs=(threads,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                train_fold,
+                fold,
+                held_out,
+                (arrays["xyz"][train], arrays["gesture"][train]),
+                (arrays["xyz"][val], arrays["gesture"][val]),
+                epochs,
+                batch_size,
+            )
+            for fold, (held_out, train, val) in enumerate(folds)
+        ]
+        results = [future.result() for future in futures]
+
+    report = pd.DataFrame(results).set_index("fold")
+    metrics = report[["val_loss", "val_accuracy"]]
+
+    return pd.concat([report, metrics.mean().to_frame("mean").T, metrics.std().to_frame("std").T])
+
+
+def main():
+
+    ds = tfds.load(
+        "ai_wearables_accelerometer_gestures",
+        split="train",
+        data_dir="./data",
+    )
+
+    arrays = load_arrays(ds)
+
+    report = cross_validate(arrays, k=7)
+
+    print(report.to_string())
+    report.to_csv("cross_validation.csv")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,86 @@
+"""tests for cross_validation.py"""
+
+import numpy as np
+import tensorflow as tf
+
+import cross_validation
+
+
+class LeaveUsersOutTest(tf.test.TestCase):
+
+    def test_folds_partition_users_and_examples(self):
+        users = np.random.default_rng(0).integers(0, 7, size=100)
+
+        for k in [2, 3, 7]:
+            folds = cross_validation.leave_users_out(users, k)
+            self.assertLen(folds, k)
+
+            held_out = [set(fold[0]) for fold in folds]
+            for i, a in enumerate(held_out):
+                for b in held_out[i + 1 :]:
+                    self.assertEmpty(a & b)
+            self.assertEqual(set().union(*held_out), set(range(7)))
+
+            # every example is validated exactly once, never in the train indices of its own fold
+            self.assertAllEqual(np.sort(np.concatenate([fold[2] for fold in folds])), np.arange(100))
+            for held, train, val in folds:
+                self.assertLen(np.concatenate([train, val]), 100)
+                self.assertTrue(np.isin(users[val], held).all())
+                self.assertFalse(np.isin(users[train], held).any())
+
+
+def _dataset(lengths):
+    return tf.data.Dataset.from_generator(
+        lambda: (
+            {"xyz": np.full((n, 3), i + 1, dtype=np.float32), "gesture": i, "user": 10 + i, "id": 100 + i}
+            for i, n in enumerate(lengths)
+        ),
+        output_signature={
+            "xyz": tf.TensorSpec((None, 3), tf.float32),
+            "gesture": tf.TensorSpec((), tf.int64),
+            "user": tf.TensorSpec((), tf.int32),
+            "id": tf.TensorSpec((), tf.int32),
+        },
+    )
+
+
+class LoadArraysTest(tf.test.TestCase):
+
+    def test_pads_and_truncates_to_max_length(self):
+        arrays = cross_validation.load_arrays(_dataset([3, 5, 8]), max_length=5, truncate=True)
+
+        self.assertEqual(arrays["xyz"].shape, (3, 5, 3, 1))
+        self.assertEqual(arrays["xyz"].dtype, np.float32)
+        self.assertAllEqual((arrays["xyz"] != 0).all(axis=(2, 3)).sum(axis=1), [3, 5, 5])
+        self.assertAllEqual(arrays["xyz"][:, 0, 0, 0], [1, 2, 3])
+        self.assertAllEqual(arrays["gesture"], [0, 1, 2])
+        self.assertAllEqual(arrays["user"], [10, 11, 12])
+        self.assertAllEqual(arrays["id"], [100, 101, 102])
+
+    def test_longer_gestures_raise(self):
+        with self.assertRaisesRegex(ValueError, "1 of 3"):
+            cross_validation.load_arrays(_dataset([3, 5, 8]), max_length=5)
+
+
+class CrossValidateTest(tf.test.TestCase):
+
+    def test_two_folds_in_worker_processes(self):
+        rng = np.random.default_rng(0)
+        arrays = {
+            "xyz": rng.normal(size=(24, 8, 3, 1)).astype(np.float32),
+            "gesture": rng.integers(0, cross_validation.NUM_CLASSES, size=24),
+            "user": np.repeat(np.arange(4), 6),
+        }
+
+        report = cross_validation.cross_validate(arrays, k=2, epochs=1, batch_size=4, workers=2)
+
+        self.assertEqual(list(report.index), [0, 1, "mean", "std"])
+        self.assertEqual(report.loc[0, "held_out_users"], [0, 1])
+        self.assertEqual(report.loc[1, "held_out_users"], [2, 3])
+        self.assertEqual(report.loc[0, "val_examples"], 12)
+        self.assertEqual(report.loc[0, "epochs"], 1)
+        self.assertTrue(np.isfinite(report.loc["mean", "val_loss"]))
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -1,10 +1,17 @@
 
+import sys
+from pathlib import Path
 from typing import List
 
+import numpy as np
 import pandas as pd
 import tensorflow as tf
 import tensorflow_datasets as tfds
 
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common import splits
+
 def split_ds(
     ds: tf.data.Dataset,
     train: List[int],
@@ -12,40 +19,125 @@ def split_ds(
     test: List[int],
     by: str = "participant",
 ):
-    """return tf.data.Datasets split by attribute"""
-
-    ds_train = ds.filter(lambda x: tf.math.reduce_any(x[by] == train))
-    ds_val = ds.filter(lambda x: tf.math.reduce_any(x[by] == val))
-    ds_test = ds.filter(lambda x: tf.math.reduce_any(x[by] == test))
+    """return tf.data.Datasets split by attribute
 
-    return ds_train, ds_val, ds_test
+    (one hash table lookup per element), to only read each split's own records
+    load it with `common.splits.load_splits(...)` instead
+    """
 
+    split = splits.filter_splits(ds, by, {"train": train, "val": val, "test": test})
 
-def tfds2pd(ds: tf.data.Dataset, ds_info: tfds.core.DatasetInfo) -> pd.DataFrame:
-    """change tf-dataset into pd.Dataframe"""
+    return split["train"], split["val"], split["test"]
 
-    # this returns each gesture as a row (accelerometer & time data columns contain lists)
-    df = tfds.as_dataframe(ds, ds_info=ds_info)
 
-    # so, explode
-    df = df.explode(
-        [f"time_stamps/{f}" for f in ds_info.features["time_stamps"].keys()]
-        + ["accelerometer"]
-    ).reset_index(drop=True)
+def bucket_batch(
+    ds: tf.data.Dataset,
+    batch_size: int,
+    boundaries: tuple = (10, 20, 30, 40, 51),
+    key: str = "xyz",
+) -> tf.data.Dataset:
+    """batch gestures of similar length together, each batch is only padded to its longest gesture
 
-    # and rename some columns
-    df.columns = df.columns.str.replace("time_stamps/", "time_")
+    gestures longer than the last boundary go to the last bucket (no fixed max length)
+    """
 
-    # expand accelerometer data into it's own columns
-    df = pd.concat(
-        [
-            pd.DataFrame(
-                df["accelerometer"].to_numpy().tolist(),
-                columns=["_".join(("accel", s)) for s in ["x", "y", "z"]],
-            ),
-            df.loc[:, df.columns != "accelerometer"],
-        ],
-        axis=1,
+    return ds.bucket_by_sequence_length(
+        lambda x: tf.shape(x[key])[0],
+        bucket_boundaries=list(boundaries),
+        bucket_batch_sizes=[batch_size] * (len(boundaries) + 1),
     )
 
-    return df
+
+def padding_waste(ds: tf.data.Dataset, key: str = "xyz") -> float:
+    """fraction of the time steps of a batched dataset that are (all zero) padding"""
+
+    padded, total = 0, 0
+    for batch in ds.map(lambda x: x[key]).as_numpy_iterator():
+        steps = batch.reshape(batch.shape[0], batch.shape[1], -1)
+        padded += int((~steps.any(axis=-1)).sum())
+        total += steps.shape[0] * steps.shape[1]
+
+    return padded / total
+
+
+def to_columns(ds: tf.data.Dataset) -> dict:
+    """one pass over `ds`, returns long format columns (one row per accelerometer sample)
+
+    id, user, gesture: repeated for every sample of the gesture
+    sample: position of the sample in its gesture
+    x, y, z: float32
+    """
+
+    xyz, lengths, ids, users, gestures = [], [], [], [], []
+    for example in ds.as_numpy_iterator():
+        xyz.append(example["xyz"])
+        lengths.append(len(example["xyz"]))
+        ids.append(example["id"])
+        users.append(example["user"])
+        gestures.append(example["gesture"])
+
+    lengths = np.array(lengths, dtype=np.int64)
+    xyz = np.concatenate(xyz).astype(np.float32) if xyz else np.empty((0, 3), dtype=np.float32)
+
+    # position of each sample in its gesture: 0, 1, ... restarting at each gesture
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    return {
+        "id": np.repeat(np.array(ids, dtype=np.int32), lengths),
+        "user": np.repeat(np.array(users, dtype=np.int32), lengths),
+        "gesture": np.repeat(np.array(gestures, dtype=np.int64), lengths),
+        "sample": np.arange(len(xyz), dtype=np.int32) - starts.astype(np.int32),
+        "x": xyz[:, 0],
+        "y": xyz[:, 1],
+        "z": xyz[:, 2],
+    }
+
+
+def export_columnar(ds: tf.data.Dataset, path) -> Path:
+    """write `ds` as a long format columnar file (see `to_columns`)
+
+    `.parquet` is written as (compressed) parquet, anything else as an uncompressed
+    arrow ipc (feather v2) file that `load_columnar` memory maps
+    """
+    import pyarrow as pa
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    path = Path(path)
+    table = pa.table(to_columns(ds))
+
+    if path.suffix == ".parquet":
+        pyarrow.parquet.write_table(table, path)
+    else:
+        pyarrow.feather.write_feather(table, path, compression="uncompressed")
+
+    return path
+
+
+def load_columnar(path) -> "pyarrow.Table":
+    """load a file written by `export_columnar` as a `pyarrow.Table`
+
+    arrow files are memory mapped, the columns are read from the page cache when accessed
+    (`table["x"].to_numpy()` is zero copy), parquet files are decoded into memory
+
+    `table.to_pandas()` copies every column onto the heap, use
+    `table.to_pandas(split_blocks=True, self_destruct=True)` to free the arrow buffers while converting
+    """
+    import pyarrow as pa
+    import pyarrow.parquet
+
+    path = Path(path)
+
+    if path.suffix == ".parquet":
+        return pyarrow.parquet.read_table(path)
+
+    with pa.memory_map(str(path), "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def tfds2pd(ds: tf.data.Dataset, ds_info: tfds.core.DatasetInfo = None) -> pd.DataFrame:
+    """change tf-dataset into pd.Dataframe, one row per accelerometer sample (see `to_columns`)"""
+
+    df = pd.DataFrame(to_columns(ds))
+
+    return df.rename(columns={c: f"accel_{c}" for c in ["x", "y", "z"]})
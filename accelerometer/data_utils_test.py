@@ -0,0 +1,102 @@
+"""tests for data_utils.py"""
+
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import data_utils
+
+
+def _dataset(lengths=(3, 7, 1, 5), seed=0):
+    rng = np.random.default_rng(seed)
+    examples = [
+        {"xyz": rng.normal(size=(n, 3)).astype(np.float32), "gesture": i % 20, "user": i % 3, "id": 100 + i}
+        for i, n in enumerate(lengths)
+    ]
+
+    ds = tf.data.Dataset.from_generator(
+        lambda: iter(examples),
+        output_signature={
+            "xyz": tf.TensorSpec((None, 3), tf.float32),
+            "gesture": tf.TensorSpec((), tf.int64),
+            "user": tf.TensorSpec((), tf.int32),
+            "id": tf.TensorSpec((), tf.int32),
+        },
+    )
+
+    return ds, examples
+
+
+class ColumnarTest(tf.test.TestCase):
+
+    def test_export_load_roundtrip(self):
+        ds, examples = _dataset()
+
+        for name in ["gestures.arrow", "gestures.parquet"]:
+            table = data_utils.load_columnar(data_utils.export_columnar(ds, Path(self.get_temp_dir()) / name))
+            df = table.to_pandas()
+
+            self.assertEqual(list(df.columns), ["id", "user", "gesture", "sample", "x", "y", "z"])
+            self.assertLen(df, sum(len(example["xyz"]) for example in examples))
+
+            for example, (id_, gesture) in zip(examples, df.groupby("id", sort=False)):
+                self.assertEqual(id_, example["id"])
+                self.assertAllEqual(gesture["sample"], np.arange(len(example["xyz"])))
+                self.assertAllEqual(gesture[["x", "y", "z"]].to_numpy(), example["xyz"])
+                self.assertEqual(set(gesture["gesture"]), {example["gesture"]})
+                self.assertEqual(set(gesture["user"]), {example["user"]})
+
+    def test_columns_are_read_without_copy(self):
+        ds, examples = _dataset()
+        table = data_utils.load_columnar(data_utils.export_columnar(ds, Path(self.get_temp_dir()) / "gestures.arrow"))
+
+        x = np.concatenate([chunk.to_numpy(zero_copy_only=True) for chunk in table["x"].chunks])
+        self.assertAllEqual(x, np.concatenate([example["xyz"][:, 0] for example in examples]))
+
+    def test_empty_dataset(self):
+        ds, _ = _dataset(lengths=())
+        columns = data_utils.to_columns(ds)
+
+        self.assertEqual(set(len(column) for column in columns.values()), {0})
+
+
+class BucketBatchTest(tf.test.TestCase):
+
+    def test_batches_by_length_bucket(self):
+        # boundaries (4, 8): buckets [1, 4), [4, 8), [8, inf)
+        ds, examples = _dataset(lengths=(1, 5, 9, 2, 6, 12, 3))
+
+        batches = list(data_utils.bucket_batch(ds, batch_size=2, boundaries=(4, 8)).as_numpy_iterator())
+
+        self.assertEqual([batch["id"].tolist() for batch in batches], [[100, 103], [101, 104], [102, 105], [106]])
+        self.assertEqual([batch["xyz"].shape for batch in batches], [(2, 2, 3), (2, 6, 3), (2, 12, 3), (1, 3, 3)])
+
+        # each gesture keeps its values, padded with zeros to the longest of its batch
+        for batch in batches:
+            for i, xyz in zip(batch["id"], batch["xyz"]):
+                n = len(examples[i - 100]["xyz"])
+                self.assertAllEqual(xyz[:n], examples[i - 100]["xyz"])
+                self.assertAllEqual(xyz[n:], np.zeros_like(xyz[n:]))
+
+
+class PaddingWasteTest(tf.test.TestCase):
+
+    def test_fraction_of_padded_steps(self):
+        ds, _ = _dataset(lengths=(3, 1, 2, 2))
+
+        # batches (3, 1) -> 2 of 6 steps padded, (2, 2) -> 0 of 4
+        waste = data_utils.padding_waste(ds.padded_batch(2))
+
+        self.assertAllClose(waste, 2 / 10)
+
+    def test_bucketing_reduces_waste(self):
+        ds, _ = _dataset(lengths=(1, 9, 2, 10, 1, 8))
+
+        # (1, 9), (2, 10), (1, 8) vs. (1, 2), (9, 10), (1), (8)
+        self.assertAllClose(data_utils.padding_waste(ds.padded_batch(2)), (8 + 8 + 7) / (18 + 20 + 16))
+        self.assertAllClose(data_utils.padding_waste(data_utils.bucket_batch(ds, 2, boundaries=(4,))), (1 + 1) / (4 + 20 + 1 + 8))
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,248 @@
+""" TFLite export of a trained ConvLSTM1D_a
+
+the trained weights are copied into an unrolled ConvLSTM1D_a with a fixed (1, 51, 3, 1) input
+(the converter can not quantize the recurrent while loop), then converted as
+
+    float32: no quantization
+    float16: float16 weights
+    int8: full integer (int8 weights, activations, input & output), activation ranges are
+        calibrated on a representative dataset drawn from the train users
+
+    python export.py --weights ckpt.weights.h5               # writes tflite/ConvLSTM1D_a_{quantization}.tflite
+    python export.py --weights ckpt.weights.h5 --benchmark   # + latency, size & accuracy drop vs keras
+
+the benchmark runs the interpreter on CPU (one example per inference) over the validation users
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import tensorflow as tf
+
+import ai_wearables_accelerometer_gestures.ai_wearables_accelerometer_gestures
+
+try:
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:  # older installs only ship the interpreter with tensorflow
+    Interpreter = tf.lite.Interpreter
+
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common import splits
+
+import cross_validation
+import models
+
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+
+
+def export_model(model: tf.keras.Model, max_length: int = cross_validation.MAX_LENGTH) -> models.ConvLSTM1D_a:
+    """unrolled copy (without dropout) of a trained ConvLSTM1D_a for a single (max_length, 3, 1) example"""
+
+    shape = (1, max_length, 3, 1)
+
+    exported = models.ConvLSTM1D_a(shape, unroll=True, dropout=0.)
+    exported(tf.zeros(shape))  # build
+    exported.set_weights(model.get_weights())
+
+    return exported
+
+
+def representative_dataset(xyz: np.ndarray, num_examples: int = 200, seed: int = 0):
+    """converter callback yielding `num_examples` random padded train examples, one at a time"""
+
+    rng = np.random.default_rng(seed)
+    indices = rng.choice(len(xyz), size=min(num_examples, len(xyz)), replace=False)
+
+    def generator():
+        for i in indices:
+            yield [xyz[i : i + 1]]
+
+    return generator
+
+
+def convert(model: models.ConvLSTM1D_a, quantization: str, representative=None, max_length: int = cross_validation.MAX_LENGTH) -> bytes:
+    """tflite flatbuffer of an `export_model`
+
+    params:
+        quantization: one of QUANTIZATIONS
+        representative: `representative_dataset(...)`, required for "int8"
+        max_length: time steps of the `export_model`
+    """
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+
+    if quantization == "int8" and representative is None:
+        raise ValueError("full integer quantization needs a representative dataset")
+
+    with tempfile.TemporaryDirectory() as saved_model:
+        # static batch dimension: no dynamic shape ops for the initial recurrent state
+        model.export(saved_model, input_signature=[tf.TensorSpec((1, max_length, 3, 1), tf.float32)], verbose=False)
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model)
+
+        if quantization != "float32":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        if quantization == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+
+        if quantization == "int8":
+            converter.representative_dataset = representative
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+
+        return converter.convert()
+
+
+def export(model: tf.keras.Model, path, xyz: np.ndarray, quantizations=QUANTIZATIONS, num_examples: int = 200) -> dict:
+    """write `path/ConvLSTM1D_a_{quantization}.tflite` for every quantization, returns {quantization: file}
+
+    params:
+        model: trained ConvLSTM1D_a
+        xyz: padded train examples (see `cross_validation.load_arrays`), the representative dataset
+    """
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    exported = export_model(model, xyz.shape[1])
+    representative = representative_dataset(xyz, num_examples)
+
+    files = {}
+    for quantization in quantizations:
+        files[quantization] = path / f"ConvLSTM1D_a_{quantization}.tflite"
+        files[quantization].write_bytes(convert(exported, quantization, representative, xyz.shape[1]))
+
+    return files
+
+
+class TFLiteClassifier:
+    """runs a converted model one example at a time, (de)quantizes int8 inputs & outputs"""
+
+    def __init__(self, model_path, num_threads=1):
+        self.interpreter = Interpreter(model_path=str(model_path), num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+
+    def __call__(self, xyz: np.ndarray) -> np.ndarray:
+        """probabilities of one padded (1, max_length, 3, 1) example"""
+
+        if self.input["dtype"] == np.int8:
+            scale, zero_point = self.input["quantization"]
+            xyz = np.clip(np.round(xyz / scale + zero_point), -128, 127).astype(np.int8)
+
+        self.interpreter.set_tensor(self.input["index"], xyz)
+        self.interpreter.invoke()
+        probabilities = self.interpreter.get_tensor(self.output["index"])
+
+        if self.output["dtype"] == np.int8:
+            scale, zero_point = self.output["quantization"]
+            probabilities = (probabilities.astype(np.float32) - zero_point) * scale
+
+        return probabilities
+
+
+def _latency(predict, xyz):
+    """(predictions, per inference seconds) of `predict` over every example of `xyz`"""
+
+    predict(xyz[:1])  # warm up
+
+    predictions, latencies = [], np.empty(len(xyz))
+    for i in range(len(xyz)):
+        start = time.perf_counter()
+        predictions.append(np.asarray(predict(xyz[i : i + 1])))
+        latencies[i] = time.perf_counter() - start
+
+    return np.argmax(np.concatenate(predictions), axis=-1), latencies
+
+
+def benchmark(model: tf.keras.Model, files: dict, xyz: np.ndarray, gesture: np.ndarray) -> dict:
+    """{"keras" & every quantization: size_kb, latency_ms_p50, latency_ms_p99, accuracy, accuracy_drop, agreement}
+
+    params:
+        files: output of `export`
+        xyz, gesture: labelled padded examples (eg. the validation users)
+    """
+
+    exported = export_model(model, xyz.shape[1])
+    keras_predictions, latencies = _latency(tf.function(lambda x: exported(x, training=False)), xyz)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exported.save_weights(Path(tmp) / "model.weights.h5")
+        keras_size = (Path(tmp) / "model.weights.h5").stat().st_size
+
+    results = {"keras": (keras_size, keras_predictions, latencies)}
+    for quantization, path in files.items():
+        results[quantization] = (Path(path).stat().st_size,) + _latency(TFLiteClassifier(path), xyz)
+
+    keras_accuracy = float(np.mean(keras_predictions == gesture))
+
+    return {
+        name: {
+            "size_kb": size / 1024.,
+            "latency_ms_p50": float(np.percentile(latencies, 50) * 1000),
+            "latency_ms_p99": float(np.percentile(latencies, 99) * 1000),
+            "accuracy": float(np.mean(predictions == gesture)),
+            "accuracy_drop": keras_accuracy - float(np.mean(predictions == gesture)),
+            "agreement": float(np.mean(predictions == keras_predictions)),
+        }
+        for name, (size, predictions, latencies) in results.items()
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="ckpt.weights.h5", help="weights saved by train.py")
+    parser.add_argument("--out", default="tflite")
+    parser.add_argument("--quantizations", nargs="+", choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    parser.add_argument("--representative", type=int, default=200, help="train examples used to calibrate int8")
+    parser.add_argument("--benchmark", action="store_true")
+    args = parser.parse_args()
+
+    # same users as train.py
+    user_splits = splits.load_splits(
+        "ai_wearables_accelerometer_gestures",
+        "train",
+        by="user",
+        groups={"train": [0, 1, 2, 3, 4], "val": [5, 6]},
+        data_dir="./data",
+        index_path="./data/user_splits.json",
+    )
+    train = cross_validation.load_arrays(user_splits["train"])
+
+    model = models.ConvLSTM1D_a((None, None, 3, 1))
+    model(train["xyz"][:1])  # build
+    model.load_weights(args.weights)
+
+    files = export(model, args.out, train["xyz"], args.quantizations, args.representative)
+    for quantization, path in files.items():
+        print(f"{quantization}: {path}")
+
+    if args.benchmark:
+        val = cross_validation.load_arrays(user_splits["val"])
+
+        print(f"{'':>8} {'size KB':>9} {'p50 ms':>8} {'p99 ms':>8} {'accuracy':>9} {'drop':>7} {'agreement':>10}")
+        for name, r in benchmark(model, files, val["xyz"], val["gesture"]).items():
+            print(
+                f"{name:>8} {r['size_kb']:9.0f} {r['latency_ms_p50']:8.2f} {r['latency_ms_p99']:8.2f} "
+                f"{r['accuracy']:9.3f} {r['accuracy_drop']:+7.3f} {r['agreement']:10.1%}"
+            )
+
+
+if __name__ == "__main__":
+
+    main()
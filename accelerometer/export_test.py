@@ -0,0 +1,77 @@
+"""tests for export.py"""
+
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import export
+import models
+
+
+MAX_LENGTH = 16
+
+
+def _model():
+    tf.keras.utils.set_random_seed(0)
+    model = models.ConvLSTM1D_a((None, None, 3, 1))
+    model(np.zeros((1, MAX_LENGTH, 3, 1), dtype=np.float32))  # build
+
+    # spread the logits, an untrained model is close to uniform
+    kernel, bias = model.layer9.get_weights()
+    model.layer9.set_weights([300. * kernel, bias])
+
+    return model
+
+
+def _windows(num=6, seed=0):
+    """padded (num, MAX_LENGTH, 3, 1) examples of different lengths"""
+    rng = np.random.default_rng(seed)
+    xyz = rng.normal(size=(num, MAX_LENGTH, 3, 1)).astype(np.float32)
+    for i, length in enumerate(rng.integers(MAX_LENGTH // 2, MAX_LENGTH + 1, size=num)):
+        xyz[i, length:] = 0.
+    return xyz
+
+
+class TFLiteExportTest(tf.test.TestCase):
+
+    def test_float_models_match_keras(self):
+        model = _model()
+        xyz = _windows()
+
+        files = export.export(model, Path(self.get_temp_dir()), xyz, quantizations=("float32", "float16"))
+        expected = model(xyz, training=False).numpy()
+
+        self.assertGreater(expected.max(axis=-1).min(), 0.2)  # not close to uniform
+        for quantization, atol in [("float32", 1e-5), ("float16", 2e-3)]:
+            classifier = export.TFLiteClassifier(files[quantization])
+            probabilities = np.concatenate([classifier(xyz[i : i + 1]) for i in range(len(xyz))])
+
+            self.assertAllClose(probabilities, expected, atol=atol)
+            self.assertAllEqual(np.argmax(probabilities, axis=-1), np.argmax(expected, axis=-1))
+
+    def test_int8_model_agrees_with_keras(self):
+        model = _model()
+        calibration, xyz = _windows(num=64, seed=1), _windows(num=20, seed=2)
+
+        files = export.export(model, Path(self.get_temp_dir()), calibration, quantizations=("int8",), num_examples=64)
+        expected = model(xyz, training=False).numpy()
+
+        classifier = export.TFLiteClassifier(files["int8"])
+        probabilities = np.concatenate([classifier(xyz[i : i + 1]) for i in range(len(xyz))])
+
+        # quantized activations may flip close calls, but not the bulk of the predictions
+        agreement = np.mean(np.argmax(probabilities, axis=-1) == np.argmax(expected, axis=-1))
+        self.assertGreaterEqual(agreement, 0.8)
+        self.assertLess(np.mean(np.abs(probabilities - expected).sum(axis=-1)), 0.5)
+
+    def test_int8_needs_a_representative_dataset(self):
+        with self.assertRaises(ValueError):
+            export.convert(export.export_model(_model(), MAX_LENGTH), "int8", max_length=MAX_LENGTH)
+
+        with self.assertRaises(ValueError):
+            export.convert(_model(), "int4")
+
+
+if __name__ == "__main__":
+    tf.test.main()
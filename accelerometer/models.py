@@ -1,24 +1,51 @@
 
+import sys
+from pathlib import Path
+
 import tensorflow as tf
 
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common import execution
+
+
+class TimeStepMask(tf.keras.layers.Layer):
+    """returns the (batch, time) mask of the time steps that are not all zeros (padding)"""
+    
+    def call(self, inputs):
+        return tf.reduce_any(tf.not_equal(inputs, 0.), axis=[2, 3])
+
 
-class ConvLSTM1D_a(tf.keras.Model):
+class ConvLSTM1D_a(execution.ExecutionMode, tf.keras.Model):
     
-    def __init__(self, input_shape):
+    def __init__(self, input_shape, mixed_precision=False, jit_compile="auto", unroll=False, dropout=0.4):
+        """
+        params:
+            mixed_precision, jit_compile: execution mode (see `execution.ExecutionMode`)
+            unroll: unroll the recurrence, needs a fixed time axis (eg. TFLite export, see `export.py`)
+            dropout: input dropout of the recurrent layer, 0 for inference only copies (keras advances
+                the dropout seed state even when not training, a variable TFLite delegates can not run)
+        """
         super(ConvLSTM1D_a, self).__init__(name="ConvLSTM1D_a")
 
-        self.layer1 = tf.keras.layers.Bidirectional( tf.keras.layers.ConvLSTM1D(64, (3), dropout=0.4) )
-        self.layer2 = tf.keras.layers.Flatten()
-        self.layer3 = tf.keras.layers.Dense(1024, activation="relu")
-        self.layer4 = tf.keras.layers.Dropout(0.2)
-        self.layer5 = tf.keras.layers.Dense(512, activation="relu")
-        self.layer6 = tf.keras.layers.Dropout(0.2)
-        self.layer7 = tf.keras.layers.Dense(256, activation="relu")
-        self.layer8 = tf.keras.layers.Dropout(0.2)
-        self.layer9 = tf.keras.layers.Dense(20, activation="softmax")
-        
+        self.jit_compile_default = jit_compile
+        dtype = execution.layer_dtype(mixed_precision)
+
+        self.mask = TimeStepMask()
+        self.layer1 = tf.keras.layers.Bidirectional( tf.keras.layers.ConvLSTM1D(64, (3), dropout=dropout, unroll=unroll, dtype=dtype), dtype=dtype )
+        self.layer2 = tf.keras.layers.Flatten(dtype=dtype)
+        self.layer3 = tf.keras.layers.Dense(1024, activation="relu", dtype=dtype)
+        self.layer4 = tf.keras.layers.Dropout(0.2, dtype=dtype)
+        self.layer5 = tf.keras.layers.Dense(512, activation="relu", dtype=dtype)
+        self.layer6 = tf.keras.layers.Dropout(0.2, dtype=dtype)
+        self.layer7 = tf.keras.layers.Dense(256, activation="relu", dtype=dtype)
+        self.layer8 = tf.keras.layers.Dropout(0.2, dtype=dtype)
+        self.layer9 = tf.keras.layers.Dense(20, activation="softmax", dtype="float32")
+
     def call(self, inputs):
-        x = self.layer1(inputs)
+        # padded (all zero) time steps are skipped by the recurrent layer,
+        # so batches may be padded to any length (see `data_utils.bucket_batch`)
+        x = self.layer1(inputs, mask=self.mask(inputs))
         x = self.layer2(x)
         x = self.layer3(x)
         x = self.layer4(x)
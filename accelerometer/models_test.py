@@ -0,0 +1,31 @@
+"""tests for models.py"""
+
+import numpy as np
+import tensorflow as tf
+
+import models
+
+
+class TimeStepMaskTest(tf.test.TestCase):
+
+    def test_masks_all_zero_steps(self):
+        xyz = np.ones((2, 4, 3, 1), dtype=np.float32)
+        xyz[0, 2:] = 0.
+        xyz[1, 1, 0] = 0.  # one zero axis is not padding
+
+        mask = models.TimeStepMask()(xyz)
+
+        self.assertAllEqual(mask, [[True, True, False, False], [True, True, True, True]])
+
+    def test_padding_does_not_change_the_output(self):
+        rng = np.random.default_rng(0)
+        gestures = [rng.normal(size=(n, 3, 1)).astype(np.float32) for n in (5, 9)]
+
+        model = models.ConvLSTM1D_a((2, None, 3, 1), dropout=0.)
+        # unpadded, one gesture per call
+        expected = np.concatenate([model(gesture[np.newaxis]).numpy() for gesture in gestures])
+
+        # padded to the longest gesture of the batch and further
+        for length in (9, 20):
+            padded = np.stack([np.pad(gesture, [(0, length - len(gesture)), (0, 0), (0, 0)]) for gesture in gestures])
+            self.assertAllClose(model(padded), expected, atol=1e-6)
@@ -0,0 +1,256 @@
+""" streaming gesture classification of a continuous xyz stream
+
+a window of `window` samples starts every `hop` samples, every incoming sample advances the
+forward ConvLSTM1D state of all open windows by one step (one batched cell step, no recomputation),
+when a window is complete its backward direction (which needs the whole window) and the dense
+head run once, the window's probabilities are averaged with the last `smoothing` windows
+
+    classifier = StreamingClassifier(model, hop=5, smoothing=3)
+    for chunk in stream:                     # (3,) sample or (n, 3) chunk
+        for decision in classifier.push(chunk):
+            print(decision.sample, decision.gesture, decision.probability)
+
+    python streaming.py --weights ckpt.weights.h5 --hops 1 10   # latency & parity vs full windows
+
+only the forward direction is incremental, the backward direction and the head still run over
+every complete window (about half of a full window's cost), and every sample is one cell step
+call (~0.45 ms, mostly dispatch), so streaming only saves time when windows overlap a lot,
+per sample ms on one CPU core (window 51, untrained model):
+
+    hop          1     5    10    25
+    streaming  5.5   1.5  0.97  0.66
+    recompute  9.3   1.8  0.93  0.37
+
+at hop 10 streaming only breaks even with recomputing every window (the forward half of the work
+is spread over the samples instead of run when the window completes) and above it streaming is slower,
+the default hop is 5, `StreamingClassifier` warns for hops above `MAX_HOP`
+
+"""
+
+import argparse
+import collections
+import os
+import time
+import typing
+import warnings
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_datasets as tfds
+
+import ai_wearables_accelerometer_gestures.ai_wearables_accelerometer_gestures
+
+import cross_validation
+import models
+
+
+# largest hop where streaming is faster than recomputing every window (see the table above)
+MAX_HOP = 5
+
+
+class Decision(typing.NamedTuple):
+    sample: int  # stream index of the window's last sample
+    gesture: int
+    probability: float
+    probabilities: np.ndarray  # smoothed
+
+
+class StreamingClassifier:
+    """sliding window classifier around a trained ConvLSTM1D_a that carries the recurrent state forward
+
+    the model is bidirectional, only its forward direction is carried between samples, the backward
+    direction and the head are recomputed for every complete window, so streaming only saves time
+    over recomputing every window for hops up to `MAX_HOP` (a larger hop warns)
+
+    params:
+        model: trained ConvLSTM1D_a (any batch / time shape)
+        window: samples per window (the training gestures are zero padded to 51)
+        hop: samples between two windows (= between two decisions)
+        smoothing: number of window probabilities averaged per decision (1: no smoothing)
+    """
+
+    def __init__(self, model: models.ConvLSTM1D_a, window: int = cross_validation.MAX_LENGTH, hop: int = MAX_HOP, smoothing: int = 1):
+        if window < 1 or hop < 1 or smoothing < 1:
+            raise ValueError("window, hop and smoothing must be positive")
+        if hop > MAX_HOP:
+            warnings.warn(
+                f"hop {hop} > {MAX_HOP}: streaming is no faster than recomputing every window "
+                "(only the forward direction is incremental)",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+
+        self.model = model
+        self.window = window
+        self.hop = hop
+
+        # every open window has a slot of forward state, a window starts every `hop` samples
+        self.slots = -(-window // hop)
+
+        filters = model.layer1.forward_layer.cell.filters
+        self.h = tf.Variable(tf.zeros((self.slots, 1, filters)), trainable=False)
+        self.c = tf.Variable(tf.zeros((self.slots, 1, filters)), trainable=False)
+
+        self.samples = collections.deque(maxlen=window)
+        self.recent = collections.deque(maxlen=smoothing)
+        self.count = 0
+
+        # seconds spent in `push` per sample
+        self.latencies = []
+
+    def reset(self):
+        """forget the stream (states, buffered samples, smoothing, latencies)"""
+
+        self.h.assign(tf.zeros_like(self.h))
+        self.c.assign(tf.zeros_like(self.c))
+        self.samples.clear()
+        self.recent.clear()
+        self.count = 0
+        self.latencies = []
+
+    @tf.function
+    def _step(self, sample, start):
+        """one forward step of every open window, the window starting at this sample gets a zero state"""
+
+        fresh = tf.reshape(tf.range(self.slots) == start, (-1, 1, 1))
+        h = tf.where(fresh, 0., self.h)
+        c = tf.where(fresh, 0., self.c)
+
+        x = tf.tile(tf.reshape(sample, (1, 3, 1)), (self.slots, 1, 1))
+        _, (new_h, new_c) = self.model.layer1.forward_layer.cell(x, [h, c], training=False)
+
+        # all zero samples are padding for the model (see `models.TimeStepMask`), the state is carried over
+        keep = tf.reduce_any(tf.not_equal(sample, 0.))
+        self.h.assign(tf.where(keep, new_h, h))
+        self.c.assign(tf.where(keep, new_c, c))
+
+    @tf.function
+    def _classify(self, samples, slot):
+        """probabilities of the completed window held in `slot`"""
+
+        xyz = tf.reshape(samples, (1, -1, 3, 1))
+        backward = self.model.layer1.backward_layer(xyz, mask=self.model.mask(xyz), training=False)
+
+        x = tf.concat([self.h[slot : slot + 1], backward], axis=-1)
+        for layer in [self.model.layer2, self.model.layer3, self.model.layer5, self.model.layer7, self.model.layer9]:
+            x = layer(x)  # dropout layers (4, 6, 8) are identity at inference
+
+        return x[0]
+
+    def push(self, samples) -> list:
+        """feed one (3,) sample or a (n, 3) chunk, returns the decisions of the windows completed by it"""
+
+        start = time.perf_counter()
+
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1, 3)
+
+        decisions = []
+        for sample in samples:
+            i = self.count
+
+            starts = i % self.hop == 0
+            self._step(sample, tf.constant((i // self.hop) % self.slots if starts else -1))
+            self.samples.append(sample)
+            self.count += 1
+
+            # the window that started `window - 1` samples ago is complete
+            first = i - self.window + 1
+            if first >= 0 and first % self.hop == 0:
+                probabilities = self._classify(np.stack(self.samples), tf.constant((first // self.hop) % self.slots)).numpy()
+                self.recent.append(probabilities)
+
+                smoothed = np.mean(self.recent, axis=0)
+                gesture = int(np.argmax(smoothed))
+                decisions.append(Decision(i, gesture, float(smoothed[gesture]), smoothed))
+
+        self.latencies.extend([(time.perf_counter() - start) / max(1, len(samples))] * len(samples))
+
+        return decisions
+
+    def latency(self) -> dict:
+        """per sample latency percentiles (ms) of everything pushed so far"""
+
+        latencies = np.asarray(self.latencies) * 1000
+
+        return {
+            "samples": len(latencies),
+            "latency_ms_mean": float(np.mean(latencies)),
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p99": float(np.percentile(latencies, 99)),
+        }
+
+
+def recompute(model: models.ConvLSTM1D_a, stream: np.ndarray, window: int = cross_validation.MAX_LENGTH, hop: int = MAX_HOP) -> tuple:
+    """baseline: run the full model on every window, returns ((windows, classes) probabilities, per sample seconds)"""
+
+    predict = tf.function(lambda x: model(x, training=False))
+    predict(np.zeros((1, window, 3, 1), dtype=np.float32))  # trace
+
+    starts = range(0, len(stream) - window + 1, hop)
+
+    start = time.perf_counter()
+    probabilities = [predict(stream[s : s + window].reshape(1, window, 3, 1))[0].numpy() for s in starts]
+
+    return np.stack(probabilities), (time.perf_counter() - start) / len(stream)
+
+
+def benchmark(model: models.ConvLSTM1D_a, stream: np.ndarray, window: int = cross_validation.MAX_LENGTH, hops=(1, 5, 10, 25), chunk: int = 1) -> dict:
+    """{hop: streaming & recompute per sample latency, max abs difference of the window probabilities}"""
+
+    results = {}
+    for hop in hops:
+        # hops above MAX_HOP are benchmarked on purpose
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            classifier = StreamingClassifier(model, window, hop)
+        classifier.push(np.zeros((window, 3), dtype=np.float32))  # trace
+        classifier.reset()
+
+        decisions = []
+        for i in range(0, len(stream), chunk):
+            decisions.extend(classifier.push(stream[i : i + chunk]))
+
+        expected, seconds = recompute(model, stream, window, hop)
+
+        results[hop] = {
+            **classifier.latency(),
+            "recompute_ms_per_sample": seconds * 1000,
+            "decisions": len(decisions),
+            "max_abs_diff": float(np.max(np.abs(np.stack([d.probabilities for d in decisions]) - expected))),
+        }
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", help="weights saved by train.py (default: untrained model)")
+    parser.add_argument("--hops", type=int, nargs="+", default=[1, 5, 10, 25])
+    parser.add_argument("--chunk", type=int, default=1, help="samples per push")
+    parser.add_argument("--gestures", type=int, default=20, help="train gestures concatenated into the stream")
+    args = parser.parse_args()
+
+    # continuous stream: train gestures back to back
+    ds = tfds.load("ai_wearables_accelerometer_gestures", split="train", data_dir="./data")
+    stream = np.concatenate([example["xyz"] for example in ds.take(args.gestures).as_numpy_iterator()]).astype(np.float32)
+
+    model = models.ConvLSTM1D_a((None, None, 3, 1))
+    model(np.zeros((1, cross_validation.MAX_LENGTH, 3, 1), dtype=np.float32))  # build
+    if args.weights:
+        model.load_weights(args.weights)
+
+    print(f"stream of {len(stream)} samples, window {cross_validation.MAX_LENGTH}, chunk {args.chunk}")
+    print(f"{'hop':>4} {'decisions':>10} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'recompute ms':>13} {'max diff':>9}")
+    for hop, r in benchmark(model, stream, hops=args.hops, chunk=args.chunk).items():
+        print(
+            f"{hop:>4} {r['decisions']:>10} {r['latency_ms_mean']:8.3f} {r['latency_ms_p50']:8.3f} "
+            f"{r['latency_ms_p99']:8.3f} {r['recompute_ms_per_sample']:13.3f} {r['max_abs_diff']:9.2e}"
+        )
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,88 @@
+"""tests for streaming.py"""
+
+import numpy as np
+import tensorflow as tf
+
+import models
+import streaming
+
+
+WINDOW = 20
+
+
+def _model():
+    tf.keras.utils.set_random_seed(0)
+    model = models.ConvLSTM1D_a((None, None, 3, 1))
+    model(np.zeros((1, WINDOW, 3, 1), dtype=np.float32))  # build
+    return model
+
+
+def _stream(samples=75, seed=0):
+    return np.random.default_rng(seed).normal(size=(samples, 3)).astype(np.float32)
+
+
+def _push(classifier, stream, chunk=1):
+    decisions = []
+    for i in range(0, len(stream), chunk):
+        decisions.extend(classifier.push(stream[i : i + chunk]))
+    return decisions
+
+
+class StreamingClassifierTest(tf.test.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model = _model()
+
+    def test_streamed_windows_match_a_full_recompute(self):
+        stream = _stream()
+        stream[30:34] = 0.  # padding (masked) samples inside some windows
+
+        for hop in [1, 7, WINDOW, 30]:  # overlapping, exact, gaps between windows
+            decisions = _push(streaming.StreamingClassifier(self.model, WINDOW, hop), stream)
+            expected, _ = streaming.recompute(self.model, stream, WINDOW, hop)
+
+            self.assertEqual([d.sample for d in decisions], list(range(WINDOW - 1, len(stream), hop)))
+            self.assertAllClose(np.stack([d.probabilities for d in decisions]), expected, atol=1e-5)
+
+    def test_no_decision_before_the_first_window_is_complete(self):
+        classifier = streaming.StreamingClassifier(self.model, WINDOW, hop=5)
+
+        self.assertEqual(classifier.push(_stream(WINDOW - 1)), [])
+        self.assertLen(classifier.push(_stream(1, seed=1)), 1)
+
+    def test_chunks_and_reset(self):
+        stream = _stream()
+        classifier = streaming.StreamingClassifier(self.model, WINDOW, hop=4)
+
+        samples = _push(classifier, stream)
+        classifier.reset()
+        chunks = _push(classifier, stream, chunk=9)
+
+        self.assertEqual([d.sample for d in chunks], [d.sample for d in samples])
+        self.assertAllClose([d.probabilities for d in chunks], [d.probabilities for d in samples], atol=1e-6)
+        self.assertEqual(classifier.latency()["samples"], len(stream))
+
+    def test_smoothing_averages_the_last_windows(self):
+        stream = _stream()
+        single = _push(streaming.StreamingClassifier(self.model, WINDOW, hop=5), stream)
+        smoothed = _push(streaming.StreamingClassifier(self.model, WINDOW, hop=5, smoothing=3), stream)
+
+        probabilities = np.stack([d.probabilities for d in single])
+        self.assertAllClose(smoothed[0].probabilities, probabilities[0], atol=1e-6)
+        self.assertAllClose(smoothed[4].probabilities, probabilities[2:5].mean(axis=0), atol=1e-6)
+        self.assertEqual(smoothed[4].gesture, int(np.argmax(smoothed[4].probabilities)))
+
+    def test_warns_above_max_hop(self):
+        with self.assertWarns(RuntimeWarning):
+            streaming.StreamingClassifier(self.model, WINDOW, hop=streaming.MAX_HOP + 1)
+
+    def test_invalid_parameters(self):
+        for kwargs in [{"window": 0}, {"hop": 0}, {"smoothing": 0}]:
+            with self.assertRaises(ValueError):
+                streaming.StreamingClassifier(self.model, **kwargs)
+
+
+if __name__ == "__main__":
+    tf.test.main()
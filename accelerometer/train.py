@@ -2,6 +2,7 @@
 import functools
 import os
 import logging
+import sys
 from pathlib import Path
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1' 
@@ -14,17 +15,34 @@ import tensorflow as tf
 
 import ai_wearables_accelerometer_gestures.ai_wearables_accelerometer_gestures
 
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common import inference
+from common import splits
+from common import step_timing
+
 import data_utils
 import models
 
 
-def format(example):
+# execution mode, see `common/execution_benchmark.py` for step times & accuracy parity on this machine
+MIXED_PRECISION = False  # bfloat16 compute (softmax stays float32)
+JIT_COMPILE = "auto"  # True: XLA, "auto": XLA on GPU only
+
+# number of train batches the padding waste report is computed over (before fit)
+PADDING_REPORT_BATCHES = 64
+
+
+def format(example, max_length=None):
     
     xyz = example["xyz"]
     gesture = example["gesture"]
     
-    # pad with zeros to max length (51)
-    xyz = tf.expand_dims(tf.pad(xyz, [[0, 51-tf.shape(xyz)[0]], [0,0]]), -1)
+    # pad with zeros to max length (eg. 51), otherwise batches are padded by `data_utils.bucket_batch`
+    if max_length is not None:
+        xyz = tf.pad(xyz, [[0, max_length-tf.shape(xyz)[0]], [0,0]])
+    
+    xyz = tf.expand_dims(xyz, -1)
     # one hot encode gesture label (20 classes)
     gesture = tf.one_hot(gesture, 20)
     
@@ -43,31 +61,55 @@ def main():
         as_supervised=False,  # set True to only return (xyz, gesture) tuple
     )
     
-    train_ds = ds["train"]
     test_ds = ds["test"]
     
     batch_size = 32
     
-    # create validation set
-    train = train_ds.filter(lambda x: tf.math.reduce_any(x["user"] == [0,1,2,3,4]))
-    val = train_ds.filter((lambda x: tf.math.reduce_any(x["user"] == [5,6])))
+    # create validation set (records are sorted by user, each split only reads its own slice)
+    user_splits = splits.load_splits(
+        "ai_wearables_accelerometer_gestures",
+        "train",
+        by="user",
+        groups={"train": [0, 1, 2, 3, 4], "val": [5, 6]},
+        data_dir="./data",
+        index_path="./data/user_splits.json",
+    )
+    # stored in user order, the shuffle buffer holds the whole split so every batch mixes all users
+    train = user_splits["train"]
+    num_train = int(train.cardinality())
+    if num_train < 0:  # groups read with a filter
+        num_train = int(train.reduce(0, lambda count, _: count + 1))
+    train = train.shuffle(num_train, reshuffle_each_iteration=True)
+    val = user_splits["val"]
+    
+    # gestures of similar length are batched together (padded steps are masked in the model)
+    sample = train.take(PADDING_REPORT_BATCHES * batch_size)
+    print(
+        f"padding waste (fraction of padded time steps, {PADDING_REPORT_BATCHES} train batches): "
+        f"fixed length 51={data_utils.padding_waste(sample.map(functools.partial(format, max_length=51)).batch(batch_size)):.1%}, "
+        f"bucketed={data_utils.padding_waste(data_utils.bucket_batch(sample.map(format), batch_size)):.1%}"
+    )
+    
+    # time blocked on input vs. in the train step, per stage latencies (step_timing.jsonl)
+    stats = step_timing.PipelineStats()
     
-    train = train.map(format).batch(batch_size)
-    train = train.map(lambda x: (x["xyz"], x["gesture"]))
+    train = data_utils.bucket_batch(stats.map(train, format, "format"), batch_size)
+    train = stats.deliver(train.map(lambda x: (x["xyz"], x["gesture"])))
     
-    val = val.map(format).batch(batch_size)
+    val = data_utils.bucket_batch(val.map(format), batch_size)
     val = val.map(lambda x: (x["xyz"], x["gesture"]))
 
     # only format data, don't create tuple
-    test = test_ds.map(format).batch(batch_size)
+    test = data_utils.bucket_batch(test_ds.map(format), batch_size)
     
-    data_shape = (batch_size, 51, 3, 1)
+    # variable length time axis
+    data_shape = (batch_size, None, 3, 1)
     
     # for elem in val.as_numpy_iterator():
     #     print(elem[0].shape)
     #     break
     
-    model = models.ConvLSTM1D_a(data_shape)
+    model = models.ConvLSTM1D_a(data_shape, mixed_precision=MIXED_PRECISION, jit_compile=JIT_COMPILE)
     model.build_graph(data_shape)
     model.compile(optimizer="Adam", loss="categorical_crossentropy", metrics=["accuracy"])
     
@@ -89,7 +131,7 @@ def main():
             ),
             ## Save checkpoints ##
             tf.keras.callbacks.ModelCheckpoint(
-                Path.cwd() / "ckpt",  # file path/name to save the model
+                Path.cwd() / "ckpt.weights.h5",  # file path/name to save the model (weights only, see `export.py`)
                 monitor="val_loss",
                 verbose=0,
                 save_best_only=True,
@@ -97,18 +139,13 @@ def main():
                 mode="auto",
                 save_freq="epoch",  # If save_freq is an integer, it will save after n batches (not epochs)
             ),
-            tf.keras.callbacks.TensorBoard()
+            tf.keras.callbacks.TensorBoard(),
+            step_timing.StepTimer(stats, Path.cwd() / "step_timing.jsonl"),
         ],
     )
     
-    with open('submission_accel.csv', "w") as f:
-        f.write("id,gesture\n")
-
-        for batch in test.as_numpy_iterator():
-            results = model.predict(batch["xyz"])
-            
-            for example, result in zip(batch["id"], results):               
-                f.write(f"{example},{np.argmax(result)}\n")
+    # test set is unlabeled (gesture == -1), only write the submission
+    inference.run(model, test, inputs="xyz", num_classes=20, submission="submission_accel.csv")
         
 
 if __name__ == "__main__":
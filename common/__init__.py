@@ -0,0 +1 @@
+"""code shared by the accelerometer and video trainers"""
@@ -0,0 +1,120 @@
+""" build time scaling benchmark for both tfds builders
+
+writes synthetic corpora (see `synthetic.py`) at 1x / 10x / 100x the base size and times
+`download_and_prepare` on each, every build runs in a fresh process so peak RSS is per build
+
+    python -m common.build_benchmark                     # from the repo root
+    python -m common.build_benchmark --scales 1 10 --dataset accelerometer
+
+"""
+
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# base corpus (scale 1)
+VIDEO_CLIPS = {"train": 12, "validation": 6, "test": 6}
+ACCELEROMETER_GESTURES = {"train": 140, "test": 60}
+
+
+def _build(dataset, corpus, data_dir):
+    """runs in a spawned process: prepare one builder on `corpus`, returns (seconds, examples, peak RSS MB)"""
+
+    import tensorflow_datasets as tfds
+
+    # the builders download from kaggle, point them at the synthetic corpus instead
+    tfds.download.DownloadManager.download_kaggle_data = lambda self, name: Path(corpus)
+
+    if dataset == "video":
+        sys.path.insert(0, str(ROOT / "video"))
+        from ai_wearables_video_gestures.ai_wearables_video_gestures import AiWearablesVideoGestures as Builder
+    else:
+        sys.path.insert(0, str(ROOT / "accelerometer"))
+        from ai_wearables_accelerometer_gestures.ai_wearables_accelerometer_gestures import (
+            AiWearablesAccelerometerGestures as Builder,
+        )
+
+    builder = Builder(data_dir=data_dir)
+
+    start = time.perf_counter()
+    builder.download_and_prepare()
+    seconds = time.perf_counter() - start
+
+    examples = sum(split.num_examples for split in builder.info.splits.values())
+
+    # linux reports KiB
+    return seconds, examples, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def run(dataset, scales=(1, 10, 100), workdir=None):
+    """returns one dict per scale: scale, examples, seconds, examples_per_sec, peak_rss_mb"""
+
+    from common import synthetic
+
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="build_benchmark_"))
+
+    results = []
+    for scale in scales:
+        corpus = workdir / f"{dataset}_{scale}x" / "corpus"
+
+        if dataset == "video":
+            synthetic.write_video_corpus(corpus, {split: n * scale for split, n in VIDEO_CLIPS.items()})
+        else:
+            synthetic.write_accelerometer_corpus(
+                corpus, **{split: n * scale for split, n in ACCELEROMETER_GESTURES.items()}
+            )
+
+        # fresh process per build: isolated peak memory, no tfds caches shared between builds
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            seconds, examples, rss = executor.submit(
+                _build, dataset, str(corpus), str(corpus.parent / "data")
+            ).result()
+
+        results.append(
+            {
+                "scale": scale,
+                "examples": examples,
+                "seconds": seconds,
+                "examples_per_sec": examples / seconds,
+                "peak_rss_mb": rss,
+            }
+        )
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=["video", "accelerometer", "both"], default="both")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--workdir", help="where corpora & prepared datasets are written (default: temp dir)")
+    args = parser.parse_args()
+
+    datasets = ["accelerometer", "video"] if args.dataset == "both" else [args.dataset]
+
+    for dataset in datasets:
+        print(dataset)
+        print(f"{'scale':>6} {'examples':>9} {'seconds':>9} {'examples/s':>11} {'rss MB':>8}")
+        for r in run(dataset, args.scales, args.workdir):
+            print(
+                f"{r['scale']:>5}x {r['examples']:9d} {r['seconds']:9.2f} "
+                f"{r['examples_per_sec']:11.1f} {r['peak_rss_mb']:8.0f}"
+            )
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,37 @@
+""" execution mode options shared by the gesture models (see `execution_benchmark.py`)
+
+    class Model(execution.ExecutionMode, tf.keras.Model):
+
+        def __init__(self, input_shape, mixed_precision=False, jit_compile="auto"):
+            super().__init__()
+            self.jit_compile_default = jit_compile
+            dtype = execution.layer_dtype(mixed_precision)
+            ...
+
+"""
+
+
+def layer_dtype(mixed_precision: bool):
+    """dtype policy of the hidden layers
+
+    "mixed_bfloat16" computes in bfloat16 and keeps the variables in float32,
+    the softmax output layer always stays float32 (numerically stable loss)
+    """
+    return "mixed_bfloat16" if mixed_precision else None
+
+
+class ExecutionMode:
+    """keras model mixin, `jit_compile_default` is the default of `compile(jit_compile=...)`
+
+    True forces XLA (fuses the many small recurrent kernels), keras' "auto" only uses XLA on GPU,
+    an explicit `compile(jit_compile=...)` still wins
+
+    the models take the execution mode as constructor params:
+        mixed_precision: bfloat16 compute for every layer but the softmax (see `layer_dtype`)
+        jit_compile: default of `compile(jit_compile=...)`, stored as `jit_compile_default`
+    """
+
+    jit_compile_default = "auto"
+
+    def compile(self, *args, jit_compile=None, **kwargs):
+        super().compile(*args, jit_compile=self.jit_compile_default if jit_compile is None else jit_compile, **kwargs)
@@ -0,0 +1,157 @@
+""" step time & accuracy parity of the execution modes of the gesture models
+
+every model is built in each mode (float32, XLA, bfloat16 mixed precision, both) and
+trained on the same synthetic task from the same initial weights:
+
+    step time: median ms per `train_on_batch` after the warm up (tracing / XLA compilation)
+    parity: validation accuracy after training, and agreement of the predictions with
+        the float32 model when every mode gets the float32 model's trained weights
+
+    python -m common.execution_benchmark                 # from the repo root
+    python -m common.execution_benchmark --models ConvLSTM1D_a --steps 50
+
+exits with 1 if a mode's accuracy is more than `--tolerance` below float32
+
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import tensorflow as tf
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# name: (directory of its models.py, input shape without batch, classes)
+MODELS = {
+    "ConvLSTM1D_a": ("accelerometer", (51, 3, 1), 20),
+    "ConvLSTM2D_a": ("video", (8, 60, 80, 3), 6),
+    "ConvLSTM2D_multihead": ("video", (8, 60, 80, 3), 6),
+}
+
+# name: model construction options
+MODES = {
+    "float32": {"mixed_precision": False, "jit_compile": False},
+    "xla": {"mixed_precision": False, "jit_compile": True},
+    "bfloat16": {"mixed_precision": True, "jit_compile": False},
+    "xla_bfloat16": {"mixed_precision": True, "jit_compile": True},
+}
+
+
+def load_models(directory):
+    """`models.py` of `directory`, both trainers name their module `models`"""
+
+    spec = importlib.util.spec_from_file_location(f"{directory}_models", ROOT / directory / "models.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_task(shape, num_classes, n, seed=0):
+    """(x, one hot y), every class is a fixed random pattern plus noise (learnable in a few epochs)"""
+
+    rng = np.random.default_rng(seed)
+    patterns = rng.normal(size=(num_classes,) + shape).astype(np.float32)
+
+    labels = np.arange(n) % num_classes
+    x = patterns[labels] + rng.normal(scale=2., size=(n,) + shape).astype(np.float32)
+
+    return x, tf.one_hot(labels, num_classes).numpy()
+
+
+def step_time(model, x, y, steps):
+    """median ms of one `train_on_batch` on (x, y)"""
+
+    model.train_on_batch(x, y)  # trace / compile
+
+    times = np.empty(steps)
+    for i in range(steps):
+        start = time.perf_counter()
+        model.train_on_batch(x, y)
+        times[i] = time.perf_counter() - start
+
+    return float(np.median(times) * 1000)
+
+
+def run(name, batch_size=32, steps=20, epochs=5, examples=512, seed=0):
+    """one dict per mode: step_ms, speedup, accuracy, accuracy_delta, agreement (vs float32)"""
+
+    directory, shape, num_classes = MODELS[name]
+    Model = getattr(load_models(directory), name)
+
+    x, y = synthetic_task(shape, num_classes, examples, seed)
+    split = examples * 3 // 4
+
+    built = {}
+    results = {}
+    for mode, options in MODES.items():
+        tf.keras.utils.set_random_seed(seed)
+
+        model = Model((batch_size,) + shape, **options)
+        model.build_graph((batch_size,) + shape)
+        if built:
+            model.set_weights(built["float32"]["initial"])
+        model.compile(optimizer="Adam", loss="categorical_crossentropy", metrics=["accuracy"])
+
+        built[mode] = {"model": model, "initial": model.get_weights()}
+
+        results[mode] = {"step_ms": step_time(model, x[:batch_size], y[:batch_size], steps)}
+
+        # the timing steps trained the model, start the parity run from the shared weights
+        model.set_weights(built[mode]["initial"])
+        model.fit(x[:split], y[:split], batch_size=batch_size, epochs=epochs, verbose=0)
+        results[mode]["accuracy"] = model.evaluate(x[split:], y[split:], batch_size=batch_size, verbose=0, return_dict=True)["accuracy"]
+
+    # same (float32 trained) weights in every mode: how often do the predictions agree
+    reference = built["float32"]["model"]
+    predictions = np.argmax(reference.predict(x[split:], batch_size=batch_size, verbose=0), axis=-1)
+
+    for mode, result in results.items():
+        model = built[mode]["model"]
+        model.set_weights(reference.get_weights())
+
+        result["speedup"] = results["float32"]["step_ms"] / result["step_ms"]
+        result["accuracy_delta"] = result["accuracy"] - results["float32"]["accuracy"]
+        result["agreement"] = float(
+            np.mean(np.argmax(model.predict(x[split:], batch_size=batch_size, verbose=0), axis=-1) == predictions)
+        )
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--steps", type=int, default=20, help="timed train steps per mode")
+    parser.add_argument("--epochs", type=int, default=5, help="training epochs of the parity run")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="allowed accuracy drop vs float32")
+    args = parser.parse_args()
+
+    failures = []
+    for name in args.models:
+        print(name)
+        print(f"{'':>14} {'step ms':>9} {'speedup':>8} {'accuracy':>9} {'delta':>7} {'agreement':>10}")
+        for mode, r in run(name, args.batch_size, args.steps, args.epochs).items():
+            print(
+                f"{mode:>14} {r['step_ms']:9.1f} {r['speedup']:7.2f}x {r['accuracy']:9.3f} "
+                f"{r['accuracy_delta']:+7.3f} {r['agreement']:10.1%}"
+            )
+            if r["accuracy_delta"] < -args.tolerance:
+                failures.append(f"{name}/{mode}")
+
+    if failures:
+        print(f"accuracy parity failed (> {args.tolerance:.0%} below float32): {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,39 @@
+"""tests for common/execution.py"""
+
+import tensorflow as tf
+
+from common import execution
+
+
+class _Model(execution.ExecutionMode, tf.keras.Model):
+
+    def __init__(self, mixed_precision=False, jit_compile="auto"):
+        super().__init__()
+        self.jit_compile_default = jit_compile
+        self.dense = tf.keras.layers.Dense(2, dtype=execution.layer_dtype(mixed_precision))
+
+    def call(self, inputs):
+        return self.dense(inputs)
+
+
+class ExecutionModeTest(tf.test.TestCase):
+
+    def test_layer_dtype(self):
+        self.assertEqual(_Model(mixed_precision=True).dense.compute_dtype, "bfloat16")
+        self.assertEqual(_Model().dense.compute_dtype, "float32")
+
+    def test_jit_compile_default(self):
+        model = _Model(jit_compile=True)
+        model.compile(loss="mse")
+        self.assertTrue(model.jit_compile)
+
+        model.compile(loss="mse", jit_compile=False)
+        self.assertFalse(model.jit_compile)
+
+        model = _Model(jit_compile=False)
+        model.compile(loss="mse")
+        self.assertFalse(model.jit_compile)
+
+
+if __name__ == "__main__":
+    tf.test.main()
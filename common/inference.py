@@ -0,0 +1,112 @@
+""" single pass inference
+
+stream a (batched) test dataset through a model once, write the kaggle
+submission and compute loss, accuracy & confusion matrix from the same predictions
+
+    results = inference.run(model, test, inputs="video", labels="label", num_classes=6,
+                            submission="submission_video.csv")
+
+"""
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+
+class SubmissionWriter:
+    """buffered csv writer, one vectorized write per batch (`id,gesture` rows)"""
+
+    def __init__(self, path, buffer_size=1 << 20):
+        self.file = open(path, "w", buffering=buffer_size)
+        self.file.write("id,gesture\n")
+
+    def write(self, ids, predictions):
+        ids = np.asarray(ids)
+        if ids.dtype.kind in ("S", "O"):
+            ids = np.char.decode(ids.astype(bytes), "utf-8")
+
+        pd.DataFrame({"id": ids, "gesture": predictions}).to_csv(self.file, header=False, index=False)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def confusion_matrix(labels, predictions, num_classes):
+    """rows are true labels, columns are predictions"""
+    return np.bincount(
+        num_classes * np.asarray(labels, dtype=np.int64) + np.asarray(predictions, dtype=np.int64),
+        minlength=num_classes * num_classes,
+    ).reshape(num_classes, num_classes)
+
+
+def run(model, ds, inputs, num_classes, ids="id", labels=None, submission=None):
+    """predict every batch of `ds` once
+
+    params:
+        model: keras model returning class probabilities (softmax)
+        ds: batched tf.data.Dataset of dicts
+        inputs: str, key of the model input
+        num_classes: int
+        ids: str, key of the example id (written to the submission)
+        labels: str, key of the sparse or one hot labels, None if the split has no labels (kaggle test)
+            examples with negative labels are predicted but left out of the metrics
+        submission: path of the submission csv, None to skip writing it
+
+    returns:
+        dict: loss, accuracy, confusion_matrix (None without labels) and count (# predicted examples)
+    """
+
+    # variable length batches (eg. `bucket_batch`) share a trace instead of one per shape
+    predict = tf.function(lambda x: model(x, training=False), reduce_retracing=True)
+
+    writer = SubmissionWriter(submission) if submission is not None else None
+
+    count = 0
+    total_loss = 0.
+    matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+
+    try:
+        for batch in ds:
+            probabilities = predict(batch[inputs]).numpy()
+            predictions = np.argmax(probabilities, axis=-1)
+            count += len(predictions)
+
+            if writer is not None:
+                writer.write(batch[ids].numpy(), predictions)
+
+            if labels is None:
+                continue
+
+            y = batch[labels].numpy()
+            if y.ndim == 2:
+                # one hot, all zeros (eg. tf.one_hot(-1, ...)) is unlabeled
+                y = np.where(y.any(axis=-1), np.argmax(y, axis=-1), -1)
+
+            labeled = y >= 0
+            y = y[labeled]
+
+            # categorical crossentropy from the probabilities, same clipping as keras
+            p = np.clip(probabilities[labeled, y], 1e-7, 1. - 1e-7)
+            total_loss += -np.log(p).sum()
+
+            matrix += confusion_matrix(y, predictions[labeled], num_classes)
+
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if labels is None or matrix.sum() == 0:
+        return {"loss": None, "accuracy": None, "confusion_matrix": None, "count": count}
+
+    return {
+        "loss": total_loss / matrix.sum(),
+        "accuracy": np.trace(matrix) / matrix.sum(),
+        "confusion_matrix": matrix,
+        "count": count,
+    }
@@ -0,0 +1,61 @@
+"""tests for common/inference.py"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from common import inference
+
+
+def _dataset(labels):
+    """3 feature examples whose first feature is the label, batched by 2"""
+    labels = np.asarray(labels)
+    features = np.eye(3, dtype=np.float32)[np.clip(labels, 0, 2)]
+
+    return tf.data.Dataset.from_tensor_slices(
+        {"x": features, "label": labels, "id": [f"ex_{i}".encode() for i in range(len(labels))]}
+    ).batch(2)
+
+
+def _model():
+    """returns the input (one hot) as 'probabilities', always predicts the label"""
+    x = tf.keras.Input(shape=(3,))
+    return tf.keras.Model(x, tf.keras.layers.Softmax()(x * 100.))
+
+
+class RunTest(tf.test.TestCase):
+
+    def test_metrics_and_submission(self):
+        path = Path(self.get_temp_dir()) / "submission.csv"
+
+        results = inference.run(
+            _model(), _dataset([0, 1, 2, 2, 1]), inputs="x", num_classes=3, labels="label", submission=path
+        )
+
+        self.assertEqual(results["count"], 5)
+        self.assertAllClose(results["accuracy"], 1.)
+        self.assertLess(results["loss"], 1e-3)
+        self.assertAllEqual(results["confusion_matrix"], np.diag([1, 2, 2]))
+
+        submission = pd.read_csv(path)
+        self.assertEqual(list(submission.columns), ["id", "gesture"])
+        self.assertEqual(list(submission["id"]), [f"ex_{i}" for i in range(5)])
+        self.assertEqual(list(submission["gesture"]), [0, 1, 2, 2, 1])
+
+    def test_unlabeled_examples_are_skipped(self):
+        results = inference.run(_model(), _dataset([-1, 1, -1]), inputs="x", num_classes=3, labels="label")
+
+        self.assertEqual(results["count"], 3)
+        self.assertAllEqual(results["confusion_matrix"].sum(), 1)
+
+        unlabeled = inference.run(_model(), _dataset([-1, -1]), inputs="x", num_classes=3, labels="label")
+        self.assertIsNone(unlabeled["accuracy"])
+
+    def test_confusion_matrix(self):
+        self.assertAllEqual(inference.confusion_matrix([0, 0, 1], [0, 1, 1], 2), [[1, 1], [0, 1]])
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,377 @@
+""" local asyncio inference service with dynamic micro-batching
+
+incoming requests wait in a queue until `max_batch_size` of them are pending or the oldest
+waited `max_wait_ms`, then the batch runs as one forward pass (zero padded to its longest
+example, padded accelerometer steps are masked by the model)
+
+wire protocol (TCP): every message is a 4 byte big endian length followed by a .npy payload,
+requests hold one example (no batch axis), responses the float32 class probabilities, or a
+unicode string array with the error message if the request failed (the connection stays open)
+
+    python -m common.serving serve --model ConvLSTM1D_a --weights accelerometer/ckpt.weights.h5
+    python -m common.serving benchmark --model ConvLSTM1D_a --concurrency 1 8 32 64
+
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import importlib.util
+import io
+import multiprocessing
+import os
+import queue
+import struct
+import time
+from pathlib import Path
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# name: (directory of its models.py, example shape, None = variable length)
+MODELS = {
+    "ConvLSTM1D_a": ("accelerometer", (None, 3, 1)),
+    "ConvLSTM2D_a": ("video", (8, 240, 320, 3)),
+}
+
+
+class ServingError(Exception):
+    """error message the server sent back for a request"""
+
+
+def check_shape(example: np.ndarray, example_shape):
+    """raises ValueError if `example` does not fit `example_shape` (None axes: any length)"""
+
+    if len(example.shape) != len(example_shape) or any(
+        n is not None and n != m for n, m in zip(example_shape, example.shape)
+    ):
+        raise ValueError(f"example shape {example.shape} does not match {tuple(example_shape)}")
+
+
+def pad_batch(examples: list) -> np.ndarray:
+    """stack examples of different shapes, zero padded at the end of every axis"""
+
+    shape = np.max([example.shape for example in examples], axis=0)
+
+    batch = np.zeros((len(examples),) + tuple(shape), dtype=np.float32)
+    for i, example in enumerate(examples):
+        batch[(i,) + tuple(slice(0, n) for n in example.shape)] = example
+
+    return batch
+
+
+class MicroBatcher:
+    """coalesces concurrent `submit` calls into batches for `predict`
+
+    params:
+        predict: (batch, ...) float32 array -> (batch, classes) probabilities, runs on one worker thread
+        max_batch_size: largest batch
+        max_wait_ms: longest time the first request of a batch waits for more requests
+        example_shape: shape every example has to fit (None axes: any length), checked in `submit`
+            so a malformed request fails alone instead of failing its whole batch (None: not checked)
+    """
+
+    def __init__(self, predict, max_batch_size: int = 32, max_wait_ms: float = 5., example_shape=None):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.
+        self.example_shape = example_shape
+
+        self.queue = None
+        self.task = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+        self.batches = 0
+        self.examples = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+        self.executor.shutdown()
+
+    async def submit(self, example: np.ndarray) -> np.ndarray:
+        """probabilities of one example (no batch axis)"""
+
+        if self.example_shape is not None:
+            check_shape(example, self.example_shape)
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((example, future))
+        return await future
+
+    async def _collect(self) -> list:
+        """wait for a first request, then for more until the batch is full or the wait is over"""
+
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+            examples, futures = zip(*batch)
+
+            try:
+                probabilities = await loop.run_in_executor(self.executor, self.predict, pad_batch(examples))
+            except Exception as e:
+                # requests cancelled while the batch ran are done already
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.examples += len(batch)
+
+            for future, p in zip(futures, probabilities):
+                if not future.done():
+                    future.set_result(p)
+
+
+def encode(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    payload = buffer.getvalue()
+    return struct.pack("!I", len(payload)) + payload
+
+
+def encode_error(error: Exception) -> bytes:
+    return encode(np.array(f"{type(error).__name__}: {error}"))
+
+
+async def read_message(reader: asyncio.StreamReader) -> np.ndarray:
+    (length,) = struct.unpack("!I", await reader.readexactly(4))
+    return np.load(io.BytesIO(await reader.readexactly(length)), allow_pickle=False)
+
+
+async def read_response(reader: asyncio.StreamReader) -> np.ndarray:
+    """probabilities of a request, raises ServingError with the server's message if it failed"""
+
+    response = await read_message(reader)
+    if response.dtype.kind == "U":
+        raise ServingError(str(response))
+
+    return response
+
+
+async def serve(batcher: MicroBatcher, host: str = "127.0.0.1", port: int = 8500) -> asyncio.Server:
+    """start the TCP server (and the batcher), every connection may send any number of requests"""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    example = await read_message(reader)
+                    response = encode(await batcher.submit(example.astype(np.float32)))
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    raise
+                except Exception as e:  # malformed payload or shape, failed prediction: only this request fails
+                    response = encode_error(e)
+
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):  # client closed the connection
+            pass
+        finally:
+            writer.close()
+
+    await batcher.start()
+    return await asyncio.start_server(handle, host, port)
+
+
+def load_model(name: str, weights=None, example_shape=None):
+    """`predict` function of a (trained) model, see MODELS"""
+
+    import tensorflow as tf
+
+    directory, default_shape = MODELS[name]
+    example_shape = example_shape or default_shape
+
+    # both trainers name their module `models`
+    spec = importlib.util.spec_from_file_location(f"{directory}_models", ROOT / directory / "models.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    model = getattr(module, name)((None,) + tuple(example_shape))
+    model(np.zeros((1,) + tuple(n or 1 for n in example_shape), dtype=np.float32))  # build
+    if weights:
+        model.load_weights(weights)
+
+    forward = tf.function(
+        lambda x: model(x, training=False),
+        input_signature=[tf.TensorSpec((None,) + tuple(example_shape), tf.float32)],
+    )
+
+    return lambda batch: forward(batch).numpy()
+
+
+def _serve_process(name, weights, example_shape, max_batch_size, max_wait_ms, ports):
+    """runs in a spawned process: serve `name` on a free port, the port is put on `ports` once ready"""
+
+    predict = load_model(name, weights, example_shape)
+    predict(np.zeros((1,) + tuple(n or 51 for n in example_shape), dtype=np.float32))  # warm up
+
+    async def main():
+        server = await serve(MicroBatcher(predict, max_batch_size, max_wait_ms, example_shape), port=0)
+        ports.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def _wait_for_port(server, ports):
+    """port of a `_serve_process`, raises if the process died before serving"""
+
+    while True:
+        try:
+            return ports.get(timeout=1)
+        except queue.Empty:
+            if not server.is_alive():
+                raise RuntimeError(f"server process exited with code {server.exitcode}")
+
+
+async def load_test(port: int, examples: list, concurrency: int, requests: int, host: str = "127.0.0.1") -> dict:
+    """`concurrency` clients send `requests` requests in total (each waits for its response before the next)
+
+    returns latency percentiles (ms) and requests/sec
+    """
+
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in remaining:
+            start = time.perf_counter()
+            writer.write(encode(examples[i % len(examples)]))
+            await writer.drain()
+            await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    seconds = time.perf_counter() - start
+
+    latencies = np.asarray(latencies) * 1000
+
+    return {
+        "concurrency": concurrency,
+        "requests_per_sec": requests / seconds,
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p99": float(np.percentile(latencies, 99)),
+    }
+
+
+def benchmark(name, weights=None, example_shape=None, concurrency=(1, 8, 32), requests=512, configs=None, seed=0) -> dict:
+    """{config name: [load_test result per concurrency]}, every config is served by its own process
+
+    params:
+        configs: {name: (max_batch_size, max_wait_ms)} (default: no batching vs batching)
+    """
+
+    example_shape = example_shape or MODELS[name][1]
+    configs = configs or {"unbatched": (1, 0.), "batched": (32, 5.)}
+
+    rng = np.random.default_rng(seed)
+    examples = [
+        # accelerometer gestures are 19 to 51 samples long
+        rng.normal(size=tuple(n or int(rng.integers(19, 52)) for n in example_shape)).astype(np.float32)
+        for _ in range(64)
+    ]
+
+    context = multiprocessing.get_context("spawn")
+
+    results = {}
+    for config, (max_batch_size, max_wait_ms) in configs.items():
+        ports = context.Queue()
+        server = context.Process(
+            target=_serve_process, args=(name, weights, example_shape, max_batch_size, max_wait_ms, ports), daemon=True
+        )
+        server.start()
+
+        try:
+            port = _wait_for_port(server, ports)
+            results[config] = [asyncio.run(load_test(port, examples, c, requests)) for c in concurrency]
+        finally:
+            server.terminate()
+            server.join()
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["serve", "benchmark"])
+    parser.add_argument("--model", choices=list(MODELS), default="ConvLSTM1D_a")
+    parser.add_argument("--weights", help="weights saved by train.py (default: untrained model)")
+    parser.add_argument("--shape", type=int, nargs="+", help="example shape (default: see MODELS)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=512, help="requests per concurrency level")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+
+        async def run():
+            example_shape = args.shape or MODELS[args.model][1]
+            batcher = MicroBatcher(
+                load_model(args.model, args.weights, example_shape), args.max_batch_size, args.max_wait_ms, example_shape
+            )
+            server = await serve(batcher, args.host, args.port)
+            print(f"serving {args.model} on {args.host}:{args.port}")
+            await server.serve_forever()
+
+        asyncio.run(run())
+        return
+
+    results = benchmark(
+        args.model,
+        args.weights,
+        args.shape,
+        args.concurrency,
+        args.requests,
+        {"unbatched": (1, 0.), f"batched ({args.max_batch_size}, {args.max_wait_ms:g} ms)": (args.max_batch_size, args.max_wait_ms)},
+    )
+
+    print(f"{'':>24} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for config, rows in results.items():
+        for r in rows:
+            print(
+                f"{config:>24} {r['concurrency']:8d} {r['requests_per_sec']:8.1f} "
+                f"{r['latency_ms_p50']:8.2f} {r['latency_ms_p99']:8.2f}"
+            )
+
+
+if __name__ == "__main__":
+
+    main()
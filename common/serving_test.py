@@ -0,0 +1,215 @@
+"""tests for common/serving.py"""
+
+import asyncio
+import struct
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from common import serving
+
+
+class _Predict:
+    """'probabilities' are the sum of every example, records the batch sizes"""
+
+    def __init__(self, seconds=0.):
+        self.seconds = seconds
+        self.batch_sizes = []
+
+    def __call__(self, batch):
+        self.batch_sizes.append(len(batch))
+        time.sleep(self.seconds)
+        return batch.reshape(len(batch), -1).sum(axis=1, keepdims=True)
+
+
+class PadBatchTest(tf.test.TestCase):
+
+    def test_zero_pads_every_axis(self):
+        batch = serving.pad_batch([np.ones((2, 3)), np.ones((4, 1))])
+
+        self.assertEqual(batch.shape, (2, 4, 3))
+        self.assertEqual(batch.dtype, np.float32)
+        self.assertAllEqual(batch.sum(axis=(1, 2)), [6, 4])
+
+
+class MicroBatcherTest(tf.test.TestCase):
+
+    def _submit_all(self, batcher, examples):
+        async def run():
+            await batcher.start()
+            try:
+                return await asyncio.gather(*[batcher.submit(example) for example in examples])
+            finally:
+                await batcher.stop()
+
+        return asyncio.run(run())
+
+    def test_concurrent_requests_share_a_batch(self):
+        predict = _Predict()
+        batcher = serving.MicroBatcher(predict, max_batch_size=4, max_wait_ms=50.)
+
+        results = self._submit_all(batcher, [np.full((3,), i, dtype=np.float32) for i in range(10)])
+
+        # every request gets its own result
+        self.assertAllClose(np.concatenate(results), 3. * np.arange(10))
+        self.assertEqual(predict.batch_sizes, [4, 4, 2])
+        self.assertEqual((batcher.batches, batcher.examples), (3, 10))
+
+    def test_variable_length_examples_are_padded(self):
+        predict = _Predict()
+        batcher = serving.MicroBatcher(predict, max_batch_size=8, max_wait_ms=50.)
+
+        results = self._submit_all(batcher, [np.ones((n, 3, 1), dtype=np.float32) for n in [19, 51, 30]])
+
+        self.assertAllClose(np.concatenate(results), [57., 153., 90.])
+        self.assertEqual(predict.batch_sizes, [3])
+
+    def test_wait_time_bounds_the_batch(self):
+        predict = _Predict()
+        batcher = serving.MicroBatcher(predict, max_batch_size=32, max_wait_ms=10.)
+
+        async def run():
+            await batcher.start()
+            first = asyncio.create_task(batcher.submit(np.ones(1, dtype=np.float32)))
+            await asyncio.sleep(0.2)  # longer than the wait, the first request is answered alone
+            await batcher.submit(np.ones(1, dtype=np.float32))
+            await first
+            await batcher.stop()
+
+        asyncio.run(run())
+
+        self.assertEqual(predict.batch_sizes, [1, 1])
+
+    def test_errors_reach_every_request_of_the_batch(self):
+        def predict(batch):
+            raise ValueError("broken model")
+
+        batcher = serving.MicroBatcher(predict, max_batch_size=2, max_wait_ms=50.)
+
+        with self.assertRaisesRegex(ValueError, "broken model"):
+            self._submit_all(batcher, [np.ones(1, dtype=np.float32)] * 2)
+
+    def test_cancelled_request_of_a_failed_batch_does_not_stop_the_batcher(self):
+        calls = []
+
+        def predict(batch):
+            calls.append(len(batch))
+            if len(calls) == 1:
+                time.sleep(0.1)
+                raise ValueError("broken batch")
+            return batch.reshape(len(batch), -1).sum(axis=1, keepdims=True)
+
+        batcher = serving.MicroBatcher(predict, max_batch_size=2, max_wait_ms=10.)
+
+        async def run():
+            await batcher.start()
+            try:
+                cancelled = asyncio.create_task(batcher.submit(np.ones(1, dtype=np.float32)))
+                await asyncio.sleep(0.05)  # the first batch is running
+                cancelled.cancel()
+
+                # the next batch is still served
+                return await asyncio.wait_for(batcher.submit(np.full(1, 2., dtype=np.float32)), timeout=5.)
+            finally:
+                await batcher.stop()
+
+        self.assertAllClose(asyncio.run(run()), [2.])
+        self.assertEqual(calls, [1, 1])
+
+    def test_malformed_request_fails_alone(self):
+        predict = _Predict()
+        batcher = serving.MicroBatcher(predict, max_batch_size=4, max_wait_ms=50., example_shape=(None, 3))
+
+        async def run():
+            await batcher.start()
+            try:
+                return await asyncio.gather(
+                    batcher.submit(np.ones((2, 3), dtype=np.float32)),
+                    batcher.submit(np.ones((2, 3, 1), dtype=np.float32)),
+                    batcher.submit(np.ones((4, 2), dtype=np.float32)),
+                    batcher.submit(np.ones((5, 3), dtype=np.float32)),
+                    return_exceptions=True,
+                )
+            finally:
+                await batcher.stop()
+
+        good, wrong_ndim, wrong_axis, other = asyncio.run(run())
+
+        self.assertAllClose(good, [6.])
+        self.assertAllClose(other, [15.])
+        self.assertIsInstance(wrong_ndim, ValueError)
+        self.assertIsInstance(wrong_axis, ValueError)
+        self.assertEqual(predict.batch_sizes, [2])
+
+
+class ServeTest(tf.test.TestCase):
+
+    def test_errors_are_answered_on_the_same_connection(self):
+        def predict(batch):
+            if (batch < 0).any():
+                raise ValueError("broken model")
+            return batch.reshape(len(batch), -1).sum(axis=1, keepdims=True)
+
+        async def run():
+            batcher = serving.MicroBatcher(predict, max_batch_size=1, max_wait_ms=0., example_shape=(None, 2))
+            server = await serving.serve(batcher, port=0)
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+
+            async def request(payload):
+                writer.write(payload)
+                await writer.drain()
+                try:
+                    return await serving.read_response(reader)
+                except serving.ServingError as e:
+                    return e
+
+            responses = [
+                await request(struct.pack("!I", 5) + b"12345"),  # not a .npy payload
+                await request(serving.encode(np.ones((2, 3), dtype=np.float32))),  # wrong shape
+                await request(serving.encode(-np.ones((2, 2), dtype=np.float32))),  # failed prediction
+                await request(serving.encode(np.ones((3, 2), dtype=np.float32))),
+            ]
+
+            writer.close()
+            await writer.wait_closed()
+            server.close()
+            await server.wait_closed()
+            await batcher.stop()
+            return responses
+
+        bad_payload, wrong_shape, failed, ok = asyncio.run(run())
+
+        self.assertIsInstance(bad_payload, serving.ServingError)
+        self.assertIsInstance(wrong_shape, serving.ServingError)
+        self.assertIn("does not match", str(wrong_shape))
+        self.assertIsInstance(failed, serving.ServingError)
+        self.assertIn("broken model", str(failed))
+        self.assertAllClose(ok, [6.])
+
+    def test_round_trip_over_tcp(self):
+        predict = _Predict(seconds=0.01)
+
+        async def run():
+            batcher = serving.MicroBatcher(predict, max_batch_size=8, max_wait_ms=20.)
+            server = await serving.serve(batcher, port=0)
+            port = server.sockets[0].getsockname()[1]
+
+            examples = [np.full((2, 2), i, dtype=np.float32) for i in range(16)]
+            result = await serving.load_test(port, examples, concurrency=8, requests=16)
+
+            server.close()
+            await server.wait_closed()
+            await batcher.stop()
+            return result
+
+        result = asyncio.run(run())
+
+        self.assertGreater(result["requests_per_sec"], 0)
+        self.assertLessEqual(result["latency_ms_p50"], result["latency_ms_p99"])
+        # 8 concurrent clients: batches of more than one request
+        self.assertLess(len(predict.batch_sizes), 16)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,149 @@
+""" participant / user splits
+
+`load_splits` scans only the `by` feature once, then reads each split as tfds
+slices of its own records (eg. "train[0:12]+train[30:41]"), so every split only
+reads its own records instead of filtering the whole dataset
+
+    ds = splits.load_splits(
+        "ai_wearables_accelerometer_gestures", "train", by="user",
+        groups={"train": [0, 1, 2, 3, 4], "val": [5, 6]}, data_dir="./data",
+    )
+
+the record positions are those of the files on disk (read one file after the other, the order
+tfds resolves slices in), a default `tfds.load` interleaves the files of multi file datasets
+
+slices only pay off when a group's records are stored in few runs (eg. written sorted by user, like
+ai_wearables_accelerometer_gestures >= 1.1.0),
+a group stored in more than `max_ranges` runs is read by filtering the whole split instead
+
+`filter_splits` is the fallback for an already loaded dataset, one static hash table
+lookup per element instead of comparing against every member of every split
+
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_datasets as tfds
+
+
+def membership_table(groups: dict) -> tf.lookup.StaticHashTable:
+    """maps every member to the position of its group in `groups` (-1 if not in any group)"""
+
+    keys, values = [], []
+    for i, members in enumerate(groups.values()):
+        keys.extend(members)
+        values.extend([i] * len(members))
+
+    if len(set(keys)) != len(keys):
+        raise ValueError("a member can only belong to one group")
+
+    return tf.lookup.StaticHashTable(
+        tf.lookup.KeyValueTensorInitializer(tf.constant(keys), tf.constant(values, dtype=tf.int32)),
+        default_value=-1,
+    )
+
+
+def filter_splits(ds: tf.data.Dataset, by: str, groups: dict) -> dict:
+    """{group: ds filtered to the group's members} using a single static hash table"""
+
+    table = membership_table(groups)
+
+    return {
+        name: ds.filter(lambda x, i=i: table.lookup(x[by]) == i)
+        for i, name in enumerate(groups)
+    }
+
+
+def build_index(ds: tf.data.Dataset, by: str, groups: dict) -> dict:
+    """{group: [[start, stop], ...]} record ranges of each group, one pass over `ds`
+
+    `ds` has to be read in file order and should only decode the `by` feature (see `load_splits`)
+    """
+
+    values = np.concatenate([batch[by] for batch in ds.map(lambda x: {by: x[by]}).batch(4096).as_numpy_iterator()])
+
+    index = {}
+    for name, members in groups.items():
+        positions = np.flatnonzero(np.isin(values, members))
+
+        # merge consecutive positions into [start, stop) ranges
+        breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+        index[name] = [[int(run[0]), int(run[-1]) + 1] for run in np.split(positions, breaks) if len(run)]
+
+    return index
+
+
+def to_split(split: str, ranges: list) -> str:
+    """tfds split string reading only `ranges` of `split`"""
+
+    if not ranges:
+        return f"{split}[0:0]"
+
+    return "+".join(f"{split}[{start}:{stop}]" for start, stop in ranges)
+
+
+def load_splits(
+    name: str, split: str, by: str, groups: dict, data_dir=None, index_path=None, max_ranges: int = 64, **load_kwargs
+) -> dict:
+    """{group: tf.data.Dataset} reading only the records of each group
+
+    params:
+        name: tfds dataset name (eg. "ai_wearables_accelerometer_gestures")
+        split: split to divide (eg. "train")
+        by: feature holding the group members (eg. "user")
+        groups: {group name: list of members}
+        data_dir: same as `tfds.load`
+        index_path: optional json file caching the index (rebuilt if `groups` or the split changed)
+        max_ranges: groups stored in more runs are read with `filter_splits` (a full read of `split`)
+        load_kwargs: forwarded to `tfds.load` for every group
+    """
+
+    info = tfds.builder(name, data_dir=data_dir).info
+    key = {
+        "name": name,
+        "version": str(info.version),
+        "split": split,
+        "num_examples": info.splits[split].num_examples,
+        "num_shards": info.splits[split].num_shards,
+        "order": "file",
+        "by": by,
+        "groups": groups,
+    }
+
+    index = None
+    if index_path is not None and Path(index_path).exists():
+        cached = json.loads(Path(index_path).read_text())
+        if cached["key"] == key:
+            index = cached["index"]
+
+    if index is None:
+        # one file after the other, positions are the ones tfds slices refer to
+        metadata = tfds.load(
+            name,
+            split=split,
+            data_dir=data_dir,
+            shuffle_files=False,
+            read_config=tfds.ReadConfig(interleave_cycle_length=1),
+            decoders=tfds.decode.PartialDecoding({by: True}),
+        )
+        index = build_index(metadata, by, groups)
+
+        if index_path is not None:
+            Path(index_path).write_text(json.dumps({"key": key, "index": index}))
+
+    fragmented = {group: groups[group] for group, ranges in index.items() if len(ranges) > max_ranges}
+
+    datasets = {
+        group: tfds.load(name, split=to_split(split, ranges), data_dir=data_dir, **load_kwargs)
+        for group, ranges in index.items()
+        if group not in fragmented
+    }
+    if fragmented:
+        datasets.update(
+            filter_splits(tfds.load(name, split=split, data_dir=data_dir, **load_kwargs), by, fragmented)
+        )
+
+    return {group: datasets[group] for group in groups}
@@ -0,0 +1,79 @@
+"""tests for common/splits.py"""
+
+import collections
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_datasets as tfds
+
+from common import splits
+
+
+def _dataset():
+    return tf.data.Dataset.from_tensor_slices({"user": [0, 0, 1, 2, 2, 0, 3, 1], "x": tf.range(8)})
+
+
+class SplitsTestUsers(tfds.core.GeneratorBasedBuilder):
+    """10 users x 20 examples, written to several files"""
+
+    VERSION = tfds.core.Version("1.0.0")
+
+    def _info(self):
+        return tfds.core.DatasetInfo(
+            builder=self,
+            features=tfds.features.FeaturesDict({"user": tf.int32, "x": tf.int32}),
+        )
+
+    def _split_generators(self, dl_manager):
+        return {"train": self._generate_examples()}
+
+    def _generate_examples(self):
+        for x in range(200):
+            yield x, {"user": x // 20, "x": x}
+
+
+class SplitsTest(tf.test.TestCase):
+
+    def test_membership_table(self):
+        table = splits.membership_table({"a": [0, 1], "b": [2]})
+        self.assertAllEqual(table.lookup(tf.constant([0, 1, 2, 3])), [0, 0, 1, -1])
+
+        with self.assertRaises(ValueError):
+            splits.membership_table({"a": [0, 1], "b": [1]})
+
+    def test_filter_splits(self):
+        split = splits.filter_splits(_dataset(), "user", {"a": [0, 1], "b": [2]})
+
+        self.assertEqual([int(x["x"]) for x in split["a"]], [0, 1, 2, 5, 7])
+        self.assertEqual([int(x["x"]) for x in split["b"]], [3, 4])
+
+    def test_build_index(self):
+        index = splits.build_index(_dataset(), "user", {"a": [0, 1], "b": [2], "c": [9]})
+
+        self.assertEqual(index, {"a": [[0, 3], [5, 6], [7, 8]], "b": [[3, 5]], "c": []})
+
+    def test_load_splits_of_a_multi_file_dataset(self):
+        data_dir = self.get_temp_dir()
+        SplitsTestUsers(data_dir=data_dir).download_and_prepare(
+            download_config=tfds.download.DownloadConfig(num_shards=4)
+        )
+        self.assertEqual(tfds.builder("splits_test_users", data_dir=data_dir).info.splits["train"].num_shards, 4)
+
+        groups = {"train": [0, 1, 2, 3, 4], "val": [5, 6], "test": [7, 8, 9]}
+        for max_ranges in [1000, 0]:  # slices, filtered reads
+            loaded = splits.load_splits("splits_test_users", "train", by="user", groups=groups, data_dir=data_dir, max_ranges=max_ranges)
+
+            for group, members in groups.items():
+                examples = list(loaded[group].as_numpy_iterator())
+                users = collections.Counter(int(x["user"]) for x in examples)
+
+                self.assertEqual(users, {user: 20 for user in members})
+                self.assertAllEqual(np.sort([x["x"] for x in examples]), [x for x in range(200) if x // 20 in members])
+
+    def test_to_split(self):
+        self.assertEqual(splits.to_split("train", [[0, 3], [5, 6]]), "train[0:3]+train[5:6]")
+        self.assertEqual(splits.to_split("train", []), "train[0:0]")
+
+
+if __name__ == "__main__":
+    tf.test.main()
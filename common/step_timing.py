@@ -0,0 +1,221 @@
+""" is training input bound or compute bound?
+
+`PipelineStats` times the map stages of a tf.data pipeline and records when every batch reaches
+the trainer, the `StepTimer` keras callback splits every train step into time blocked on the
+iterator and time in the train step, writes one json line per step and a summary line per
+epoch (also logged with `tf.get_logger()`, a warning for input bound epochs)
+
+    stats = step_timing.PipelineStats()
+    train = stats.map(train, decode, "decode", num_parallel_calls=tf.data.AUTOTUNE)
+    train = stats.deliver(train.batch(16))
+    model.fit(train, callbacks=[step_timing.StepTimer(stats, "step_timing.jsonl")])
+
+the stage added by `deliver` is a sequential map, it runs when the train step asks for the next
+batch: the time from `on_train_batch_begin` to its timestamp is the time blocked on the iterator,
+the rest of the step is compute (keras' `steps_per_execution` has to be 1), the first step of a
+run also traces the train function, it is logged but left out of the epoch summary
+
+"""
+
+import collections
+import functools
+import json
+import time
+
+import numpy as np
+import tensorflow as tf
+
+
+def _now():
+    return np.float64(time.perf_counter())
+
+
+class PipelineStats:
+    """per stage latencies & batch delivery times of instrumented tf.data pipelines
+
+    params:
+        time_stages: False leaves `map` stages untimed (plain `ds.map`), eg. for pipelines that run
+            on tf.data service workers (python stages can not be distributed)
+    """
+
+    def __init__(self, time_stages: bool = True):
+        self.time_stages = time_stages
+        self.latencies = collections.defaultdict(list)  # stage: [seconds per element]
+        self.deliveries = collections.deque()
+
+    def _record(self, name, start):
+        self.latencies[name].append(time.perf_counter() - start)
+        return np.float64(0.)
+
+    def _deliver(self):
+        self.deliveries.append(time.perf_counter())
+        return np.float64(0.)
+
+    def map(self, ds: tf.data.Dataset, fn, name: str, **kwargs) -> tf.data.Dataset:
+        """`ds.map(fn, **kwargs)`, the time `fn` takes per element is recorded as stage `name`"""
+
+        if not self.time_stages:
+            return ds.map(fn, **kwargs)
+
+        def timed(*element):
+            start = tf.numpy_function(_now, [], tf.dtypes.float64, stateful=True)
+            with tf.control_dependencies([start]):
+                out = fn(*element)
+
+            with tf.control_dependencies(tf.nest.flatten(out)):
+                end = tf.numpy_function(functools.partial(self._record, name), [start], tf.dtypes.float64, stateful=True)
+
+            with tf.control_dependencies([end]):
+                return tf.nest.map_structure(tf.identity, out)
+
+        return ds.map(timed, **kwargs)
+
+    def deliver(self, ds: tf.data.Dataset) -> tf.data.Dataset:
+        """last stage of a training pipeline: records when the trainer receives each element"""
+
+        def delivered(*element):
+            stamp = tf.numpy_function(self._deliver, [], tf.dtypes.float64, stateful=True)
+            with tf.control_dependencies([stamp]):
+                element = tf.nest.map_structure(tf.identity, element)
+
+            return element if len(element) > 1 else element[0]
+
+        # no prefetch behind the stamp, it has to run in the trainer's get_next
+        options = tf.data.Options()
+        options.experimental_optimization.inject_prefetch = False
+
+        return ds.map(delivered).with_options(options)
+
+    def delivered_between(self, begin: float, end: float):
+        """time the last element delivered in [begin, end] was received (None if there is none),
+        earlier deliveries are dropped
+        """
+
+        delivered = None
+        while self.deliveries and self.deliveries[0] <= end:
+            stamp = self.deliveries.popleft()
+            if stamp >= begin:
+                delivered = stamp
+
+        return delivered
+
+    def drain_latencies(self) -> dict:
+        """{stage: [seconds]} recorded since the last call"""
+
+        latencies = {}
+        for name in list(self.latencies):
+            values = self.latencies[name]
+            latencies[name], values[:] = values[:], []
+
+        return latencies
+
+
+def _stage_summary(latencies: dict) -> dict:
+    return {
+        name: {
+            "count": len(values),
+            "mean_ms": 1000 * float(np.mean(values)),
+            "p90_ms": 1000 * float(np.percentile(values, 90)),
+        }
+        for name, values in latencies.items()
+        if values
+    }
+
+
+class StepTimer(tf.keras.callbacks.Callback):
+    """time blocked on the iterator vs. time in the train step, per step and per epoch
+
+    params:
+        stats: PipelineStats of the training dataset (`deliver` has to be its last stage),
+            None: only the total step time is known
+        path: json lines log, one "step" line per train step and one "epoch" summary per epoch
+        input_bound: an epoch is flagged input bound if this fraction of its step time (or more)
+            was spent waiting for input
+    """
+
+    def __init__(self, stats: PipelineStats = None, path="step_timing.jsonl", input_bound: float = 0.1):
+        super().__init__()
+        self.stats = stats or PipelineStats()
+        self.path = path
+        self.input_bound = input_bound
+
+        self.file = None
+        self.epochs = []  # epoch summaries
+        self.logger = tf.get_logger()
+
+    def _write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+
+    def on_train_begin(self, logs=None):
+        self.file = open(self.path, "a", buffering=1)
+        self.warmup = True
+
+    def on_train_end(self, logs=None):
+        self.file.close()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.waits, self.computes = [], []
+        self.epoch_latencies = collections.defaultdict(list)
+        self.stats.drain_latencies()  # validation & previous epoch
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.begin = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.perf_counter()
+
+        delivered = self.stats.delivered_between(self.begin, end)
+        wait = 0. if delivered is None else delivered - self.begin
+
+        latencies = self.stats.drain_latencies()
+        for name, values in latencies.items():
+            self.epoch_latencies[name].extend(values)
+
+        if not self.warmup:
+            self.waits.append(wait)
+            self.computes.append(end - self.begin - wait)
+
+        self._write(
+            {
+                "event": "step",
+                "warmup": self.warmup,
+                "epoch": self.epoch,
+                "step": batch,
+                "wait_ms": 1000 * wait,
+                "compute_ms": 1000 * (end - self.begin - wait),
+                # elements the stages finished during this step (prefetching may run ahead)
+                "stages": {name: 1000 * float(np.mean(values)) for name, values in latencies.items() if values},
+            }
+        )
+        self.warmup = False
+
+    def on_epoch_end(self, epoch, logs=None):
+        wait, compute = float(np.sum(self.waits)), float(np.sum(self.computes))
+        input_fraction = wait / max(wait + compute, 1e-12)
+
+        summary = {
+            "event": "epoch",
+            "epoch": epoch,
+            "steps": len(self.waits),
+            "wait_ms_mean": 1000 * float(np.mean(self.waits)) if self.waits else 0.,
+            "compute_ms_mean": 1000 * float(np.mean(self.computes)) if self.computes else 0.,
+            "input_fraction": input_fraction,
+            "input_bound": input_fraction >= self.input_bound,
+            "stages": _stage_summary(self.epoch_latencies),
+        }
+
+        self._write(summary)
+        self.epochs.append(summary)
+
+        stages = ", ".join(f"{name} {s['mean_ms']:.1f} ms" for name, s in summary["stages"].items())
+        message = (
+            f"epoch {epoch}: {summary['steps']} steps, waiting on input {summary['wait_ms_mean']:.1f} ms, "
+            f"train step {summary['compute_ms_mean']:.1f} ms per step ({input_fraction:.0%} input)"
+            + (f", stages: {stages}" if stages else "")
+        )
+
+        if summary["input_bound"]:
+            self.logger.warning(f"input bound {message}")
+        else:
+            self.logger.info(message)
@@ -0,0 +1,87 @@
+"""tests for common/step_timing.py"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from common import step_timing
+
+
+def _sleep(seconds):
+    """graph op sleeping `seconds` (a python function), passes `x` (and its gradient) through"""
+
+    def op(x):
+        def sleep(x):
+            time.sleep(seconds)
+            return x
+
+        slept = tf.ensure_shape(tf.numpy_function(sleep, [x], x.dtype, stateful=True), x.shape)
+        return x + tf.stop_gradient(slept - x)
+
+    return op
+
+
+def _fit(stats, ds, model, steps=6):
+    model.compile(optimizer="SGD", loss="mse")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timer = step_timing.StepTimer(stats, Path(tmp) / "timing.jsonl")
+        model.fit(ds.take(steps), epochs=2, verbose=0, callbacks=[timer])
+        lines = [json.loads(line) for line in (Path(tmp) / "timing.jsonl").read_text().splitlines()]
+
+    return timer, lines
+
+
+def _model(seconds=0.):
+    x = tf.keras.Input(shape=(4,))
+    y = tf.keras.layers.Dense(1)(x)
+    if seconds:
+        y = tf.keras.layers.Lambda(_sleep(seconds), output_shape=(1,))(y)
+    return tf.keras.Model(x, y)
+
+
+def _dataset():
+    x = np.ones((64, 4), dtype=np.float32)
+    return tf.data.Dataset.from_tensor_slices((x, x[:, :1]))
+
+
+class StepTimerTest(tf.test.TestCase):
+
+    def test_slow_input_is_flagged(self):
+        stats = step_timing.PipelineStats()
+        ds = stats.map(_dataset().batch(4), lambda x, y: (_sleep(0.05)(x), y), "slow")
+
+        timer, lines = _fit(stats, stats.deliver(ds), _model())
+
+        self.assertEqual([line["event"] for line in lines], (["step"] * 6 + ["epoch"]) * 2)
+        for summary in timer.epochs:
+            self.assertTrue(summary["input_bound"])
+            self.assertGreater(summary["wait_ms_mean"], 40.)
+            self.assertGreater(summary["stages"]["slow"]["mean_ms"], 45.)
+            self.assertEqual(summary["stages"]["slow"]["count"], 6)
+
+    def test_slow_train_step_is_compute_bound(self):
+        stats = step_timing.PipelineStats()
+        ds = stats.deliver(_dataset().batch(4).prefetch(2))
+
+        timer, _ = _fit(stats, ds, _model(seconds=0.05))
+
+        for summary in timer.epochs:
+            self.assertFalse(summary["input_bound"])
+            self.assertLess(summary["wait_ms_mean"], 10.)
+            self.assertGreater(summary["compute_ms_mean"], 45.)
+
+    def test_untimed_stages_are_plain_maps(self):
+        stats = step_timing.PipelineStats(time_stages=False)
+        ds = stats.map(_dataset().batch(4), lambda x, y: (2 * x, y), "double")
+
+        self.assertAllEqual(next(iter(ds))[0], 2 * np.ones((4, 4)))
+        self.assertEqual(stats.drain_latencies(), {})
+
+
+if __name__ == "__main__":
+    tf.test.main()
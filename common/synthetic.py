@@ -0,0 +1,74 @@
+""" synthetic corpora with the same layout as the kaggle downloads
+
+video: `root/{split}/{split}/{LABEL}/{clip}/{clip}_{frame}.jpg`
+accelerometer: `root/train.csv` and `root/test.csv` (list valued x, y, z columns, test has no gesture)
+
+used for the builders' dummy_data and `build_benchmark.py`
+
+"""
+
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+
+VIDEO_LABELS = ["CLOCKWISE", "COUNTERCLOCKWISE", "DOWN", "UP", "LEFT", "RIGHT"]
+
+
+def write_video_corpus(root, clips_per_split=None, frames=(20, 40), height=240, width=320, seed=0):
+    """write jpeg clip folders, returns the number of clips per split
+
+    params:
+        clips_per_split: {split: number of clips} (default: {"train": 12, "validation": 6, "test": 6})
+        frames: (min, max) frames per clip
+    """
+    clips_per_split = clips_per_split or {"train": 12, "validation": 6, "test": 6}
+    rng = np.random.default_rng(seed)
+    root = Path(root)
+
+    for split, num_clips in clips_per_split.items():
+        for i in range(num_clips):
+            label = VIDEO_LABELS[i % len(VIDEO_LABELS)]
+            clip = f"{split}_{label.lower()}_{i}"
+
+            clip_dir = root / split / split / label / clip
+            clip_dir.mkdir(parents=True, exist_ok=True)
+
+            # smooth noise moving across the frame, realistic jpeg sizes
+            background = rng.uniform(0, 255, (max(1, height // 8), max(1, width // 8) * 2, 3)).astype(np.float32)
+            for f in range(int(rng.integers(frames[0], frames[1] + 1))):
+                shift = f % (background.shape[1] // 2)
+                frame = background[:, shift : shift + max(1, width // 8)]
+                frame = tf.cast(tf.image.resize(frame, (height, width)), tf.uint8)
+                (clip_dir / f"{clip}_{f}.jpg").write_bytes(tf.io.encode_jpeg(frame).numpy())
+
+    return clips_per_split
+
+
+def _list_cell(values):
+    return "[" + ", ".join(f"{v:.4f}" for v in values) + "]"
+
+
+def write_accelerometer_corpus(root, train=140, test=60, users=7, samples=(19, 51), seed=0):
+    """write train.csv & test.csv, returns {"train": train, "test": test}
+
+    params:
+        samples: (min, max) accelerometer samples per gesture
+    """
+    rng = np.random.default_rng(seed)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    for split, num_gestures in [("train", train), ("test", test)]:
+        with open(root / f"{split}.csv", "w") as f:
+            f.write("id,user,gesture,x,y,z\n" if split == "train" else "id,user,x,y,z\n")
+
+            for i in range(num_gestures):
+                length = int(rng.integers(samples[0], samples[1] + 1))
+                x, y, z = rng.normal(size=(3, length))
+
+                gesture = f"{int(rng.integers(0, 20))}," if split == "train" else ""
+                f.write(f'{i},{i % users},{gesture}"{_list_cell(x)}","{_list_cell(y)}","{_list_cell(z)}"\n')
+
+    return {"train": train, "test": test}
@@ -0,0 +1,28 @@
+"""pytest configuration
+
+accelerometer/ and video/ both have top level modules of the same name (`models`, `data_utils`, `train`),
+the test modules of a directory import that directory's modules
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+
+def pytest_collectstart(collector):
+    if not isinstance(collector, pytest.Module):
+        return
+
+    directory = collector.path.parent
+    if (directory / "__init__.py").exists():  # packages import their modules by package
+        return
+
+    if str(directory) in sys.path:
+        sys.path.remove(str(directory))
+    sys.path.insert(0, str(directory))
+
+    for path in directory.glob("*.py"):
+        module = sys.modules.get(path.stem)
+        if module is not None and Path(getattr(module, "__file__", None) or "").resolve().parent != directory:
+            del sys.modules[path.stem]
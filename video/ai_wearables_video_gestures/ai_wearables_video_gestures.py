@@ -1,10 +1,19 @@
 """ai_wearables_video_gestures dataset."""
 
+import functools
+import os
+import sys
+
+import numpy as np
 import tensorflow as tf
 import tensorflow_datasets as tfds
 
 from pathlib import Path
 
+# video/ (the decoders), pre-sampled configs keep the frames `decoders.decode_video_segment` picks
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import decoders
+
 # TODO(ai_wearables_video_gestures): Markdown description  that will appear on the catalog page.
 _DESCRIPTION = """
 Video Gesture dataset created by 2021 AI Wearables UNT course
@@ -14,16 +23,96 @@ Video Gesture dataset created by 2021 AI Wearables UNT course
 _CITATION = """
 """
 
+# sidecar table written next to the shards (see `AiWearablesVideoGestures.download_and_prepare`)
+METADATA_FILENAME = "metadata.csv"
+
+
+def _list_clips(path):
+    """yields (label, clip directory) for every clip in a split directory, does not touch the frames"""
+
+    for p in sorted(path.iterdir()):
+
+        # eg. "CLOCKWISE, UP, ..."
+        if p.is_dir():
+
+            label = p.stem.lower()
+
+            for example in sorted(p.iterdir()):
+
+                if example.is_dir():
+                    yield label, example
+
+
+def _load_frames(image_list, height, width):
+    """decode and resize jpeg frames, returns uint8 array (frames, height, width, 3)"""
+
+    video = tf.stack([tf.image.decode_jpeg(tf.io.read_file(str(p)), channels=3) for p in image_list])
+    video = tf.image.resize(video, (height, width), method="area", antialias=True)
+
+    return tf.cast(tf.round(video), tf.uint8).numpy()
+
+
+def _process_clip(clip, height=None, width=None, num_segments=None):
+    """returns (key, example) for a single clip directory
+
+    module level (and picklable) so it can be shipped to beam workers
+    """
+    label, example = clip
+
+    key = example.stem
+    image_list = sorted(list(example.glob("*.jpg")), key=lambda i: i.stem.split("_")[-1])
+
+    if not image_list:
+        raise ValueError(f"clip {example} has no frames")
+
+    if num_segments is not None:
+        image_list = [image_list[i] for i in decoders.segment_indices(len(image_list), num_segments).numpy()]
+
+    # untouched jpeg files are stored as is, only re-encode when resizing
+    video = image_list if height is None else _load_frames(image_list, height, width)
+
+    return key, {'video': video, "label": label, "frames": len(image_list), "id": key}
+
+
+class VideoGesturesConfig(tfds.core.BuilderConfig):
+    """BuilderConfig for AiWearablesVideoGestures
+
+    params:
+        height, width: int, resize every frame at build time (default: keep 240x320)
+        num_segments: int, only keep the centered frame of `num_segments` segments (default: keep all)
+    """
+
+    def __init__(self, *, height=None, width=None, num_segments=None, **kwargs):
+        if (height is None) != (width is None):
+            raise ValueError("height and width have to be given together")
+
+        super(VideoGesturesConfig, self).__init__(**kwargs)
+        self.height = height
+        self.width = width
+        self.num_segments = num_segments
+
 
 class AiWearablesVideoGestures(tfds.core.GeneratorBasedBuilder):
     
     """DatasetBuilder for ai_wearables_video_gestures dataset."""
 
-    VERSION = tfds.core.Version('1.0.0')
+    VERSION = tfds.core.Version('1.1.0')
     RELEASE_NOTES = {
         '1.0.0': 'Initial release.',
+        '1.1.0': 'Add resized and pre-sampled builder configs.',
     }
 
+    # first config is the default, eg. tfds.load("ai_wearables_video_gestures/120x160_seg8")
+    BUILDER_CONFIGS = [
+        VideoGesturesConfig(name="default", description="full resolution (240x320), every frame"),
+        VideoGesturesConfig(name="120x160", height=120, width=160, description="frames resized to 120x160"),
+        VideoGesturesConfig(name="64x64", height=64, width=64, description="frames resized to 64x64"),
+        VideoGesturesConfig(name="seg8", num_segments=8, description="8 frames, centered frame of 8 equal segments"),
+        VideoGesturesConfig(
+            name="120x160_seg8", height=120, width=160, num_segments=8, description="8 frames resized to 120x160"
+        ),
+    ]
+
     def _info(self) -> tfds.core.DatasetInfo:
         """Returns the dataset metadata."""
         # TODO(ai_wearables_video_gestures): Specifies the tfds.core.DatasetInfo object
@@ -32,7 +121,11 @@ class AiWearablesVideoGestures(tfds.core.GeneratorBasedBuilder):
             description=_DESCRIPTION,
             features=tfds.features.FeaturesDict({
                 # These are the features of your dataset like images, labels ...
-                'video': tfds.features.Video(shape=(None, None, None, 3), dtype=tf.dtypes.uint8, encoding_format="jpeg"),
+                'video': tfds.features.Video(
+                    shape=(self.builder_config.num_segments, self.builder_config.height, self.builder_config.width, 3),
+                    dtype=tf.dtypes.uint8,
+                    encoding_format="jpeg"
+                ),
                 'label': tfds.features.ClassLabel(names=["clockwise", "counterclockwise", "down", "up", "left", "right"]),
                 'frames': tf.dtypes.int32,
                 'id': tf.dtypes.string    
@@ -45,34 +138,173 @@ class AiWearablesVideoGestures(tfds.core.GeneratorBasedBuilder):
             citation=_CITATION,
         )
 
+    # set with `build_with_beam(...)`, fans clip directories out across beam workers
+    use_beam = False
+
     def _split_generators(self, dl_manager: tfds.download.DownloadManager):
         """Returns SplitGenerators."""
         # requires manual download
         path = dl_manager.download_kaggle_data("handgesturevideoclassification")
 
+        generate = self._generate_examples_beam if self.use_beam else self._generate_examples
+
         # Returns the Dict[split names, Iterator[Key, Example]]
         return {
-            'train': self._generate_examples(path / 'train' / 'train'),
-            'validation': self._generate_examples(path / 'validation' / 'validation'),
-            'test': self._generate_examples(path / 'test' / 'test')
+            'train': generate(path / 'train' / 'train'),
+            'validation': generate(path / 'validation' / 'validation'),
+            'test': generate(path / 'test' / 'test')
         }
 
     def _generate_examples(self, path):
         """Yields examples."""  
 
-        for p in path.iterdir():
+        process_clip = self._clip_processor()
+
+        for clip in _list_clips(path):
+            yield process_clip(clip)
+
+    def _generate_examples_beam(self, path):
+        """Returns a beam PTransform producing the same (key, example) pairs as `_generate_examples`.
+
+        Only the split directory is listed here, globbing the frames and encoding the video
+        happen on the workers. tfds orders examples by key, so the written shards are the same
+        as the serial builder.
+        """
+        beam = tfds.core.lazy_imports.apache_beam
+
+        return (
+            beam.Create(list(_list_clips(path)))
+            | beam.Reshuffle()
+            | beam.Map(self._clip_processor())
+        )
+
+    def download_and_prepare(self, *args, **kwargs):
+        """prepares the dataset (see `tfds.core.DatasetBuilder.download_and_prepare`)
+        
+        and writes the metadata sidecar table, also for datasets prepared before the sidecar existed,
+        a sidecar that doesn't match the prepared shards (see `_metadata_is_current`) is written again
+        """
+        super(AiWearablesVideoGestures, self).download_and_prepare(*args, **kwargs)
+
+        if not self._metadata_is_current():
+            self._write_metadata()
+
+    def _metadata_is_current(self):
+        """True if the sidecar has as many rows per split & shard as the prepared shards hold records"""
+        pd = tfds.core.lazy_imports.pandas
+
+        path = Path(os.fspath(self.data_dir)) / METADATA_FILENAME
+        if not path.exists():
+            return False
+
+        metadata = pd.read_csv(path, usecols=["split", "shard"])
+        recorded = {(split, int(shard)): n for (split, shard), n in metadata.groupby(["split", "shard"]).size().items()}
+
+        prepared = {
+            (split, shard): length
+            for split, split_info in self.info.splits.items()
+            for shard, length in enumerate(split_info.shard_lengths)
+            if length > 0
+        }
+
+        return recorded == prepared
+
+    def _write_metadata(self):
+        """one pass over the shards (no jpeg decoding), writes one row per clip to `METADATA_FILENAME`
 
-            # eg. "CLOCKWISE, UP, ..."
-            if p.is_dir():
+        columns: id, label, frames, split, height, width, channels, shard, offset (record in shard)
+        """
+        pd = tfds.core.lazy_imports.pandas
 
-                label = p.stem.lower()
+        def metadata(example):
+            # dimensions from the jpeg header of the first frame
+            shape = tf.cond(
+                tf.size(example["video"]) > 0,
+                lambda: tf.image.extract_jpeg_shape(example["video"][0]),
+                lambda: tf.zeros((3,), dtype=tf.int32),
+            )
+            return {"id": example["id"], "label": example["label"], "frames": example["frames"], "shape": shape}
 
-                for example in p.iterdir():
+        rows = []
+        for split, split_info in self.info.splits.items():
 
-                    if example.is_dir():
-                        key = example.stem
-                        image_list = sorted(list(example.glob("*.jpg")), key=lambda i: i.stem.split("_")[-1])
+            shard_starts = np.cumsum([0] + list(split_info.shard_lengths))
 
-                        yield key, {'video': image_list, "label": label, "frames": len(image_list), "id": key}
+            # one shard after the other (by default shards are interleaved), positions are on disk positions
+            ds = self.as_dataset(
+                split=split,
+                decoders={"video": tfds.decode.SkipDecoding()},
+                shuffle_files=False,
+                read_config=tfds.ReadConfig(interleave_cycle_length=1),
+            )
+
+            for position, example in enumerate(ds.map(metadata).as_numpy_iterator()):
+                shard = int(np.searchsorted(shard_starts, position, side="right")) - 1
+
+                rows.append({
+                    "id": example["id"].decode("utf-8"),
+                    "label": example["label"],
+                    "frames": example["frames"],
+                    "split": split,
+                    "height": example["shape"][0],
+                    "width": example["shape"][1],
+                    "channels": example["shape"][2],
+                    "shard": shard,
+                    "offset": position - shard_starts[shard],
+                })
+
+        path = Path(os.fspath(self.data_dir)) / METADATA_FILENAME
+        pd.DataFrame(rows).to_csv(path.with_suffix(".tmp"), index=False)
+        path.with_suffix(".tmp").rename(path)
+
+    def _clip_processor(self):
+        """`_process_clip` bound to the builder config"""
+        return functools.partial(
+            _process_clip,
+            height=self.builder_config.height,
+            width=self.builder_config.width,
+            num_segments=self.builder_config.num_segments,
+        )
+
+
+def build_with_beam(data_dir=None, num_workers=None, **builder_kwargs):
+    """download_and_prepare `AiWearablesVideoGestures` with a multi process beam DirectRunner
+
+    params:
+        data_dir: str, same as `tfds.load(..., data_dir=...)`
+        num_workers: int, number of worker processes (default: os.cpu_count())
+        builder_kwargs: forwarded to the builder (eg. config=...)
+
+    returns:
+        the prepared builder
+    """
+    beam = tfds.core.lazy_imports.apache_beam
+
+    builder = AiWearablesVideoGestures(data_dir=data_dir, **builder_kwargs)
+    builder.use_beam = True
+
+    beam_options = beam.options.pipeline_options.PipelineOptions(
+        runner="DirectRunner",
+        direct_num_workers=num_workers or os.cpu_count(),
+        direct_running_mode="multi_processing",
+    )
+
+    # worker processes unpickle `_process_clip`, they have to import this package like the caller,
+    # PYTHONPATH is only extended while they are started (restored for later subprocesses)
+    package_root = str(Path(__file__).resolve().parents[1])
+    previous = os.environ.get("PYTHONPATH")
+    pythonpath = (previous or "").split(os.pathsep)
+    if package_root not in pythonpath:
+        os.environ["PYTHONPATH"] = os.pathsep.join([package_root] + [p for p in pythonpath if p])
+
+    try:
+        builder.download_and_prepare(
+            download_config=tfds.download.DownloadConfig(beam_options=beam_options)
+        )
+    finally:
+        if previous is None:
+            os.environ.pop("PYTHONPATH", None)
+        else:
+            os.environ["PYTHONPATH"] = previous
 
-        
\ No newline at end of file
+    return builder
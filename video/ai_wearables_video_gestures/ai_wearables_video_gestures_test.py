@@ -1,8 +1,19 @@
 """ai_wearables_video_gestures dataset."""
 
+import os
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+import tensorflow as tf
 import tensorflow_datasets as tfds
 from . import ai_wearables_video_gestures
 
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common import synthetic
+
 
 class AiWearablesVideoGesturesTest(tfds.testing.DatasetBuilderTestCase):
   """Tests for ai_wearables_video_gestures dataset."""
@@ -10,6 +21,7 @@ class AiWearablesVideoGesturesTest(tfds.testing.DatasetBuilderTestCase):
   DATASET_CLASS = ai_wearables_video_gestures.AiWearablesVideoGestures
   SPLITS = {
       'train': 3,  # Number of fake train example
+      'validation': 1,  # Number of fake validation example
       'test': 1,  # Number of fake test example
   }
 
@@ -19,6 +31,132 @@ class AiWearablesVideoGesturesTest(tfds.testing.DatasetBuilderTestCase):
   # fake data directory
   # DL_EXTRACT_RESULT = {'some_key': 'output_file1.txt', ...}
 
+  # `download_kaggle_data` returns the dummy_data directory itself
+  # (regenerate it with `common.synthetic`)
+  DL_DOWNLOAD_RESULT = ''
+
+
+class AiWearablesVideoGesturesConfigsTest(AiWearablesVideoGesturesTest):
+  """resized and pre-sampled configs, every stored clip has the config's shape"""
+  BUILDER_CONFIG_NAMES_TO_TEST = ['120x160', 'seg8', '120x160_seg8']
+
+  def test_stored_video_shape(self):
+    # dummy frames are 24x32
+    shapes = {'120x160': (None, 120, 160), 'seg8': (8, 24, 32), '120x160_seg8': (8, 120, 160)}
+
+    for name, (frames, height, width) in shapes.items():
+      builder = self.DATASET_CLASS(config=name, data_dir=os.path.join(self.tmp_dir, name))
+      with mock.patch.object(
+          tfds.download.DownloadManager, 'download_kaggle_data', lambda dl_manager, _: Path(self.dummy_data)
+      ):
+        builder.download_and_prepare()
+
+      for example in builder.as_dataset(split='train').as_numpy_iterator():
+        self.assertEqual(example['video'].shape, (frames or example['frames'], height, width, 3))
+        self.assertEqual(example['frames'], len(example['video']))
+
+
+class ConfigTest(tf.test.TestCase):
+
+  def test_height_and_width_together(self):
+    for kwargs in [{'height': 64}, {'width': 64}]:
+      with self.assertRaises(ValueError):
+        ai_wearables_video_gestures.VideoGesturesConfig(name='bad', **kwargs)
+
+
+class MetadataTest(tf.test.TestCase):
+  """the sidecar table points at the records of a multi shard build"""
+
+  def test_shard_and_offset_of_every_clip(self):
+    root = Path(self.get_temp_dir())
+    synthetic.write_video_corpus(
+        root / 'corpus', {'train': 60, 'validation': 3, 'test': 3}, frames=(2, 4), height=16, width=16
+    )
+
+    with mock.patch.object(
+        tfds.download.DownloadManager, 'download_kaggle_data', lambda self, name: root / 'corpus'
+    ):
+      builder = ai_wearables_video_gestures.AiWearablesVideoGestures(data_dir=root / 'data')
+      builder.download_and_prepare(download_config=tfds.download.DownloadConfig(num_shards=3))
+
+    split_info = builder.info.splits['train']
+    self.assertEqual(split_info.num_shards, 3)
+
+    metadata = pd.read_csv(Path(os.fspath(builder.data_dir)) / ai_wearables_video_gestures.METADATA_FILENAME)
+    metadata = metadata[metadata['split'] == 'train']
+    self.assertLen(metadata, 60)
+
+    # ids of the records as written, shard by shard
+    records = {}
+    for shard, filename in enumerate(split_info.filenames):
+      for offset, record in enumerate(tf.data.TFRecordDataset(str(Path(os.fspath(builder.data_dir)) / filename))):
+        example = tf.train.Example.FromString(record.numpy())
+        records[(shard, offset)] = example.features.feature['id'].bytes_list.value[0].decode('utf-8')
+
+    for row in metadata.itertuples():
+      self.assertEqual(records[(row.shard, row.offset)], row.id)
+
+  def test_stale_sidecar_is_written_again(self):
+    root = Path(self.get_temp_dir())
+    synthetic.write_video_corpus(
+        root / 'corpus', {'train': 6, 'validation': 2, 'test': 2}, frames=(2, 4), height=16, width=16
+    )
+
+    with mock.patch.object(
+        tfds.download.DownloadManager, 'download_kaggle_data', lambda self, name: root / 'corpus'
+    ):
+      builder = ai_wearables_video_gestures.AiWearablesVideoGestures(data_dir=root / 'data')
+      builder.download_and_prepare()
+
+      path = Path(os.fspath(builder.data_dir)) / ai_wearables_video_gestures.METADATA_FILENAME
+      expected = pd.read_csv(path)
+
+      # eg. the sidecar of an earlier build of the same version
+      expected.head(3).to_csv(path, index=False)
+      self.assertFalse(builder._metadata_is_current())
+
+      builder.download_and_prepare()
+
+    self.assertTrue(builder._metadata_is_current())
+    pd.testing.assert_frame_equal(pd.read_csv(path), expected)
+
+
+class BeamBuildTest(tf.test.TestCase):
+  """`build_with_beam` writes the same examples and sidecar as the serial builder"""
+
+  def test_same_as_serial_build(self):
+    root = Path(self.get_temp_dir())
+    synthetic.write_video_corpus(
+        root / 'corpus', {'train': 8, 'validation': 3, 'test': 3}, frames=(2, 4), height=16, width=16
+    )
+
+    with mock.patch.object(
+        tfds.download.DownloadManager, 'download_kaggle_data', lambda self, name: root / 'corpus'
+    ):
+      serial = ai_wearables_video_gestures.AiWearablesVideoGestures(data_dir=root / 'serial')
+      serial.download_and_prepare()
+      beam = ai_wearables_video_gestures.build_with_beam(data_dir=root / 'beam', num_workers=2)
+
+    self.assertTrue(beam.use_beam)
+
+    for split in ['train', 'validation', 'test']:
+      examples = [
+          list(builder.as_dataset(split=split, shuffle_files=False).as_numpy_iterator())
+          for builder in [serial, beam]
+      ]
+
+      self.assertEqual([ex['id'] for ex in examples[0]], [ex['id'] for ex in examples[1]])
+      for ex_serial, ex_beam in zip(*examples):
+        self.assertEqual(ex_serial['label'], ex_beam['label'])
+        self.assertEqual(ex_serial['frames'], ex_beam['frames'])
+        self.assertAllEqual(ex_serial['video'], ex_beam['video'])
+
+    metadata = [
+        pd.read_csv(Path(os.fspath(builder.data_dir)) / ai_wearables_video_gestures.METADATA_FILENAME)
+        for builder in [serial, beam]
+    ]
+    pd.testing.assert_frame_equal(*metadata)
+
 
 if __name__ == '__main__':
   tfds.testing.test_main()
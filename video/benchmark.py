@@ -0,0 +1,209 @@
+""" input pipeline benchmarks
+
+synthetic jpeg clips are pushed through each decoder configuration with tf.data on CPU,
+reports clips/sec, frames/sec, per clip latency percentiles and peak RSS,
+every configuration runs in a fresh process so peak RSS is per configuration
+
+    python benchmark.py                                  # print results
+    python benchmark.py --save benchmark_baseline.json   # store a baseline
+    python benchmark.py --baseline benchmark_baseline.json  # fail on regressions
+
+"""
+
+import argparse
+import concurrent.futures
+import functools
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import tensorflow as tf
+
+import decoders
+
+
+# name: (decode function, frames in the decoded clip)
+DECODERS = {
+    "decode_video_segment": (functools.partial(decoders.decode_video_segment, num_segments=8), 8),
+    "decode_video_segment_ratio4": (functools.partial(decoders.decode_video_segment, num_segments=8, ratio=4), 8),
+    "decode_video_start": (functools.partial(decoders.decode_video, window_size=16, loop=True, start="start"), 16),
+    "decode_video_random": (functools.partial(decoders.decode_video, window_size=16, loop=True, start="random"), 16),
+    "decode_video_centered": (functools.partial(decoders.decode_video, window_size=16, loop=True, start="centered"), 16),
+}
+
+# batched augmentations of decoded "decode_video_segment" clips
+AUGMENTATIONS = ["random_manipulation", "random_manipulation_batch"]
+
+# params of the synthetic fixture, results are only comparable to a baseline of the same fixture
+FIXTURE = ["height", "width", "frames", "clips", "steps"]
+
+
+def synthetic_clips(num_clips=8, frames=32, height=240, width=320, seed=0):
+    """in memory dataset of encoded clips, like `tfds.load(..., decoders={"video": tfds.decode.SkipDecoding()})`
+
+    frames are smooth random images (upscaled noise) so jpeg sizes are realistic
+    """
+    rng = np.random.default_rng(seed)
+
+    clips = []
+    for i in range(num_clips):
+        noise = rng.uniform(0, 255, (frames, height // 8, width // 8, 3)).astype(np.float32)
+        video = tf.cast(tf.image.resize(noise, (height, width)), tf.uint8)
+        clips.append(tf.stack([tf.io.encode_jpeg(frame) for frame in video]))
+
+    return tf.data.Dataset.from_tensor_slices(
+        {
+            "video": tf.stack(clips),
+            "frames": tf.fill((num_clips,), frames),
+            "label": tf.constant(np.arange(num_clips) % 6),
+            "id": tf.constant([f"clip_{i}" for i in range(num_clips)]),
+        }
+    )
+
+
+def peak_rss_mb():
+    """peak resident set size of this process so far (linux reports KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def measure(ds, steps, clips_per_element=1, frames_per_clip=1):
+    """iterate `steps` elements of `ds` (after one warm up element)
+
+    returns throughput, latency percentiles (ms per element) and peak RSS
+    """
+
+    iterator = iter(ds)
+    next(iterator)
+
+    latencies = np.empty(steps)
+    start = time.perf_counter()
+    for i in range(steps):
+        t = time.perf_counter()
+        next(iterator)
+        latencies[i] = time.perf_counter() - t
+    total = time.perf_counter() - start
+
+    clips_per_sec = steps * clips_per_element / total
+
+    return {
+        "clips_per_sec": clips_per_sec,
+        "frames_per_sec": clips_per_sec * frames_per_clip,
+        "latency_ms_p50": float(np.percentile(latencies, 50) * 1000),
+        "latency_ms_p90": float(np.percentile(latencies, 90) * 1000),
+        "latency_ms_p99": float(np.percentile(latencies, 99) * 1000),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _pipeline(name, num_clips, frames, height, width, batch_size):
+    """(dataset, clips per element, frames per clip) of one configuration"""
+
+    clips = synthetic_clips(num_clips, frames, height, width).cache().repeat()
+
+    if name in DECODERS:
+        decode, decoded_frames = DECODERS[name]
+        return clips.map(decode), 1, decoded_frames
+
+    # augmentation on already decoded clips (random_manipulation is per clip, before batching)
+    decoded = clips.map(DECODERS["decode_video_segment"][0]).take(num_clips).cache().repeat()
+    if name == "random_manipulation":
+        return decoded.map(decoders.random_manipulation).batch(batch_size), batch_size, 8
+    return decoded.batch(batch_size).map(decoders.random_manipulation_batch), batch_size, 8
+
+
+def _measure(name, num_clips, frames, height, width, steps, batch_size):
+    """runs in a spawned process: measure one configuration on CPU"""
+
+    with tf.device("CPU"):
+        ds, clips_per_element, frames_per_clip = _pipeline(name, num_clips, frames, height, width, batch_size)
+        if name not in DECODERS:
+            steps = max(5, steps // 4)
+        return measure(ds, steps, clips_per_element=clips_per_element, frames_per_clip=frames_per_clip)
+
+
+def run(num_clips=8, frames=32, height=240, width=320, steps=50, batch_size=16):
+    """benchmark every decoder, then the augmentations on decoded batches
+
+    every configuration runs in a fresh process, so its peak RSS doesn't include the ones before it
+    """
+
+    results = {}
+    for name in [*DECODERS, *AUGMENTATIONS]:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results[name] = executor.submit(
+                _measure, name, num_clips, frames, height, width, steps, batch_size
+            ).result()
+
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    """names of the configurations whose throughput dropped more than `tolerance` below the baseline"""
+
+    return [
+        name
+        for name, result in results.items()
+        if name in baseline and result["clips_per_sec"] < (1. - tolerance) * baseline[name]["clips_per_sec"]
+    ]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--frames", type=int, default=32, help="frames per synthetic clip")
+    parser.add_argument("--clips", type=int, default=8, help="number of synthetic clips")
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--save", help="write results as baseline json")
+    parser.add_argument("--baseline", help="compare against this baseline json")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed throughput drop (fraction)")
+    args = parser.parse_args()
+
+    fixture = {k: getattr(args, k) for k in FIXTURE}
+
+    # checked before running, a baseline of another fixture is not comparable
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        if baseline.get("fixture") != fixture:
+            print(f"baseline fixture {baseline.get('fixture')} differs from {fixture}, not comparing")
+            sys.exit(2)
+
+    results = run(args.clips, args.frames, args.height, args.width, args.steps)
+
+    print(f"{'':>28} {'clips/s':>9} {'frames/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'rss MB':>8}")
+    for name, r in results.items():
+        print(
+            f"{name:>28} {r['clips_per_sec']:9.1f} {r['frames_per_sec']:9.1f} {r['latency_ms_p50']:8.2f} "
+            f"{r['latency_ms_p90']:8.2f} {r['latency_ms_p99']:8.2f} {r['peak_rss_mb']:8.0f}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {"fixture": fixture, "results": results},
+                f,
+                indent=2,
+            )
+
+    if baseline is not None:
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"throughput regressions (> {args.tolerance:.0%} slower than baseline): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+
+    main()
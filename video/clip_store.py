@@ -0,0 +1,219 @@
+""" memory mapped store of decoded clips
+
+decode (and sample) every clip once, then read uint8 clips straight from the
+mapped file each epoch (page cache reads, no jpeg decode or record parsing)
+
+    path = clip_store.get_or_export(ds["train"], "./clip_store", "train", {"num_segments": 8}, source=clip_store.source(ds_info))
+    train = clip_store.load(path, batch_size=16, shuffle=True)
+
+an optional batch `transform` stores something else per clip (eg. per frame backbone embeddings,
+see `embeddings.py`), written as `dtype`
+
+the store lives in `root/split/<key>`, where key is a hash of the decode parameters and of the
+source dataset (tfds name, config & version, see `source`, and its number of examples),
+stores with other parameters or of another build are invalidated (deleted) by `get_or_export`,
+anything else in `root/split` (directories without a store index, files) is left alone
+
+"""
+
+import functools
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import decoders
+
+
+def cache_key(params: dict) -> str:
+    """short, stable hash of the decode parameters"""
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def source(ds_info) -> dict:
+    """identity of a tfds dataset build (name, config, version), see `get_or_export`"""
+    return {"name": ds_info.name, "config": ds_info.config_name, "version": str(ds_info.version)}
+
+
+def count(ds: tf.data.Dataset) -> int:
+    """number of examples of `ds`, counted in one pass if tf.data does not know it"""
+    num_examples = int(ds.cardinality())
+    if num_examples < 0:
+        num_examples = int(ds.reduce(0, lambda count, _: count + 1))
+    return num_examples
+
+
+def read_index(path) -> dict:
+    """returns the store index (params, shape, count, ...) or None if there is no complete store"""
+
+    index = Path(path) / "index.json"
+    if not index.exists():
+        return None
+
+    index = json.loads(index.read_text())
+
+    return index if index.get("complete", False) else None
+
+
+def is_valid(path, params: dict, source: dict = None) -> bool:
+    """True if `path` holds a complete store exported with `params` (and from `source`, if given)"""
+    index = read_index(path)
+    return index is not None and index["params"] == params and (source is None or index.get("source") == source)
+
+
+def export(
+    ds: tf.data.Dataset,
+    path,
+    params: dict,
+    decode_fn=decoders.decode_video_segment,
+    transform=None,
+    dtype: str = "uint8",
+    batch_size: int = 8,
+    source: dict = None,
+) -> Path:
+    """decode every example of `ds` once and write the clips to a memory mapped array
+
+    params:
+        ds: un-decoded dataset (load with `decoders={"video": tfds.decode.SkipDecoding()}`)
+        path: directory of the store, anything in it is overwritten
+        params: kwargs of `decode_fn`, must always sample the same frames (no random start)
+        decode_fn: decoder returning an example with a float [0, 1] "video"
+        transform: None or fn of a batch of decoded clips (batch, frames, height, width, 3),
+            returns the (batch, ...) values stored per clip
+        dtype: "uint8" quantizes float [0, 1] values to [0, 255], other dtypes store them as is
+        batch_size: clips per `transform` call
+        source: identity of `ds` recorded in the index (see `get_or_export`)
+
+    returns:
+        path
+    """
+    num_examples = count(ds)
+
+    if num_examples == 0:
+        raise ValueError(f"can not export an empty dataset to {path}")
+
+    path = Path(path)
+    if path.exists():
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+
+    decoded = ds.map(functools.partial(decode_fn, **params), num_parallel_calls=tf.data.AUTOTUNE)
+    decoded = decoded.batch(batch_size).prefetch(1)
+
+    def stored(video):
+        if transform is not None:
+            video = transform(video)
+        if dtype == "uint8":
+            return tf.cast(tf.round(video * 255.), tf.dtypes.uint8).numpy()
+        return tf.cast(video, dtype).numpy()
+
+    clips = None
+    labels = np.empty((num_examples,), dtype=np.int64)
+    ids = []
+
+    start = 0
+    for batch in decoded:
+        video = stored(batch["video"])
+
+        # clip shape is only known after the first batch
+        if clips is None:
+            clips = np.lib.format.open_memmap(
+                path / "clips.npy", mode="w+", dtype=dtype, shape=(num_examples,) + video.shape[1:]
+            )
+
+        clips[start : start + len(video)] = video
+        labels[start : start + len(video)] = batch["label"].numpy()
+        ids.extend(batch["id"].numpy())
+        start += len(video)
+
+    clips.flush()
+    np.save(path / "labels.npy", labels)
+    np.save(path / "ids.npy", np.array(ids, dtype=bytes))
+
+    # written last, a store without a complete index is never read
+    (path / "index.json").write_text(
+        json.dumps(
+            {
+                "params": params,
+                "source": source,
+                "shape": list(clips.shape),
+                "dtype": dtype,
+                "count": num_examples,
+                "complete": True,
+            },
+            indent=2,
+        )
+    )
+
+    return path
+
+
+def get_or_export(
+    ds: tf.data.Dataset, root, split: str, params: dict, decode_fn=decoders.decode_video_segment, source: dict = None, **export_kwargs
+) -> Path:
+    """path of the store for (split, params, source), exporting it first if needed
+
+    stores of the same split with different parameters are deleted, `export_kwargs` are passed to `export`
+    (`params` has to cover everything that changes the stored values, eg. the transform's parameters)
+
+    source: identity of the dataset `ds` was loaded from (see `source`), the number of examples of
+        `ds` is always part of it, so a rebuilt dataset (new version, config or clips) is exported again
+    """
+    source = {**(source or {}), "count": count(ds)}
+
+    split_root = Path(root) / split
+    path = split_root / cache_key({"params": params, "source": source})
+
+    if split_root.exists():
+        for stale in split_root.iterdir():
+            if stale != path and (stale / "index.json").is_file():
+                shutil.rmtree(stale)
+
+    if not is_valid(path, params, source):
+        export(ds, path, params, decode_fn=decode_fn, source=source, **export_kwargs)
+
+    return path
+
+
+def load(path, batch_size: int, shuffle: bool = False, seed=None) -> tf.data.Dataset:
+    """tf.data pipeline of batches read from the memory mapped store
+
+    yields dicts like the decoders ("video" float [0, 1], "label", "id"),
+    but already batched (a whole batch is one slice/gather of the mapped array)
+
+    stores of other dtypes (eg. float16 embeddings, see `embeddings.py`) are read as float32, unscaled
+    """
+    path = Path(path)
+    index = read_index(path)
+    if index is None:
+        raise ValueError(f"no complete clip store in {path}, run `export` first")
+
+    clips = np.load(path / "clips.npy", mmap_mode="r")
+    dtype = tf.as_dtype(index.get("dtype", "uint8"))
+    labels = tf.constant(np.load(path / "labels.npy"))
+    ids = tf.constant(np.load(path / "ids.npy"))
+
+    def read(indices):
+        return clips[indices]
+
+    def to_example(indices):
+        # sorted indices read the file (mostly) sequentially
+        indices = tf.sort(indices)
+        video = tf.numpy_function(read, [indices], dtype, stateful=False)
+        video = tf.ensure_shape(video, [None] + index["shape"][1:])
+        video = tf.cast(video, tf.dtypes.float32)
+
+        return {
+            "video": video / 255. if dtype == tf.dtypes.uint8 else video,
+            "label": tf.gather(labels, indices),
+            "id": tf.gather(ids, indices),
+        }
+
+    ds = tf.data.Dataset.range(index["count"])
+    if shuffle:
+        ds = ds.shuffle(index["count"], seed=seed, reshuffle_each_iteration=True)
+
+    return ds.batch(batch_size).map(to_example, num_parallel_calls=tf.data.AUTOTUNE).prefetch(1)
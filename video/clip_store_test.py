@@ -0,0 +1,121 @@
+"""tests for clip_store.py"""
+
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import clip_store
+
+
+def _raw_dataset(num_clips=5, frames=12):
+    """un-decoded dataset like `tfds.load(..., decoders={"video": tfds.decode.SkipDecoding()})`"""
+
+    def clip(i):
+        video = [
+            tf.io.encode_jpeg(tf.fill((16, 16, 3), tf.constant(10 * i + f, tf.uint8))) for f in range(frames)
+        ]
+        return {"video": tf.stack(video), "label": i % 6, "frames": frames, "id": f"clip_{i}"}
+
+    examples = [clip(i) for i in range(num_clips)]
+
+    return tf.data.Dataset.from_tensor_slices(
+        {k: tf.stack([tf.convert_to_tensor(ex[k]) for ex in examples]) for k in examples[0]}
+    )
+
+
+class ClipStoreTest(tf.test.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root = Path(self.get_temp_dir())
+
+    def test_roundtrip_matches_decoder(self):
+        ds = _raw_dataset()
+        params = {"num_segments": 4}
+
+        path = clip_store.get_or_export(ds, self.root, "train", params)
+        stored = next(iter(clip_store.load(path, batch_size=5)))
+
+        expected = next(iter(ds.map(lambda ex: clip_store.decoders.decode_video_segment(ex, 4)).batch(5)))
+
+        self.assertAllClose(stored["video"], expected["video"], atol=1e-6)
+        self.assertAllEqual(stored["label"], expected["label"])
+        self.assertAllEqual(stored["id"], expected["id"])
+
+    def test_shuffled_batches_keep_labels(self):
+        ds = _raw_dataset(num_clips=7)
+        path = clip_store.get_or_export(ds, self.root, "train", {"num_segments": 2})
+
+        seen = []
+        for batch in clip_store.load(path, batch_size=3, shuffle=True):
+            for video, label in zip(batch["video"].numpy(), batch["label"].numpy()):
+                # first pixel of the first (centered) frame encodes the clip number
+                clip = int(round(video[0, 0, 0, 0] * 255.)) // 10
+                self.assertEqual(label, clip % 6)
+                seen.append(clip)
+
+        self.assertCountEqual(seen, range(7))
+
+    def test_params_change_invalidates_store(self):
+        ds = _raw_dataset()
+
+        first = clip_store.get_or_export(ds, self.root, "train", {"num_segments": 4})
+        second = clip_store.get_or_export(ds, self.root, "train", {"num_segments": 2})
+
+        self.assertNotEqual(first, second)
+        self.assertFalse(first.exists())
+        self.assertTrue(clip_store.is_valid(second, {"num_segments": 2}))
+        self.assertEqual(np.load(second / "clips.npy", mmap_mode="r").shape[1], 2)
+
+    def test_rebuilt_dataset_invalidates_store(self):
+        source = {"name": "ai_wearables_video_gestures", "config": "default", "version": "1.0.0"}
+
+        first = clip_store.get_or_export(_raw_dataset(), self.root, "train", {"num_segments": 2}, source=source)
+        self.assertEqual(clip_store.get_or_export(_raw_dataset(), self.root, "train", {"num_segments": 2}, source=source), first)
+
+        # new version of the same config
+        second = clip_store.get_or_export(
+            _raw_dataset(), self.root, "train", {"num_segments": 2}, source={**source, "version": "1.1.0"}
+        )
+        self.assertNotEqual(second, first)
+        self.assertFalse(first.exists())
+
+        # same identity, more clips
+        third = clip_store.get_or_export(
+            _raw_dataset(num_clips=7), self.root, "train", {"num_segments": 2}, source={**source, "version": "1.1.0"}
+        )
+        self.assertNotEqual(third, second)
+        self.assertEqual(clip_store.read_index(third)["count"], 7)
+
+    def test_only_stores_are_invalidated(self):
+        ds = _raw_dataset()
+
+        other = self.root / "train" / "notes"
+        other.mkdir(parents=True)
+        (self.root / "train" / "README").write_text("not a store")
+
+        clip_store.get_or_export(ds, self.root, "train", {"num_segments": 4})
+        clip_store.get_or_export(ds, self.root, "train", {"num_segments": 2})
+
+        self.assertTrue(other.exists())
+        self.assertTrue((self.root / "train" / "README").exists())
+
+    def test_empty_dataset_is_not_exported(self):
+        path = self.root / "train" / "empty"
+
+        with self.assertRaisesRegex(ValueError, "empty"):
+            clip_store.export(_raw_dataset().take(0), path, {"num_segments": 4})
+
+        self.assertFalse(path.exists())
+
+    def test_incomplete_store_is_not_read(self):
+        path = self.root / "train" / "partial"
+        path.mkdir(parents=True)
+
+        with self.assertRaises(ValueError):
+            clip_store.load(path, batch_size=2)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,206 @@
+""" decode / sample / batch on tf.data service workers
+
+the input pipeline (jpeg decode, frame sampling, batching) runs on separate dispatcher & worker
+processes (same host or spare machines), the trainer only receives ready batches
+(https://www.tensorflow.org/api_docs/python/tf/data/experimental/service)
+
+workers run the trainer's dataset graph: the tfds files have to be readable under the same path
+on every worker (eg. a shared file system), python (`numpy_function`) stages can not be
+distributed, so the clip store is not used with the service
+
+    python data_service.py dispatcher --port 5050
+    python data_service.py worker --dispatcher localhost:5050      # once per worker (process / host)
+    python data_service.py benchmark --workers 1 2                 # trainer step time, local vs service
+
+"""
+
+import argparse
+import contextlib
+import functools
+import os
+import socket
+import subprocess
+import sys
+import time
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import tensorflow as tf
+
+
+def dispatcher(port: int = 0, work_dir: str = None) -> tf.data.experimental.service.DispatchServer:
+    """start a dispatcher, `work_dir` keeps its state across restarts (fault tolerant mode)"""
+
+    config = tf.data.experimental.service.DispatcherConfig(
+        port=port, work_dir=work_dir, fault_tolerant_mode=work_dir is not None
+    )
+    return tf.data.experimental.service.DispatchServer(config)
+
+
+def worker(dispatcher_address: str, port: int = 0) -> tf.data.experimental.service.WorkerServer:
+    """start a worker registered with the dispatcher at `dispatcher_address` ("host:port")"""
+
+    config = tf.data.experimental.service.WorkerConfig(dispatcher_address=dispatcher_address, port=port)
+    return tf.data.experimental.service.WorkerServer(config)
+
+
+def distribute(ds: tf.data.Dataset, service: str, job_name: str = None, processing_mode: str = "distributed_epoch"):
+    """the elements of `ds`, produced by the service workers
+
+    params:
+        service: dispatcher address, eg. "grpc://localhost:5050"
+        job_name: trainers using the same job name share its elements (None: every iterator gets its own job)
+        processing_mode: "distributed_epoch" every element once per epoch (split over the workers),
+            "parallel_epochs" every worker produces the whole dataset
+    """
+
+    return ds.apply(
+        tf.data.experimental.service.distribute(processing_mode=processing_mode, service=service, job_name=job_name)
+    ).prefetch(tf.data.AUTOTUNE)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"service process exited with code {process.returncode}")
+        with contextlib.suppress(OSError), socket.create_connection(("localhost", port), timeout=1):
+            return
+        time.sleep(0.1)
+
+    raise TimeoutError(f"nothing listening on port {port} after {timeout}s")
+
+
+@contextlib.contextmanager
+def local_service(workers: int = 1, threads: int = None):
+    """dispatcher & `workers` worker processes on this host, yields the service address
+
+    params:
+        threads: OMP threads per worker process (default: unset)
+    """
+
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads)) if threads else None
+
+    port = _free_port()
+    processes = [subprocess.Popen([sys.executable, __file__, "dispatcher", "--port", str(port)], env=env)]
+    try:
+        _wait_for_port(port, processes[0])
+
+        for _ in range(workers):
+            worker_port = _free_port()
+            processes.append(
+                subprocess.Popen(
+                    [sys.executable, __file__, "worker", "--dispatcher", f"localhost:{port}", "--port", str(worker_port)],
+                    env=env,
+                )
+            )
+            _wait_for_port(worker_port, processes[-1])
+
+        yield f"grpc://localhost:{port}"
+
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+def train_step_times(model, ds: tf.data.Dataset, steps: int, warmup: int = 2) -> dict:
+    """mean trainer step time and time blocked on the iterator (ms), one batch per step"""
+
+    optimizer = tf.keras.optimizers.Adam()
+    loss_fn = tf.keras.losses.CategoricalCrossentropy()
+
+    @tf.function
+    def train_step(x, y):
+        with tf.GradientTape() as tape:
+            loss = loss_fn(y, model(x, training=True))
+        optimizer.apply_gradients(zip(tape.gradient(loss, model.trainable_variables), model.trainable_variables))
+        return loss
+
+    iterator = iter(ds)
+    waits, totals = [], []
+    for i in range(warmup + steps):
+        start = time.perf_counter()
+        x, y = next(iterator)
+        ready = time.perf_counter()
+        train_step(x, y).numpy()
+
+        if i >= warmup:
+            waits.append(ready - start)
+            totals.append(time.perf_counter() - start)
+
+    return {"step_ms": 1000 * np.mean(totals), "input_ms": 1000 * np.mean(waits)}
+
+
+def benchmark(workers=(1, 2), batch_size=4, steps=20, ratio=2, num_clips=16, threads=None) -> dict:
+    """{config: train_step_times}, ConvLSTM2D_a on synthetic jpeg clips decoded in process ("local")
+    or by `n` local service workers ("service_n")
+    """
+
+    import benchmark as input_benchmark
+    import decoders
+    import models
+
+    decode = functools.partial(decoders.decode_video_segment, num_segments=8, ratio=ratio)
+
+    ds = (
+        input_benchmark.synthetic_clips(num_clips)
+        .repeat()
+        .map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+        .batch(batch_size, drop_remainder=True)
+        .map(lambda ex: (ex["video"], tf.one_hot(ex["label"], depth=6)))
+    )
+
+    shape = (batch_size, 8, 240 // ratio, 320 // ratio, 3)
+    model = models.ConvLSTM2D_a(shape)
+    model(tf.zeros(shape))  # build
+
+    results = {"local": train_step_times(model, ds.prefetch(tf.data.AUTOTUNE), steps)}
+    for n in workers:
+        with local_service(n, threads) as service:
+            results[f"service_{n}"] = train_step_times(model, distribute(ds, service, processing_mode="parallel_epochs"), steps)
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["dispatcher", "worker", "benchmark"])
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--dispatcher", default="localhost:5050", help="dispatcher address of a worker")
+    parser.add_argument("--work-dir", help="dispatcher state (fault tolerant mode)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2], help="local service workers to benchmark")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--ratio", type=int, default=2, help="jpeg decode downscale ratio")
+    parser.add_argument("--threads", type=int, help="OMP threads per service worker")
+    args = parser.parse_args()
+
+    if args.command == "dispatcher":
+        dispatcher(args.port, args.work_dir).join()
+        return
+
+    if args.command == "worker":
+        worker(args.dispatcher, args.port).join()
+        return
+
+    results = benchmark(args.workers, args.batch_size, args.steps, args.ratio, threads=args.threads)
+
+    local = results["local"]["step_ms"]
+    print(f"{os.cpu_count()} cores on this host")
+    print(f"{'':>12} {'step ms':>9} {'input ms':>9} {'vs local':>9}")
+    for config, r in results.items():
+        print(f"{config:>12} {r['step_ms']:9.1f} {r['input_ms']:9.1f} {r['step_ms'] / local:9.2f}x")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,47 @@
+"""tests for data_service.py"""
+
+import functools
+
+import numpy as np
+import tensorflow as tf
+
+import benchmark
+import data_service
+import decoders
+
+
+class LocalServiceTest(tf.test.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service_context = data_service.local_service(workers=2)
+        cls.service = cls.service_context.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service_context.__exit__(None, None, None)
+        super().tearDownClass()
+
+    def test_every_element_once_per_epoch(self):
+        ds = data_service.distribute(tf.data.Dataset.range(20).map(lambda x: 2 * x), self.service)
+
+        self.assertAllEqual(sorted(int(x) for x in ds), 2 * np.arange(20))
+
+    def test_decoded_batches_match_the_local_pipeline(self):
+        ds = (
+            benchmark.synthetic_clips(num_clips=4, frames=8, height=32, width=48)
+            .map(functools.partial(decoders.decode_video_segment, num_segments=4))
+            .batch(1)
+        )
+
+        local = {ex["id"][0].numpy(): ex["video"].numpy() for ex in ds}
+        service = {ex["id"][0].numpy(): ex["video"].numpy() for ex in data_service.distribute(ds, self.service)}
+
+        self.assertEqual(sorted(service), sorted(local))
+        for key, video in local.items():
+            self.assertAllEqual(service[key], video)
+
+
+if __name__ == "__main__":
+    tf.test.main()
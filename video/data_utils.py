@@ -1,5 +1,7 @@
+import os
 from pathlib import Path
 import re
+import sys
 
 import numpy as np
 import pandas as pd
@@ -9,40 +11,27 @@ import tensorflow_datasets as tfds
 
 import imageio
 
+from ai_wearables_video_gestures.ai_wearables_video_gestures import METADATA_FILENAME
+
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common import splits
+
 
 # features of dataset (use with tfds.load(...,  decoders=tfds.decode.PartialDecoding(features), ... ))
-# to ignore video sequence and load metadata
+# to ignore video sequence and load metadata, prefer `tfds2df` (reads the metadata sidecar, not the shards)
 META_FEATURES={
     "video": False,
     "label": True,
-    "start": True,
-    "end": True,
     "frames": True,
-    "tot_frames": True,
-    "participant": True,
-    "sex": True,
-    "hand": True,
-    "background": True,
-    "illumination": True,
-    "people_in_scene": True,
-    "background_motion": True,
-    "orig_set": True,
-    "filename": True
+    "id": True,
 }
 
-def descriptive_stats(df):
+def descriptive_stats(df, columns=("label",)):
 
     dfs = []
 
-    for col in [
-        "label",
-        "sex",
-        "hand",
-        "background",
-        "illumination",
-        "people_in_scene",
-        "background_motion",
-    ]:
+    for col in columns:
 
         counts = df[col].value_counts(sort=False)
         counts.name = "n"
@@ -58,16 +47,14 @@ def descriptive_stats(df):
 
 
 def original_split_describe(df):
-    """some descriptive stats of the original data split (found in metadata.csv)"""
-
-    train = df[df["orig_set"] == "train"]
-    test = df[df["orig_set"] == "test"]
+    """some descriptive stats of the original data split (`split` column of the metadata sidecar)"""
 
-    train_desc = descriptive_stats(train)
-    test_desc = descriptive_stats(test)
+    splits = sorted(df["split"].unique())
 
-    format_df = pd.concat([train_desc, test_desc], axis=1, keys=["train", "test"])
-    format_df = format_df.replace(np.NaN, 0)
+    format_df = pd.concat(
+        [descriptive_stats(df[df["split"] == split]) for split in splits], axis=1, keys=splits
+    )
+    format_df = format_df.replace(np.nan, 0)
 
     # format_df.style.format("{:.2%}", subset=(format_df.columns.get_level_values(1) == "%"), na_rep=0)
 
@@ -90,36 +77,25 @@ def read_labelmap(path=None):
     ).to_dict()
 
 
-def tfds2df(ds, ds_info):
-    """return dataset as dataframe (see: warning)
+def tfds2df(ds_info, split=None):
+    """return dataset metadata as dataframe, one row per clip
 
-    Warning:
-        - ** do NOT use `tfds.as_dataframe(...)` without ignoring video feature **
-            > this will attempt to load all video sequences into your RAM
-        - or you can "take" a subset of the ds object `ds.take(2)`
+    read from the sidecar table the builder writes next to the shards
+    (id, label, frames, split, height, width, channels, shard, offset),
+    the video shards are never read
+
+    params:
+        ds_info: tfds.core.DatasetInfo (`tfds.load(..., with_info=True)` or `builder.info`)
+        split: str, only return this split (default: all splits)
     """
 
-    df = tfds.as_dataframe(ds, ds_info=ds_info)
-    print(df.columns)
-
-    # decode features
-    for feature in [
-        "label",
-        "sex",
-        "hand",
-        "background",
-        "illumination",
-        "people_in_scene",
-        "background_motion",
-        "orig_set",
-    ]:
-        df[feature] = df[feature].map(ds_info.features[feature].int2str)
+    df = pd.read_csv(Path(os.fspath(ds_info.data_dir)) / METADATA_FILENAME)
 
-    # map label to human readable
-    df["label"] = df["label"].map(read_labelmap())
+    if split is not None:
+        df = df[df["split"] == split].reset_index(drop=True)
 
-    # decode participant names
-    df["participant"] = df["participant"].str.decode("utf-8")
+    # map label to human readable
+    df["label"] = df["label"].map(ds_info.features["label"].int2str)
 
     return df
 
@@ -132,8 +108,9 @@ def split(ds):
     val_participants   = ['1CM42_26', '4CM11_2', '1CV12_1', '1CV12_13', '1CM42_9', '1CM1_4', '4CM11_16', '1CV12_6']
     test_participants  = ['1CV12_12', '4CM11_24', '1CM1_1', '4CM11_18', '1CM42_31', '4CM11_20', '1CV12_21', '1CM1_2']
 
-    train = ds.filter(lambda x: tf.math.reduce_any(x[by] == train_participants)) 
-    val = ds.filter(lambda x: tf.math.reduce_any(x[by] == val_participants)) 
-    test = ds.filter(lambda x: tf.math.reduce_any(x[by] == test_participants)) 
+    # one hash table lookup per element, see `common.splits.load_splits` to only read each split's records
+    split = splits.filter_splits(
+        ds, by, {"train": train_participants, "val": val_participants, "test": test_participants}
+    )
 
-    return train, val, test
\ No newline at end of file
+    return split["train"], split["val"], split["test"]
@@ -0,0 +1,71 @@
+"""tests for data_utils.py"""
+
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import tensorflow as tf
+import tensorflow_datasets as tfds
+
+import ai_wearables_video_gestures.ai_wearables_video_gestures
+import data_utils
+
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common import synthetic
+
+
+class Tfds2dfTest(tf.test.TestCase):
+    """metadata of every clip, read from the sidecar instead of the shards"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        root = Path(tempfile.mkdtemp())
+        synthetic.write_video_corpus(
+            root / "corpus", {"train": 4, "validation": 2, "test": 2}, frames=(2, 4), height=16, width=24
+        )
+
+        with mock.patch.object(
+            tfds.download.DownloadManager, "download_kaggle_data", lambda self, name: root / "corpus"
+        ):
+            cls.builder = ai_wearables_video_gestures.ai_wearables_video_gestures.AiWearablesVideoGestures(
+                data_dir=root / "data"
+            )
+            cls.builder.download_and_prepare()
+
+    def test_one_row_per_clip(self):
+        df = data_utils.tfds2df(self.builder.info)
+
+        self.assertLen(df, 8)
+        self.assertEqual(
+            list(df.columns), ["id", "label", "frames", "split", "height", "width", "channels", "shard", "offset"]
+        )
+        self.assertEqual(set(df["height"]), {16})
+        self.assertEqual(set(df["width"]), {24})
+
+        # same clips, labels and frame counts as the shards
+        for split in ["train", "validation", "test"]:
+            shards = {
+                example["id"].decode("utf-8"): example
+                for example in self.builder.as_dataset(split=split).as_numpy_iterator()
+            }
+            rows = df[df["split"] == split]
+
+            self.assertCountEqual(rows["id"], shards)
+            for row in rows.itertuples():
+                self.assertEqual(row.frames, shards[row.id]["frames"])
+                self.assertEqual(row.label, self.builder.info.features["label"].int2str(shards[row.id]["label"]))
+
+    def test_single_split(self):
+        df = data_utils.tfds2df(self.builder.info, split="validation")
+
+        self.assertLen(df, 2)
+        self.assertEqual(set(df["split"]), {"validation"})
+        self.assertAllEqual(df.index, [0, 1])
+
+
+if __name__ == "__main__":
+    tf.test.main()
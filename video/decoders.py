@@ -8,11 +8,27 @@ import functools
 
 import tensorflow as tf
 
-def decode_frame(serialized_image):
-    """Decodes a single frame."""
-    return tf.image.decode_jpeg(
+def decode_frame(serialized_image, ratio=1, crop_window=None):
+    """Decodes a single frame.
+
+    params:
+        serialized_image: string Tensor, jpeg encoded frame
+        ratio: int [1, 2, 4, 8], downscale while decoding (DCT domain, much cheaper than decode + resize)
+        crop_window: [crop_y, crop_x, crop_height, crop_width], only decode this region,
+            coordinates are of the downscaled frame (eg. ratio=4 -> 60x80 for 240x320 frames)
+    """
+    if crop_window is None:
+        return tf.image.decode_jpeg(
+            serialized_image,
+            channels=3,
+            ratio=ratio,
+        )
+
+    return tf.image.decode_and_crop_jpeg(
         serialized_image,
+        crop_window,
         channels=3,
+        ratio=ratio,
     )
 
 
@@ -20,6 +36,8 @@ def random_manipulation(example):
     """
     some data manipulation, 
     these should probably be implemented as layers in a preprocessing "model" 
+
+    per clip and slow (jpeg re-encode of every frame), prefer `random_manipulation_batch`
     """
 
     video = example["video"]
@@ -72,7 +90,113 @@ def random_manipulation(example):
     return example
 
 
-def decode_video(example, window_size, loop, start):
+def random_manipulation_batch(example, max_delta=0.5, min_quality=20):
+    """batched version of `random_manipulation`, use after `tf.data.Dataset.batch(...)`
+
+    every clip of the (B, T, H, W, C) float video batch gets its own random
+    flips, brightness and quality, each applied with a single op on the whole batch
+
+    params:
+        example: dict of Tensors, "video" is a float batch in [0, 1]
+        max_delta: float, brightness delta is drawn from [-max_delta, max_delta)
+        min_quality: int, "jpeg quality" is drawn from [min_quality, 100)
+
+    Notes:
+        jpeg quality is approximated by quantizing intensities to (2.55 * quality) levels
+        instead of re-encoding every frame
+    """
+
+    video = example["video"]
+
+    tf.debugging.assert_type(video, tf.dtypes.float32)
+
+    shape = tf.shape(video)
+    batch_size, frames, height, width, channels = tf.unstack(shape)
+
+    # one value per clip, broadcast over (T, H, W, C)
+    def per_clip(values):
+        return tf.reshape(values, [-1, 1, 1, 1, 1])
+
+    flip_lr = tf.random.uniform((batch_size, 1)) > 0.5
+    flip_ud = tf.random.uniform((batch_size, 1)) > 0.5
+    brightness = tf.random.uniform((batch_size,), minval=-max_delta, maxval=max_delta)
+    quality = tf.random.uniform((batch_size,), minval=min_quality, maxval=100, dtype=tf.dtypes.int32)
+
+    # both flips as one gather of (flipped) pixel indices per clip
+    cols = tf.where(flip_lr, tf.range(width - 1, -1, -1), tf.range(width))
+    rows = tf.where(flip_ud, tf.range(height - 1, -1, -1), tf.range(height))
+    pixels = tf.reshape(rows[:, :, None] * width + cols[:, None, :], [batch_size, -1])
+
+    video = tf.reshape(video, [batch_size, frames, height * width, channels])
+    video = tf.reshape(tf.gather(video, pixels, axis=2, batch_dims=1), shape)
+
+    levels = per_clip(tf.cast(quality, tf.dtypes.float32) * 2.55)
+    video = tf.round(video * levels) / levels + per_clip(brightness)
+
+    example["video"] = tf.clip_by_value(video, 0., 1.)
+
+    return example
+
+
+def sample_indices(frames, window_size, loop=True, start="start"):
+    """compute which frames to sample, returns int32 index vector (at most `window_size` long)
+
+    params:
+        frames: int or scalar Tensor, number of frames in the clip
+        window_size: int, how many frames do you want?
+        loop: bool, if window is bigger than n-Frames, loop img sequence to satisfy,
+            otherwise the window is clipped to the sequence (fewer than `window_size` indices)
+        start: str [start (or begin), random, centered], where to start sampling window from
+    """
+    frames = tf.cast(frames, dtype=tf.dtypes.int32)
+
+    if start in ("start", "begin"):
+        offset = tf.constant(0, dtype=tf.dtypes.int32)
+
+    elif start == "random":
+        # any frame may start a looped window, otherwise keep the window inside the sequence
+        maxval = tf.maximum(frames - window_size, 0) + 1
+        if loop:
+            maxval = tf.where(frames < window_size, frames, maxval)
+
+        offset = tf.random.uniform((), minval=0, maxval=maxval, dtype=tf.dtypes.int32)
+
+    elif start == "centered":
+        # can be negative when looping is required, floormod wraps it to the end of the sequence
+        offset = frames // 2 - window_size // 2
+
+    else:
+        raise ValueError("please choose one of: start=[start, random, centered] ")
+
+    indices = offset + tf.range(window_size, dtype=tf.dtypes.int32)
+
+    if loop:
+        return tf.math.floormod(indices, frames)
+
+    return tf.boolean_mask(indices, (indices >= 0) & (indices < frames))
+
+
+def segment_indices(frames, num_segments):
+    """index of the centered frame of each of `num_segments` equal segments, int32 index vector
+
+    clips shorter than `num_segments` are stretched (frames are repeated)
+
+    params:
+        frames: int or scalar Tensor, number of frames in the clip
+        num_segments: int, number of indices
+    """
+    frames = tf.cast(frames, dtype=tf.dtypes.int32)
+    segments = tf.range(num_segments, dtype=tf.dtypes.int32)
+
+    frames_per_segment = frames // num_segments
+
+    centered = frames_per_segment // 2 + frames_per_segment * segments
+    stretched = segments * frames // num_segments
+
+    return tf.where(frames_per_segment > 0, centered, stretched)
+
+
+def decode_video(example, window_size, loop, start, ratio=1, crop_window=None):
     """ 
 
     This can be called on a single example in eager execution,
@@ -86,62 +210,31 @@ def decode_video(example, window_size, loop, start):
             [start, random, centered], where to start sampling window from
         loop: bool (default=True)
             if window is bigger than n-Frames, loop img sequence to satisfy
+        ratio: int [1, 2, 4, 8] (default=1)
+            downscale frames while decoding, see `decode_frame`
+        crop_window: [crop_y, crop_x, crop_height, crop_width] (default=None)
+            only decode this region of each frame, see `decode_frame`
     
     Notes:
         starts:
             - begin: at beginning of sequence
             - random: at a random frame
-                - if loop required?: start = random((frames - window_size), frames))
+                - if loop required?: start = random(0, frames)
                 - else: start = random(0, (frames - window_size)), (only loop if required)
             - centered: center window in sequence
                 - [center - window_size / 2, center + window_size / 2] 
+        only the sampled (encoded) frames are gathered from the sequence, see `sample_indices`
     
     """
-    
-    print(type(example))
-
-    video = example["video"]
-    frames = tf.cast(example["frames"], dtype=tf.dtypes.int32)
-
-    if start == "centered":
-        raise NotImplementedError
-        # start = frames - (window_size // 2)
-        # pass
-
-    elif start == "random":
-        # tf.print("random")
-
-        loops_required = window_size // frames
-        if window_size == frames:
-            loops_required = 0
-
-        video = tf.repeat(video, [loops_required+1])
 
-        sample_start = tf.random.uniform(
-                (),
-                minval=0,
-                maxval=(frames*(loops_required+1) - window_size),
-                dtype=tf.dtypes.int32
-                )
+    indices = sample_indices(example["frames"], window_size, loop=loop, start=start)
 
-        video = video[sample_start:sample_start+window_size]
-
-    elif start == "start":
-        # tf.print("start")
-
-        if loop:
-            loops_required = window_size // frames
-            video = tf.repeat(video, [loops_required+1])
-            video = video[0:window_size]
-        else:
-            video = video[0:window_size]
-              
-    else:
-        raise ValueError("please choose one of: start=[start, random, centered] ")
+    # gather encoded frames, at most `window_size` jpeg strings
+    video = tf.gather(example["video"], indices)
 
     # decode frames from jpeg to uint8 tensor
     video = tf.map_fn(
-            decode_frame,
+            functools.partial(decode_frame, ratio=ratio, crop_window=crop_window),
             video,
             fn_output_signature=tf.dtypes.uint8,
             parallel_iterations=10,
@@ -156,7 +249,14 @@ def decode_video(example, window_size, loop, start):
     return example
 
 
-def decode_video_segment(example: dict, num_segments: int, frames_per_segment: int=1, loop: bool=True) -> dict:
+def decode_video_segment(
+    example: dict,
+    num_segments: int,
+    frames_per_segment: int=1,
+    loop: bool=True,
+    ratio: int=1,
+    crop_window=None,
+) -> dict:
     """Decode requested frames, return tensordict with float tensor representing video
 
     Args:
@@ -164,25 +264,21 @@ def decode_video_segment(example: dict, num_segments: int, frames_per_segment: i
         num_segments (int): split the image sequence into `num_segments`
         frames_per_segment (int, optional): choose n frames from each segment (chooses the "centered" frame). Defaults to 1.
         loop (bool, optional): [description]. Defaults to True.
+        ratio (int, optional): downscale frames while decoding [1, 2, 4, 8], see `decode_frame`. Defaults to 1.
+        crop_window (optional): [crop_y, crop_x, crop_height, crop_width] only decode this region
+            of each frame, see `decode_frame`. Defaults to None.
 
     Returns:
         dict: tensor dictionary
         
     """
     
-    video = example["video"]
-    num_frames = tf.cast(example["frames"], dtype=tf.dtypes.int32)
-    
-    frames_per_segment = num_frames // num_segments
-            
-    start = frames_per_segment // 2
-    end = frames_per_segment * num_segments
-    
-    video = video[ start : end : frames_per_segment ]
+    # gather encoded frames, one jpeg string per segment (see `segment_indices`)
+    video = tf.gather(example["video"], segment_indices(example["frames"], num_segments))
     
     # decode frames from jpeg to uint8 tensor
     video = tf.map_fn(
-            decode_frame,
+            functools.partial(decode_frame, ratio=ratio, crop_window=crop_window),
             video,
             fn_output_signature=tf.dtypes.uint8,
             parallel_iterations=10,
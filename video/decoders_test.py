@@ -0,0 +1,200 @@
+"""tests for decoders.py"""
+
+import numpy as np
+import tensorflow as tf
+
+import decoders
+
+
+def _encoded_clip(frames, valid=None):
+    """jpeg clip where frame i is a solid 16x16 image of value 8 * i
+
+    frames not in `valid` are garbage (not jpeg), decoding one of them raises
+    """
+    clip = []
+    for i in range(frames):
+        if valid is None or i in valid:
+            clip.append(tf.io.encode_jpeg(tf.fill((16, 16, 3), tf.constant(8 * i, tf.uint8))))
+        else:
+            clip.append(tf.constant(b"not a jpeg"))
+
+    return {"video": tf.stack(clip), "frames": tf.constant(frames, dtype=tf.int64)}
+
+
+class SampleIndicesTest(tf.test.TestCase):
+
+    def test_indices_bounded_by_window_size(self):
+        for start in ["start", "random", "centered"]:
+            for loop in [True, False]:
+                for frames in [1, 3, 7, 8, 9, 30]:
+                    indices = decoders.sample_indices(frames, 8, loop=loop, start=start).numpy()
+
+                    self.assertLessEqual(len(indices), 8)
+                    self.assertTrue(np.all((indices >= 0) & (indices < frames)))
+
+                    if loop or frames >= 8:
+                        self.assertLen(indices, 8)
+
+    def test_start(self):
+        self.assertAllEqual(decoders.sample_indices(10, 4, start="start"), [0, 1, 2, 3])
+        self.assertAllEqual(decoders.sample_indices(3, 7, start="begin"), [0, 1, 2, 0, 1, 2, 0])
+        self.assertAllEqual(decoders.sample_indices(3, 7, loop=False, start="start"), [0, 1, 2])
+
+    def test_centered(self):
+        self.assertAllEqual(decoders.sample_indices(10, 4, start="centered"), [3, 4, 5, 6])
+        self.assertAllEqual(decoders.sample_indices(3, 5, start="centered"), [2, 0, 1, 2, 0])
+        self.assertAllEqual(decoders.sample_indices(3, 5, loop=False, start="centered"), [0, 1, 2])
+
+    def test_random_is_contiguous(self):
+        for _ in range(20):
+            indices = decoders.sample_indices(10, 4, start="random").numpy()
+            self.assertAllEqual(np.diff(indices), [1, 1, 1])
+
+            looped = decoders.sample_indices(3, 5, start="random").numpy()
+            self.assertAllEqual(np.diff(looped) % 3, [1, 1, 1, 1])
+
+    def test_unknown_start(self):
+        with self.assertRaises(ValueError):
+            decoders.sample_indices(10, 4, start="end")
+
+
+class DecodeVideoTest(tf.test.TestCase):
+
+    def test_only_sampled_frames_are_decoded(self):
+        # every frame outside the window is garbage, decoding it would fail
+        example = decoders.decode_video(
+            _encoded_clip(30, valid={13, 14, 15, 16}), window_size=4, loop=True, start="centered"
+        )
+
+        self.assertEqual(example["video"].shape, (4, 16, 16, 3))
+        self.assertAllClose(example["video"][:, 0, 0, 0] * 255., [104, 112, 120, 128], atol=2)
+
+    def test_looped_window(self):
+        example = decoders.decode_video(_encoded_clip(3), window_size=7, loop=True, start="start")
+
+        self.assertEqual(example["video"].shape, (7, 16, 16, 3))
+        self.assertAllClose(example["video"][:, 0, 0, 0] * 255., [0, 8, 16, 0, 8, 16, 0], atol=2)
+
+    def test_in_dataset_map(self):
+        ds = tf.data.Dataset.from_tensors(_encoded_clip(12)).repeat(3)
+        ds = ds.map(lambda ex: decoders.decode_video(ex, window_size=5, loop=True, start="random"))
+
+        for example in ds:
+            self.assertEqual(example["video"].shape, (5, 16, 16, 3))
+
+
+def _noise_frame(height=48, width=64, seed=0):
+    """jpeg of a smooth random frame (upscaled noise), exact decoders differ on flat images"""
+    noise = np.random.default_rng(seed).uniform(0, 255, (1, height // 8, width // 8, 3)).astype(np.float32)
+    return tf.io.encode_jpeg(tf.cast(tf.image.resize(noise, (height, width))[0], tf.uint8))
+
+
+class SegmentIndicesTest(tf.test.TestCase):
+
+    def test_centered_frame_of_each_segment(self):
+        self.assertAllEqual(decoders.segment_indices(16, 4), [2, 6, 10, 14])
+        self.assertAllEqual(decoders.segment_indices(10, 4), [1, 3, 5, 7])
+
+    def test_short_clips_are_stretched(self):
+        self.assertAllEqual(decoders.segment_indices(3, 8), [0, 0, 0, 1, 1, 1, 2, 2])
+        self.assertAllEqual(decoders.segment_indices(1, 4), [0, 0, 0, 0])
+
+
+class DecodeVideoSegmentTest(tf.test.TestCase):
+
+    def test_one_frame_per_segment(self):
+        example = decoders.decode_video_segment(_encoded_clip(16), num_segments=4)
+
+        self.assertEqual(example["video"].shape, (4, 16, 16, 3))
+        self.assertAllClose(example["video"][:, 0, 0, 0] * 255., [16, 48, 80, 112], atol=2)
+
+    def test_clip_shorter_than_num_segments(self):
+        example = decoders.decode_video_segment(_encoded_clip(3), num_segments=8)
+
+        self.assertEqual(example["video"].shape, (8, 16, 16, 3))
+        self.assertAllClose(example["video"][:, 0, 0, 0] * 255., [0, 0, 0, 8, 8, 8, 16, 16], atol=2)
+
+    def test_ratio_shapes(self):
+        clip = {"video": tf.stack([_noise_frame(64, 64)] * 4), "frames": tf.constant(4, dtype=tf.int64)}
+
+        for ratio in [2, 4, 8]:
+            example = decoders.decode_video_segment(dict(clip), num_segments=2, ratio=ratio)
+            self.assertEqual(example["video"].shape, (2, 64 // ratio, 64 // ratio, 3))
+
+
+class DecodeFrameTest(tf.test.TestCase):
+
+    def test_crop_window_matches_decode_then_crop(self):
+        frame = _noise_frame()
+
+        # window aligned to the 16x16 jpeg blocks (4:2:0 chroma)
+        cropped = decoders.decode_frame(frame, crop_window=[16, 16, 16, 32])
+        expected = tf.image.crop_to_bounding_box(decoders.decode_frame(frame), 16, 16, 16, 32)
+
+        self.assertAllEqual(cropped, expected)
+
+    def test_ratio_close_to_decode_then_resize(self):
+        frame = _noise_frame()
+        full = tf.cast(decoders.decode_frame(frame), tf.float32)
+
+        for ratio in [2, 4, 8]:
+            scaled = tf.cast(decoders.decode_frame(frame, ratio=ratio), tf.float32)
+            expected = tf.image.resize(full, (48 // ratio, 64 // ratio), method="area")
+
+            self.assertEqual(scaled.shape, expected.shape)
+            # DCT domain scaling is not an exact area resize, but close on smooth images
+            self.assertLess(float(tf.reduce_mean(tf.abs(scaled - expected))), 8.)
+
+
+class RandomManipulationBatchTest(tf.test.TestCase):
+
+    def test_per_clip_flips(self):
+        # gradient along width, a clip is either untouched or flipped left/right (no brightness)
+        ramp = tf.broadcast_to(tf.linspace(0., 1., 8)[None, None, :, None], (2, 4, 8, 3))
+        video = tf.stack([ramp] * 16)
+
+        out = decoders.random_manipulation_batch({"video": video}, max_delta=0., min_quality=99)["video"]
+
+        self.assertEqual(out.shape, video.shape)
+        self.assertAllInRange(out, 0., 1.)
+
+        for clip in out:
+            self.assertTrue(
+                np.allclose(clip, ramp, atol=0.01) or np.allclose(clip, ramp[:, :, ::-1], atol=0.01)
+            )
+
+    def test_batch_flips_both_axes(self):
+        # every pixel has its own value, the four flip combinations are distinguishable
+        pixels = tf.reshape(tf.range(6 * 8, dtype=tf.float32) / 48., (1, 6, 8, 1))
+        video = tf.broadcast_to(pixels[None], (32, 2, 6, 8, 3))
+
+        tf.random.set_seed(0)
+        out = decoders.random_manipulation_batch({"video": video}, max_delta=0., min_quality=99)["video"].numpy()
+
+        clip = video[0].numpy()
+        variants = {
+            "none": clip,
+            "lr": clip[:, :, ::-1],
+            "ud": clip[:, ::-1, :],
+            "both": clip[:, ::-1, ::-1],
+        }
+
+        seen = []
+        for flipped in out:
+            matches = [name for name, variant in variants.items() if np.allclose(flipped, variant, atol=0.01)]
+            self.assertLen(matches, 1)
+            seen.extend(matches)
+
+        self.assertCountEqual(set(seen), variants)
+
+    def test_in_dataset_map(self):
+        ds = tf.data.Dataset.from_tensors({"video": tf.random.uniform((3, 16, 16, 3))}).repeat(4)
+        ds = ds.batch(2).map(decoders.random_manipulation_batch)
+
+        for example in ds:
+            self.assertEqual(example["video"].shape, (2, 3, 16, 16, 3))
+            self.assertAllInRange(example["video"], 0., 1.)
+
+
+if __name__ == "__main__":
+    tf.test.main()
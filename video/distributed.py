@@ -0,0 +1,316 @@
+""" multi-worker (CPU fleet) training with MultiWorkerMirroredStrategy
+
+every worker runs the same program, `TF_CONFIG` describes the cluster and the worker's index
+(https://www.tensorflow.org/guide/distributed_training#setting_up_the_tf_config_environment_variable),
+`train.py` switches to this mode when `TF_CONFIG` lists more than one worker
+
+keras 3 `fit` can not run under MultiWorkerMirroredStrategy (its first batch is reduced eagerly
+with collective ops), so `fit` here is a custom train loop: every worker reads its own shard,
+gradients are all-reduced, the global batch is the per worker batch times the number of workers
+
+checkpoints (model, optimizer, epoch) are written by the chief to `checkpoint_dir`, the other
+workers write to throw-away directories (saving is collective, every worker has to take part),
+a restarted cluster resumes from the chief's latest checkpoint (`checkpoint_dir` has to be
+reachable by every worker, eg. a shared file system)
+
+    python distributed.py launch --workers 1 2 4     # local workers on this host, synthetic clips,
+                                                     # reports throughput & scaling efficiency
+
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import tensorflow as tf
+
+
+def strategy() -> tf.distribute.Strategy:
+    """MultiWorkerMirroredStrategy if TF_CONFIG lists several workers, otherwise the default strategy
+
+    has to be called before any other tensorflow op runs
+    """
+
+    cluster = json.loads(os.environ.get("TF_CONFIG", "{}")).get("cluster", {})
+    if len(cluster.get("worker", [])) > 1:
+        return tf.distribute.MultiWorkerMirroredStrategy()
+
+    return tf.distribute.get_strategy()
+
+
+def num_workers(strategy: tf.distribute.Strategy) -> int:
+    resolver = getattr(strategy, "cluster_resolver", None)
+    return len(resolver.cluster_spec().as_dict().get("worker", [])) if resolver else 1
+
+
+def worker_index(strategy: tf.distribute.Strategy) -> int:
+    resolver = getattr(strategy, "cluster_resolver", None)
+    return resolver.task_id if resolver and resolver.task_id is not None else 0
+
+
+def is_chief(strategy: tf.distribute.Strategy) -> bool:
+    return worker_index(strategy) == 0
+
+
+def fit(
+    strategy: tf.distribute.Strategy,
+    model_fn,
+    dataset_fn,
+    global_batch_size: int,
+    epochs: int,
+    steps_per_epoch: int,
+    checkpoint_dir,
+    val_dataset_fn=None,
+    val_steps: int = 0,
+    weights_path=None,
+) -> tuple:
+    """distributed train loop, returns (model, history: one dict per epoch trained by this call)
+
+    params:
+        model_fn: () -> compiled-less keras model, called inside the strategy scope
+        dataset_fn: tf.distribute.InputContext -> repeated dataset of (x, one hot y) batched with
+            `input_context.get_per_replica_batch_size(global_batch_size)`, sharded per worker
+        steps_per_epoch: identical on every worker (the collectives of a step wait for all workers)
+        val_dataset_fn, val_steps: same for validation (skipped if None or 0 steps)
+        weights_path: the chief saves the model weights here whenever val_loss (or loss) improves
+    """
+
+    with strategy.scope():
+        model = model_fn()
+        optimizer = tf.keras.optimizers.Adam()
+        epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+        checkpoint = tf.train.Checkpoint(model=model, optimizer=optimizer, epoch=epoch)
+
+    directory = Path(checkpoint_dir)
+    if not is_chief(strategy):
+        directory = directory / f".worker_{worker_index(strategy)}"
+
+    # every worker restores the chief's checkpoint, so they all resume from the same state
+    latest = tf.train.latest_checkpoint(checkpoint_dir)
+    if latest is not None:
+        checkpoint.restore(latest)
+
+    manager = tf.train.CheckpointManager(checkpoint, directory, max_to_keep=1)
+
+    def step_fn(x, y, training):
+        with tf.GradientTape() as tape:
+            probabilities = model(x, training=training)
+            per_example = tf.keras.losses.categorical_crossentropy(y, probabilities)
+            loss = tf.nn.compute_average_loss(per_example, global_batch_size=global_batch_size)
+
+        if training:
+            gradients = tape.gradient(loss, model.trainable_variables)
+            optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+
+        correct = tf.reduce_sum(tf.cast(tf.argmax(probabilities, -1) == tf.argmax(y, -1), tf.float32))
+        return loss, correct
+
+    @tf.function
+    def run(iterator, training):
+        x, y = next(iterator)
+        loss, correct = strategy.run(step_fn, args=(x, y, training))
+        return strategy.reduce("SUM", loss, axis=None), strategy.reduce("SUM", correct, axis=None)
+
+    def run_epoch(iterator, steps, training):
+        loss = correct = 0.
+        for _ in range(steps):
+            step_loss, step_correct = run(iterator, training)
+            loss += float(step_loss)
+            correct += float(step_correct)
+
+        return loss / steps, correct / (steps * global_batch_size)
+
+    train = iter(strategy.distribute_datasets_from_function(dataset_fn))
+    val = iter(strategy.distribute_datasets_from_function(val_dataset_fn)) if val_dataset_fn and val_steps else None
+
+    history = []
+    best = math.inf
+    while int(epoch.numpy()) < epochs:
+        start = time.perf_counter()
+        loss, accuracy = run_epoch(train, steps_per_epoch, training=True)
+        seconds = time.perf_counter() - start
+
+        logs = {
+            "epoch": int(epoch.numpy()) + 1,
+            "loss": loss,
+            "accuracy": accuracy,
+            "seconds": seconds,
+            "examples_per_sec": steps_per_epoch * global_batch_size / seconds,
+        }
+        if val is not None:
+            logs["val_loss"], logs["val_accuracy"] = run_epoch(val, val_steps, training=False)
+
+        epoch.assign_add(1)
+        manager.save()
+
+        monitored = logs.get("val_loss", loss)
+        if weights_path is not None and monitored < best and is_chief(strategy):
+            model.save_weights(weights_path)
+        best = min(best, monitored)
+
+        history.append(logs)
+        if is_chief(strategy):
+            print(" - ".join(f"{k}: {v:.4g}" if isinstance(v, float) else f"{k}: {v}" for k, v in logs.items()), flush=True)
+
+    if not is_chief(strategy):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return model, history
+
+
+def synthetic_dataset_fn(global_batch_size, num_clips=64, frames=8, height=60, width=80, num_classes=6, seed=0):
+    """dataset_fn of random decoded clips, each worker keeps its own `num_clips / workers` (for `launch`)"""
+
+    def dataset_fn(input_context):
+        rng = np.random.default_rng(seed)
+        video = rng.uniform(size=(num_clips, frames, height, width, 3)).astype(np.float32)
+        labels = tf.one_hot(np.arange(num_clips) % num_classes, num_classes)
+
+        ds = tf.data.Dataset.from_tensor_slices((video, labels))
+        ds = ds.shard(input_context.num_input_pipelines, input_context.input_pipeline_id)
+
+        return ds.repeat().batch(input_context.get_per_replica_batch_size(global_batch_size)).prefetch(1)
+
+    return dataset_fn
+
+
+def _free_ports(n):
+    sockets = [socket.socket() for _ in range(n)]
+    for s in sockets:
+        s.bind(("localhost", 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def launch(workers: int, worker_args: list, threads: int = None, timeout: float = 3600) -> dict:
+    """run `python distributed.py worker ...` on `workers` local processes, returns the chief's report
+
+    params:
+        threads: intra op threads per worker (default: cores / workers)
+    """
+
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    cluster = {"worker": [f"localhost:{port}" for port in _free_ports(workers)]}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        processes = []
+        for index in range(workers):
+            env = dict(
+                os.environ,
+                TF_CONFIG=json.dumps({"cluster": cluster, "task": {"type": "worker", "index": index}}),
+                OMP_NUM_THREADS=str(threads),
+            )
+            processes.append(
+                subprocess.Popen(
+                    [sys.executable, __file__, "worker", "--report", str(Path(tmp) / f"worker_{index}.json"),
+                     "--checkpoint-dir", str(Path(tmp) / "ckpt"), "--threads", str(threads)] + worker_args,
+                    env=env,
+                )
+            )
+
+        try:
+            for process in processes:
+                if process.wait(timeout=timeout) != 0:
+                    raise RuntimeError(f"worker exited with code {process.returncode}")
+        finally:
+            for process in processes:
+                process.kill()
+
+        return json.loads((Path(tmp) / "worker_0.json").read_text())
+
+
+def _worker(args):
+    """one worker of `launch`: train ConvLSTM2D_a on synthetic clips, the chief writes a json report"""
+
+    tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    distribution = strategy()
+
+    import models
+
+    workers = num_workers(distribution)
+    global_batch_size = args.batch_size * workers
+    shape = (args.batch_size, args.frames, args.height, args.width, 3)
+
+    def model_fn():
+        model = models.ConvLSTM2D_a(shape)
+        model(tf.zeros(shape))  # build
+        return model
+
+    _, history = fit(
+        distribution,
+        model_fn,
+        synthetic_dataset_fn(global_batch_size, args.clips, args.frames, args.height, args.width),
+        global_batch_size,
+        epochs=args.epochs,
+        steps_per_epoch=args.steps,
+        checkpoint_dir=args.checkpoint_dir,
+    )
+
+    if is_chief(distribution):
+        # first epoch includes tracing & collective setup
+        timed = history[1:] or history
+        Path(args.report).write_text(json.dumps({
+            "workers": workers,
+            "global_batch_size": global_batch_size,
+            "examples_per_sec": float(np.mean([logs["examples_per_sec"] for logs in timed])),
+            "history": history,
+        }))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["launch", "worker"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2], help="cluster sizes to launch")
+    parser.add_argument("--batch-size", type=int, default=4, help="per worker batch")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=10, help="steps per epoch")
+    parser.add_argument("--clips", type=int, default=64)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--height", type=int, default=60)
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--threads", type=int, help="intra op threads per worker (default: cores / workers)")
+    parser.add_argument("--report", help=argparse.SUPPRESS)
+    parser.add_argument("--checkpoint-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        _worker(args)
+        return
+
+    worker_args = [
+        "--batch-size", str(args.batch_size), "--epochs", str(args.epochs), "--steps", str(args.steps),
+        "--clips", str(args.clips), "--frames", str(args.frames), "--height", str(args.height), "--width", str(args.width),
+    ]
+
+    # weak scaling: the per worker batch stays fixed, the global batch grows with the workers
+    reports = {workers: launch(workers, worker_args, args.threads) for workers in args.workers}
+    single = reports[min(reports)]["examples_per_sec"] / min(reports)
+
+    print(f"{'workers':>8} {'global batch':>13} {'examples/s':>11} {'efficiency':>11}")
+    for workers, report in reports.items():
+        efficiency = report["examples_per_sec"] / (workers * single)
+        print(f"{workers:8d} {report['global_batch_size']:13d} {report['examples_per_sec']:11.1f} {efficiency:11.1%}")
+
+    # local workers share this host: past its cores the efficiency is bound by cores / workers
+    print(f"{os.cpu_count()} cores on this host")
+
+
+if __name__ == "__main__":
+
+    main()
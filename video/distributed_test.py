@@ -0,0 +1,55 @@
+"""tests for distributed.py"""
+
+import tempfile
+from pathlib import Path
+
+import tensorflow as tf
+
+import distributed
+import models
+
+
+def _model_fn(shape=(2, 3, 8, 8, 3)):
+    def model_fn():
+        model = models.ConvLSTM2D_a(shape)
+        model(tf.zeros(shape))  # build
+        return model
+
+    return model_fn
+
+
+class FitTest(tf.test.TestCase):
+
+    def test_resumes_from_the_latest_checkpoint(self):
+        strategy = distributed.strategy()  # no TF_CONFIG: default strategy
+        dataset_fn = distributed.synthetic_dataset_fn(2, num_clips=4, frames=3, height=8, width=8)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            weights = Path(tmp) / "best.weights.h5"
+            kwargs = dict(global_batch_size=2, steps_per_epoch=2, checkpoint_dir=tmp, weights_path=weights)
+
+            _, history = distributed.fit(strategy, _model_fn(), dataset_fn, epochs=2, **kwargs)
+            self.assertEqual([logs["epoch"] for logs in history], [1, 2])
+            self.assertTrue(weights.exists())
+
+            # a restarted run only trains the missing epochs
+            _, history = distributed.fit(strategy, _model_fn(), dataset_fn, epochs=3, **kwargs)
+            self.assertEqual([logs["epoch"] for logs in history], [3])
+
+
+class LaunchTest(tf.test.TestCase):
+
+    def test_two_local_workers(self):
+        report = distributed.launch(2, [
+            "--batch-size", "2", "--epochs", "2", "--steps", "2",
+            "--clips", "8", "--frames", "3", "--height", "8", "--width", "8",
+        ], threads=1, timeout=600)
+
+        self.assertEqual(report["workers"], 2)
+        self.assertEqual(report["global_batch_size"], 4)
+        self.assertEqual(len(report["history"]), 2)
+        self.assertGreater(report["examples_per_sec"], 0)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,211 @@
+""" per frame embeddings of a frozen 2D backbone, cached on disk, for lightweight temporal heads
+
+every sampled frame goes through the backbone once, the (frames, features) embeddings of every clip
+are written to a clip store (a float16 store with the backbone as transform, `root/split/<key>`, the key
+hashes the backbone, its weights, the image size and the sampling parameters), trying other heads never re-runs
+the backbone, changing any of the parameters exports a new store
+
+    params = {"backbone": "mobilenet_v3_small", "num_segments": 8}
+    path = embeddings.get_or_export(ds["train"], "./embedding_store", "train", params)
+    train = clip_store.load(path, batch_size=32, shuffle=True)  # "video": (batch, frames, features)
+
+    python embeddings.py    # synthetic gestures: export & head epoch times vs ConvLSTM2D_a, head accuracy
+
+randomly initialised backbones (`--weights none`, eg. offline) give vanishing activations
+(no trained batch norm statistics), their embeddings are only good for timing
+
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import tensorflow as tf
+
+import clip_store
+import decoders
+import models
+
+
+# name: (keras application, its preprocess_input (0 - 255 RGB))
+BACKBONES = {
+    "mobilenet_v3_small": (tf.keras.applications.MobileNetV3Small, tf.keras.applications.mobilenet_v3.preprocess_input),
+    "mobilenet_v2": (tf.keras.applications.MobileNetV2, tf.keras.applications.mobilenet_v2.preprocess_input),
+    "efficientnet_b0": (tf.keras.applications.EfficientNetB0, tf.keras.applications.efficientnet.preprocess_input),
+}
+
+HEADS = {
+    "lstm": models.Embedding_LSTM,
+    "conv1d": models.Embedding_Conv1D,
+}
+
+# backbone params, every other param is passed on to `decoders.decode_video_segment` (sampling)
+DEFAULTS = {
+    "backbone": "mobilenet_v3_small",
+    "weights": "imagenet",  # None: random (frozen) weights
+    "image_size": None,  # [height, width] the frames are resized to, None: as decoded
+}
+
+
+def with_defaults(params: dict) -> dict:
+    """complete params, the cache key does not depend on which defaults were spelled out"""
+    return {**DEFAULTS, **params}
+
+
+def backbone_fn(params: dict):
+    """(frames, height, width, 3) float [0, 1] -> (frames, features) of the frozen backbone"""
+
+    params = with_defaults(params)
+    Backbone, preprocess = BACKBONES[params["backbone"]]
+    size = params["image_size"]
+
+    backbone = Backbone(
+        input_shape=(*size, 3) if size else (None, None, 3),
+        include_top=False,
+        pooling="avg",
+        weights=params["weights"],
+    )
+    backbone.trainable = False
+
+    @tf.function(reduce_retracing=True)
+    def embed(frames):
+        if size:
+            frames = tf.image.resize(frames, size, method="area", antialias=True)
+        return backbone(preprocess(frames * 255.), training=False)
+
+    return embed
+
+
+def embed_batch_fn(params: dict):
+    """(clips, frames, height, width, 3) float [0, 1] -> (clips, frames, features), a `clip_store` transform
+
+    the backbone is only built on the first call (not for stores that are already exported)
+    """
+
+    embed = None
+
+    def embed_batch(video):
+        nonlocal embed
+        if embed is None:
+            embed = backbone_fn(params)
+
+        # every frame of the batch in one backbone call
+        features = embed(tf.reshape(video, [-1] + video.shape[2:].as_list()))
+        return tf.reshape(features, [video.shape[0], video.shape[1], -1])
+
+    return embed_batch
+
+
+def _decode(example, backbone=None, weights=None, image_size=None, **sampling):
+    """`decoders.decode_video_segment` ignoring the backbone params"""
+    return decoders.decode_video_segment(example, **sampling)
+
+
+def get_or_export(ds: tf.data.Dataset, root, split: str, params: dict, batch_size: int = 8, source: dict = None) -> Path:
+    """path of the embedding store for (split, params), exporting it first if needed (see `clip_store.get_or_export`)
+
+    params:
+        ds: un-decoded dataset (load with `decoders={"video": tfds.decode.SkipDecoding()}`)
+        params: backbone params (see DEFAULTS) and kwargs of `decoders.decode_video_segment`
+        batch_size: clips per backbone call
+        source: identity of the dataset `ds` was loaded from (see `clip_store.source`)
+    """
+    params = with_defaults(params)
+
+    return clip_store.get_or_export(
+        ds,
+        root,
+        split,
+        params,
+        decode_fn=_decode,
+        transform=embed_batch_fn(params),
+        dtype="float16",
+        batch_size=batch_size,
+        source=source,
+    )
+
+
+def _epoch_seconds(model, ds, epochs) -> float:
+    """mean seconds of an epoch of `model.fit` (after a warm up epoch)"""
+    model.fit(ds, epochs=1, verbose=0)
+    start = time.perf_counter()
+    model.fit(ds, epochs=epochs, verbose=0)
+    return (time.perf_counter() - start) / epochs
+
+
+def compare(num_clips=96, epochs=20, batch_size=8, num_segments=8, weights="imagenet", backbone="mobilenet_v3_small", seed=0) -> dict:
+    """synthetic gestures (2/3 train, 1/3 test): embedding export time (cold & cached),
+    epoch seconds & accuracy of every head, epoch seconds of ConvLSTM2D_a on the RGB clip store
+    """
+
+    import motion
+
+    ds = motion.synthetic_gestures(num_clips, seed=seed)
+    num_train = 2 * num_clips // 3
+    splits = {"train": ds.take(num_train), "test": ds.skip(num_train)}
+    params = {"backbone": backbone, "weights": weights, "num_segments": num_segments}
+
+    def supervised(path, shuffle=False):
+        return clip_store.load(path, batch_size, shuffle=shuffle, seed=seed).map(
+            lambda ex: (ex["video"], tf.one_hot(ex["label"], depth=6))
+        )
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        stores = {split: get_or_export(split_ds, Path(tmp) / "embeddings", split, params) for split, split_ds in splits.items()}
+        results["export_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for split, split_ds in splits.items():
+            get_or_export(split_ds, Path(tmp) / "embeddings", split, params)
+        results["cached_seconds"] = time.perf_counter() - start
+
+        shape = (batch_size,) + tuple(clip_store.read_index(stores["train"])["shape"][1:])
+        for name, Head in HEADS.items():
+            tf.keras.utils.set_random_seed(seed)
+            model = Head(shape)
+            model.build_graph(shape)
+            model.compile(optimizer="Adam", loss="categorical_crossentropy", metrics=["accuracy"])
+
+            seconds = _epoch_seconds(model, supervised(stores["train"], shuffle=True), epochs)
+            _, accuracy = model.evaluate(supervised(stores["test"]), verbose=0)
+            results[name] = {"epoch_seconds": seconds, "accuracy": accuracy}
+
+        # the end to end model on decoded RGB clips, timing only
+        rgb = clip_store.get_or_export(splits["train"], Path(tmp) / "rgb", "train", {"num_segments": num_segments})
+        shape = (batch_size,) + tuple(clip_store.read_index(rgb)["shape"][1:])
+        model = models.ConvLSTM2D_a(shape)
+        model.build_graph(shape)
+        model.compile(optimizer="Adam", loss="categorical_crossentropy", metrics=["accuracy"])
+        results["ConvLSTM2D_a"] = {"epoch_seconds": _epoch_seconds(model, supervised(rgb, shuffle=True), 1), "accuracy": None}
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backbone", choices=list(BACKBONES), default="mobilenet_v3_small")
+    parser.add_argument("--weights", default="imagenet", help='backbone weights, "none" for random (frozen) weights, timing only')
+    parser.add_argument("--clips", type=int, default=96, help="synthetic gesture clips (2/3 train, 1/3 test)")
+    parser.add_argument("--epochs", type=int, default=20, help="head epochs")
+    args = parser.parse_args()
+
+    results = compare(args.clips, args.epochs, weights=None if args.weights == "none" else args.weights, backbone=args.backbone)
+
+    print(f"embedding export {results['export_seconds']:.1f} s, cached {results['cached_seconds']:.3f} s")
+    print(f"{'':>14} {'s/epoch':>9} {'accuracy':>9}")
+    for name in list(HEADS) + ["ConvLSTM2D_a"]:
+        r = results[name]
+        accuracy = "-" if r["accuracy"] is None else f"{r['accuracy']:.3f}"
+        print(f"{name:>14} {r['epoch_seconds']:9.3f} {accuracy:>9}")
+
+
+if __name__ == "__main__":
+
+    main()
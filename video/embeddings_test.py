@@ -0,0 +1,83 @@
+"""tests for embeddings.py"""
+
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+import clip_store
+import decoders
+import embeddings
+import motion
+
+
+PARAMS = {"backbone": "tiny", "image_size": [32, 32], "num_segments": 4}
+
+
+def _tiny_backbone(filters):
+    """keras application like constructor of a small backbone with fixed (seeded) weights"""
+
+    def backbone(input_shape, include_top, pooling, weights):
+        tf.keras.utils.set_random_seed(0)
+        return tf.keras.Sequential(
+            [
+                tf.keras.Input(shape=input_shape),
+                tf.keras.layers.Conv2D(filters, 3, strides=2, activation="relu"),
+                tf.keras.layers.GlobalAveragePooling2D(),
+            ]
+        )
+
+    return backbone
+
+
+class EmbeddingStoreTest(tf.test.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root = Path(self.get_temp_dir())
+        self.ds = motion.synthetic_gestures(num_clips=3, frames=8, height=32, width=48)
+
+        backbones = {"tiny": (_tiny_backbone(16), lambda x: x / 255.), "tiny_wide": (_tiny_backbone(32), lambda x: x / 255.)}
+        patcher = mock.patch.dict(embeddings.BACKBONES, backbones)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_store_holds_the_backbone_embedding_of_every_sampled_frame(self):
+        path = embeddings.get_or_export(self.ds, self.root, "train", PARAMS, batch_size=2)
+
+        embed = embeddings.backbone_fn(PARAMS)
+        clips = [decoders.decode_video_segment(example, num_segments=4)["video"] for example in self.ds]
+        expected = np.stack([embed(clip) for clip in clips])
+
+        batch = next(iter(clip_store.load(path, batch_size=3)))
+
+        self.assertEqual(clip_store.read_index(path)["dtype"], "float16")
+        self.assertEqual(batch["video"].shape, (3, 4, 16))
+        self.assertAllEqual(batch["label"], [0, 1, 2])
+
+        # float16 precision of non-degenerate features
+        self.assertGreater(np.abs(expected).mean(), 0.05)
+        self.assertAllClose(batch["video"], expected, rtol=2e-3, atol=1e-4)
+
+    def test_cache_key_covers_backbone_and_sampling(self):
+        path = embeddings.get_or_export(self.ds, self.root, "train", PARAMS)
+        modified = (path / "clips.npy").stat().st_mtime_ns
+
+        # defaults spelled out: same store, not exported again
+        same = embeddings.get_or_export(self.ds, self.root, "train", {**PARAMS, "weights": "imagenet"})
+        self.assertEqual(same, path)
+        self.assertEqual((path / "clips.npy").stat().st_mtime_ns, modified)
+
+        for changed in [{"num_segments": 2}, {"image_size": [48, 48]}, {"backbone": "tiny_wide"}]:
+            other = embeddings.get_or_export(self.ds, self.root, "train", {**PARAMS, **changed})
+
+            self.assertNotEqual(other, path)
+            self.assertEqual(list((self.root / "train").iterdir()), [other])
+            path = other
+
+        self.assertEqual(clip_store.read_index(path)["shape"][-1], 32)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -1,74 +1,173 @@
 
+import sys
+from pathlib import Path
+
 import tensorflow as tf
 
-class ConvLSTM2D_a(tf.keras.Model):
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common import execution
+
+
+class ConvLSTM2D_a(execution.ExecutionMode, tf.keras.Model):
     
     
-    def __init__(self, input_shape):
+    def __init__(self, input_shape, mixed_precision=False, jit_compile="auto"):
+        """
+        params:
+            mixed_precision, jit_compile: execution mode (see `execution.ExecutionMode`)
+        """
         super(ConvLSTM2D_a, self).__init__(name="ConvLSTM2D_a")
         
-        self.layer1 = tf.keras.layers.ConvLSTM2D(filters=32, kernel_size=[3,3], strides=(4,4), data_format="channels_last")
-        self.layer2 = tf.keras.layers.Flatten()
-        self.layer3 = tf.keras.layers.Dense(1024)
-        self.layer4 = tf.keras.layers.Dense(256)
-        self.layer5 = tf.keras.layers.Dense(6, activation="softmax")
+        self.jit_compile_default = jit_compile
+        dtype = execution.layer_dtype(mixed_precision)
         
-    def call(self, inputs):
-        x = self.layer1(inputs)
-        x = self.layer2(x)
+        self.layer1 = tf.keras.layers.ConvLSTM2D(filters=32, kernel_size=[3,3], strides=(4,4), data_format="channels_last", dtype=dtype)
+        self.layer2 = tf.keras.layers.Flatten(dtype=dtype)
+        self.layer3 = tf.keras.layers.Dense(1024, dtype=dtype)
+        self.layer4 = tf.keras.layers.Dense(256, dtype=dtype)
+        self.layer5 = tf.keras.layers.Dense(6, activation="softmax", dtype="float32")
+
+    def recurrent_layers(self):
+        """the ConvLSTM2D layers, in the order `head` expects their last hidden states"""
+        return [self.layer1]
+        
+    def head(self, hidden):
+        """probabilities from the last hidden state of every recurrent layer (see `streaming.py`)"""
+        x = self.layer2(hidden[0])
         x = self.layer3(x)
         x = self.layer4(x)
         x = self.layer5(x)
         return x
         
+    def call(self, inputs):
+        return self.head([layer(inputs) for layer in self.recurrent_layers()])
+        
     def build_graph(self, input_shape):
         """use this function to initialize a graph and define the shapes when asking for summary()"""
         x = tf.keras.Input(shape=input_shape[1:], name="input")
         return tf.keras.Model(inputs=[x], outputs=self.call(x), name=self.name)
 
 
-class ConvLSTM2D_multihead(tf.keras.Model):
+class ConvLSTM2D_multihead(execution.ExecutionMode, tf.keras.Model):
     
     
-    def __init__(self, input_shape):
+    def __init__(self, input_shape, mixed_precision=False, jit_compile="auto"):
+        """
+        params:
+            mixed_precision, jit_compile: execution mode (see `execution.ExecutionMode`)
+        """
         super(ConvLSTM2D_multihead, self).__init__()
         
+        self.jit_compile_default = jit_compile
+        dtype = execution.layer_dtype(mixed_precision)
+        
         # no dilation == (1,1)
-        self.h1_layer1 = tf.keras.layers.ConvLSTM2D(filters=2, kernel_size=[3,3], strides=(2,2), dilation_rate=(1,1), data_format="channels_last")
-        self.h1_layer2 = tf.keras.layers.Flatten()
+        self.h1_layer1 = tf.keras.layers.ConvLSTM2D(filters=2, kernel_size=[3,3], strides=(2,2), dilation_rate=(1,1), data_format="channels_last", dtype=dtype)
+        self.h1_layer2 = tf.keras.layers.Flatten(dtype=dtype)
         
         # dilation == (4,4)
-        self.h2_layer1 = tf.keras.layers.ConvLSTM2D(filters=2, kernel_size=[3,3], strides=(1,1), dilation_rate=(4,4), padding="valid", data_format="channels_last")
-        self.h2_layer2 = tf.keras.layers.Flatten()
+        self.h2_layer1 = tf.keras.layers.ConvLSTM2D(filters=2, kernel_size=[3,3], strides=(1,1), dilation_rate=(4,4), padding="valid", data_format="channels_last", dtype=dtype)
+        self.h2_layer2 = tf.keras.layers.Flatten(dtype=dtype)
         
         # dilation == (4,4)
-        self.h3_layer1 = tf.keras.layers.ConvLSTM2D(filters=2, kernel_size=[3,3], strides=(1,1), dilation_rate=(2,2), padding="valid", data_format="channels_last")
-        self.h3_layer2 = tf.keras.layers.Flatten()
+        self.h3_layer1 = tf.keras.layers.ConvLSTM2D(filters=2, kernel_size=[3,3], strides=(1,1), dilation_rate=(2,2), padding="valid", data_format="channels_last", dtype=dtype)
+        self.h3_layer2 = tf.keras.layers.Flatten(dtype=dtype)
         
-        self.combine = tf.keras.layers.Concatenate()
+        self.combine = tf.keras.layers.Concatenate(dtype=dtype)
         
-        self.layer3 = tf.keras.layers.Dense(1024)
-        self.layer4 = tf.keras.layers.Dense(256)
-        self.layer5 = tf.keras.layers.Dense(6, activation="softmax")
+        self.layer3 = tf.keras.layers.Dense(1024, dtype=dtype)
+        self.layer4 = tf.keras.layers.Dense(256, dtype=dtype)
+        self.layer5 = tf.keras.layers.Dense(6, activation="softmax", dtype="float32")
+
+    def recurrent_layers(self):
+        """the ConvLSTM2D layers, in the order `head` expects their last hidden states"""
+        return [self.h1_layer1, self.h2_layer1, self.h3_layer1]
+        
+    def head(self, hidden):
+        """probabilities from the last hidden state of every recurrent layer (see `streaming.py`)"""
+        x1 = self.h1_layer2(hidden[0])
+        x2 = self.h2_layer2(hidden[1])
+        x3 = self.h3_layer2(hidden[2])
+        
+        x = self.combine([x1,x2,x3])
+        
+        x = self.layer3(x)
+        x = self.layer4(x)
+        x = self.layer5(x)
+        return x
         
     def call(self, inputs):
-        x1 = self.h1_layer1(inputs)
-        x1 = self.h1_layer2(x1)
+        return self.head([layer(inputs) for layer in self.recurrent_layers()])
+        
+    def build_graph(self, input_shape):
+        """use this function to initialize a graph and define the shapes when asking for summary()"""
+        x = tf.keras.Input(shape=input_shape[1:], name="input")
+        return tf.keras.Model(inputs=[x], outputs=self.call(x), name=self.name)
+
+class Embedding_LSTM(execution.ExecutionMode, tf.keras.Model):
+    """temporal head over per frame embeddings (batch, frames, features) of a frozen 2D backbone, see `embeddings.py`"""
+    
+    def __init__(self, input_shape, mixed_precision=False, jit_compile="auto", units=128, dropout=0.3):
+        """
+        params:
+            mixed_precision, jit_compile: execution mode (see `execution.ExecutionMode`)
+            units: LSTM units
+        """
+        super(Embedding_LSTM, self).__init__(name="Embedding_LSTM")
         
-        x2 = self.h2_layer1(inputs)
-        x2 = self.h2_layer2(x2)
+        self.jit_compile_default = jit_compile
+        dtype = execution.layer_dtype(mixed_precision)
         
-        x3 = self.h3_layer1(inputs)
-        x3 = self.h3_layer2(x3)       
+        self.layer1 = tf.keras.layers.LayerNormalization(dtype=dtype)
+        self.layer2 = tf.keras.layers.LSTM(units, dtype=dtype)
+        self.layer3 = tf.keras.layers.Dropout(dropout, dtype=dtype)
+        self.layer4 = tf.keras.layers.Dense(6, activation="softmax", dtype="float32")
+
+    def call(self, inputs, training=False):
+        x = self.layer1(inputs)
+        x = self.layer2(x)
+        x = self.layer3(x, training=training)
+        x = self.layer4(x)
+        return x
         
-        x = self.combine([x1,x2,x3])
+    def build_graph(self, input_shape):
+        """use this function to initialize a graph and define the shapes when asking for summary()"""
+        x = tf.keras.Input(shape=input_shape[1:], name="input")
+        return tf.keras.Model(inputs=[x], outputs=self.call(x), name=self.name)
+
+
+class Embedding_Conv1D(execution.ExecutionMode, tf.keras.Model):
+    """temporal convolutions over per frame embeddings (batch, frames, features), see `embeddings.py`"""
+    
+    def __init__(self, input_shape, mixed_precision=False, jit_compile="auto", filters=128, dropout=0.3):
+        """
+        params:
+            mixed_precision, jit_compile: execution mode (see `execution.ExecutionMode`)
+            filters: filters of both temporal convolutions
+        """
+        super(Embedding_Conv1D, self).__init__(name="Embedding_Conv1D")
+        
+        self.jit_compile_default = jit_compile
+        dtype = execution.layer_dtype(mixed_precision)
         
+        self.layer1 = tf.keras.layers.LayerNormalization(dtype=dtype)
+        self.layer2 = tf.keras.layers.Conv1D(filters, 3, padding="same", activation="relu", dtype=dtype)
+        self.layer3 = tf.keras.layers.Conv1D(filters, 3, padding="same", activation="relu", dtype=dtype)
+        self.layer4 = tf.keras.layers.Flatten(dtype=dtype)  # keeps the order of the frames (direction)
+        self.layer5 = tf.keras.layers.Dropout(dropout, dtype=dtype)
+        self.layer6 = tf.keras.layers.Dense(6, activation="softmax", dtype="float32")
+
+    def call(self, inputs, training=False):
+        x = self.layer1(inputs)
+        x = self.layer2(x)
         x = self.layer3(x)
         x = self.layer4(x)
-        x = self.layer5(x)
+        x = self.layer5(x, training=training)
+        x = self.layer6(x)
         return x
         
     def build_graph(self, input_shape):
         """use this function to initialize a graph and define the shapes when asking for summary()"""
         x = tf.keras.Input(shape=input_shape[1:], name="input")
-        return tf.keras.Model(inputs=[x], outputs=self.call(x), name=self.name)
\ No newline at end of file
+        return tf.keras.Model(inputs=[x], outputs=self.call(x), name=self.name)
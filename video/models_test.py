@@ -0,0 +1,73 @@
+"""tests for models.py"""
+
+import numpy as np
+import tensorflow as tf
+
+import models
+
+
+INPUT_SHAPE = (2, 3, 16, 16, 3)
+
+
+class ExecutionModeTest(tf.test.TestCase):
+
+    def test_float32_by_default(self):
+        model = models.ConvLSTM2D_a(INPUT_SHAPE)
+        model.build_graph(INPUT_SHAPE)
+
+        self.assertEqual(model.layer1.compute_dtype, "float32")
+        self.assertEqual(model(tf.zeros(INPUT_SHAPE)).dtype, tf.float32)
+
+    def test_mixed_precision_keeps_softmax_float32(self):
+        for Model in [models.ConvLSTM2D_a, models.ConvLSTM2D_multihead]:
+            model = Model(INPUT_SHAPE, mixed_precision=True)
+            model.build_graph(INPUT_SHAPE)
+
+            self.assertEqual(model.layer4.compute_dtype, "bfloat16")
+            self.assertEqual(model.layer4.variable_dtype, "float32")
+            self.assertEqual(model.layer5.compute_dtype, "float32")
+
+            probabilities = model(tf.random.uniform(INPUT_SHAPE))
+            self.assertEqual(probabilities.dtype, tf.float32)
+            self.assertAllClose(tf.reduce_sum(probabilities, axis=-1), np.ones(INPUT_SHAPE[0]), atol=1e-5)
+
+    def test_jit_compile_is_the_compile_default(self):
+        model = models.ConvLSTM2D_a(INPUT_SHAPE, jit_compile=True)
+        model.compile(optimizer="Adam", loss="categorical_crossentropy")
+        self.assertTrue(model.jit_compile)
+
+        # an explicit argument still wins
+        model.compile(optimizer="Adam", loss="categorical_crossentropy", jit_compile=False)
+        self.assertFalse(model.jit_compile)
+
+    def test_same_weights_same_predictions(self):
+        x = tf.random.uniform(INPUT_SHAPE, seed=0)
+
+        reference = models.ConvLSTM2D_a(INPUT_SHAPE)
+        reference.build_graph(INPUT_SHAPE)
+
+        mixed = models.ConvLSTM2D_a(INPUT_SHAPE, mixed_precision=True, jit_compile=True)
+        mixed.build_graph(INPUT_SHAPE)
+        mixed.set_weights(reference.get_weights())
+        mixed.compile(loss="categorical_crossentropy")
+
+        self.assertAllClose(mixed.predict(x, verbose=0), reference(x), atol=0.05)
+
+
+class EmbeddingHeadTest(tf.test.TestCase):
+
+    def test_probabilities_per_clip(self):
+        shape = (2, 8, 576)  # (batch, frames, features)
+
+        for Model in [models.Embedding_LSTM, models.Embedding_Conv1D]:
+            for mixed_precision in [False, True]:
+                model = Model(shape, mixed_precision=mixed_precision)
+                model.build_graph(shape)
+
+                probabilities = model(tf.random.normal(shape))
+                self.assertEqual(probabilities.dtype, tf.float32)
+                self.assertAllClose(tf.reduce_sum(probabilities, axis=-1), np.ones(shape[0]), atol=1e-5)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,205 @@
+""" compact motion representations of the sampled frames
+
+most of a 240x320x3 clip is static background, the gestures are movements: the sampled frames are
+converted to grayscale at reduced resolution (default 60x80) and replaced by
+
+    diff: |frame[t + 1] - frame[t]|, one image per pair of consecutive frames
+    mhi:  motion history image after every frame pair, pixels that moved are 1 and fade out
+          linearly over the clip (where and when something moved, the direction is in the ramp)
+
+both are sequences of (num_segments - 1, height, width, 1) images in [0, 1] (48x fewer values
+than the RGB clip), `decode_motion` is a drop in `decode_fn` of `clip_store` (see MOTION in train.py)
+
+    python motion.py    # bytes per clip, step time & accuracy of ConvLSTM2D_a, RGB vs motion
+
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import tensorflow as tf
+
+import decoders
+
+
+def grayscale(video, height=60, width=80):
+    """(T, H, W, 3) float [0, 1] -> (T, height, width, 1), area downscaled"""
+    return tf.image.resize(tf.image.rgb_to_grayscale(video), (height, width), method="area", antialias=True)
+
+
+def frame_differences(video, height=60, width=80):
+    """absolute differences of consecutive grayscale frames, (T - 1, height, width, 1)"""
+    gray = grayscale(video, height, width)
+    return tf.abs(gray[1:] - gray[:-1])
+
+
+def motion_history(video, height=60, width=80, threshold=0.05):
+    """motion history image after every frame pair, (T - 1, height, width, 1)
+
+    pixels whose difference exceeds `threshold` are set to 1, the others decay by 1 / (T - 1) per frame
+    """
+    moving = tf.cast(frame_differences(video, height, width) > threshold, tf.dtypes.float32)
+    decay = 1. / tf.cast(tf.maximum(tf.shape(moving)[0], 1), tf.dtypes.float32)
+
+    return tf.scan(lambda history, m: tf.maximum(m, history - decay), moving, initializer=tf.zeros_like(moving[0]))
+
+
+REPRESENTATIONS = {
+    "diff": frame_differences,
+    "mhi": motion_history,
+}
+
+
+def decode_motion(example: dict, representation: str, num_segments: int, height: int = 60, width: int = 80, ratio: int = 1) -> dict:
+    """`decoders.decode_video_segment`, then the frames are replaced by a motion representation
+
+    params:
+        representation: see REPRESENTATIONS
+        height, width: size of the representation
+        ratio: downscale while decoding (eg. 4 decodes 240x320 frames at 60x80, much cheaper)
+    """
+    example = decoders.decode_video_segment(example, num_segments=num_segments, ratio=ratio)
+    example["video"] = REPRESENTATIONS[representation](example["video"], height, width)
+
+    return example
+
+
+def example_shape(params: dict, height: int = 240, width: int = 320, channels: int = 3) -> tuple:
+    """shape of one decoded clip, `params` of `decode_motion` (with "representation")
+    or of `decoders.decode_video_segment` (RGB frames of height x width)
+    """
+    if "representation" not in params:
+        return (params["num_segments"], height, width, channels)
+
+    return (params["num_segments"] - 1, params.get("height", 60), params.get("width", 80), 1)
+
+
+def synthetic_gestures(num_clips=96, frames=32, height=240, width=320, seed=0) -> tf.data.Dataset:
+    """un-decoded clips of a blob moving in front of a static textured background
+
+    labels follow the dataset (clockwise, counterclockwise, down, up, left, right), the background,
+    blob size, colour, speed and start differ per clip
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:height, :width]
+    t = np.linspace(0., 1., frames)
+
+    clips, labels = [], []
+    for i in range(num_clips):
+        label = i % 6
+        background = tf.image.resize(rng.uniform(0, 255, (1, height // 16, width // 16, 3)), (height, width))[0].numpy()
+
+        radius = rng.uniform(0.08, 0.15) * height
+        center = np.array([height, width]) * rng.uniform(0.4, 0.6, 2)
+        extent = rng.uniform(0.2, 0.3) * np.array([height, width])
+
+        if label < 2:  # circle, clockwise on screen (rows grow downwards)
+            angle = rng.uniform(0, 2 * np.pi) + (1 if label == 0 else -1) * 2 * np.pi * t
+            path = center + extent * np.stack([np.sin(angle), np.cos(angle)], axis=1)
+        else:
+            direction = {2: (1, 0), 3: (-1, 0), 4: (0, -1), 5: (0, 1)}[label]
+            path = center + extent * np.outer(2 * t - 1, direction)
+
+        colour = rng.uniform(0, 255, 3)
+        video = []
+        for cy, cx in path:
+            blob = np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * radius ** 2))[..., None]
+            frame = background * (1 - blob) + colour * blob + rng.normal(0, 2, (height, width, 1))
+            video.append(tf.io.encode_jpeg(np.clip(frame, 0, 255).astype(np.uint8)))
+
+        clips.append(tf.stack(video))
+        labels.append(label)
+
+    return tf.data.Dataset.from_tensor_slices(
+        {
+            "video": tf.stack(clips),
+            "frames": tf.fill((num_clips,), frames),
+            "label": tf.constant(labels, dtype=tf.int64),
+            "id": tf.constant([f"clip_{i}" for i in range(num_clips)]),
+        }
+    )
+
+
+def compare(num_clips=96, epochs=8, batch_size=8, num_segments=8, seed=0) -> dict:
+    """{representation: bytes_per_clip, step_ms, accuracy}, ConvLSTM2D_a trained on synthetic gestures
+    (2/3 train, 1/3 test), clips are decoded once into clip stores
+    """
+
+    import clip_store
+    import models
+
+    ds = synthetic_gestures(num_clips, seed=seed)
+    num_train = 2 * num_clips // 3
+
+    configs = {
+        "rgb": (decoders.decode_video_segment, {"num_segments": num_segments}),
+        **{
+            name: (decode_motion, {"num_segments": num_segments, "representation": name, "ratio": 4})
+            for name in REPRESENTATIONS
+        },
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (decode_fn, params) in configs.items():
+            stores = {
+                split: clip_store.get_or_export(split_ds, Path(tmp) / name, split, params, decode_fn=decode_fn)
+                for split, split_ds in [("train", ds.take(num_train)), ("test", ds.skip(num_train))]
+            }
+            index = clip_store.read_index(stores["train"])
+
+            def supervised(path, shuffle):
+                return clip_store.load(path, batch_size, shuffle=shuffle, seed=seed).map(
+                    lambda ex: (ex["video"], tf.one_hot(ex["label"], depth=6))
+                )
+
+            tf.keras.utils.set_random_seed(seed)
+            shape = (batch_size,) + example_shape(params)
+            model = models.ConvLSTM2D_a(shape)
+            model.build_graph(shape)
+            model.compile(optimizer="Adam", loss="categorical_crossentropy", metrics=["accuracy"])
+
+            model.fit(supervised(stores["train"], True), epochs=1, verbose=0)  # warm up (tracing)
+            start = time.perf_counter()
+            model.fit(supervised(stores["train"], True), epochs=epochs - 1, verbose=0)
+            steps = (epochs - 1) * -(-num_train // batch_size)
+
+            _, accuracy = model.evaluate(supervised(stores["test"], False), verbose=0)
+
+            results[name] = {
+                "bytes_per_clip": (stores["train"] / "clips.npy").stat().st_size // index["count"],
+                "step_ms": 1000 * (time.perf_counter() - start) / steps,
+                "accuracy": accuracy,
+            }
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=96, help="synthetic gesture clips (2/3 train, 1/3 test)")
+    parser.add_argument("--epochs", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    results = compare(args.clips, args.epochs, args.batch_size)
+
+    rgb = results["rgb"]
+    print(f"{'':>6} {'bytes/clip':>11} {'vs rgb':>7} {'step ms':>9} {'vs rgb':>7} {'accuracy':>9}")
+    for name, r in results.items():
+        print(
+            f"{name:>6} {r['bytes_per_clip']:11d} {rgb['bytes_per_clip'] / r['bytes_per_clip']:6.0f}x "
+            f"{r['step_ms']:9.1f} {rgb['step_ms'] / r['step_ms']:6.1f}x {r['accuracy']:9.3f}"
+        )
+
+
+if __name__ == "__main__":
+
+    main()
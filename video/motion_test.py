@@ -0,0 +1,56 @@
+"""tests for motion.py"""
+
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+import clip_store
+import motion
+
+
+def _moving_square(frames=4, height=16, width=16):
+    """white 4x4 square moving right by 4 pixels per frame on a grey background"""
+    video = np.full((frames, height, width, 3), 0.5, dtype=np.float32)
+    for t in range(frames):
+        video[t, 6:10, 4 * t : 4 * t + 4] = 1.
+    return tf.constant(video)
+
+
+class MotionTest(tf.test.TestCase):
+
+    def test_static_background_is_removed(self):
+        video = tf.tile(tf.random.uniform((1, 16, 16, 3)), [4, 1, 1, 1])
+
+        for representation in motion.REPRESENTATIONS.values():
+            self.assertAllClose(representation(video, 8, 8), tf.zeros((3, 8, 8, 1)))
+
+    def test_frame_differences_mark_old_and_new_position(self):
+        diff = motion.frame_differences(_moving_square(), 16, 16).numpy()[..., 0]
+
+        self.assertEqual(diff.shape, (3, 16, 16))
+        self.assertAllGreater(diff[0, 6:10, 0:8], 0.)
+        self.assertAllEqual(diff[0, :, 8:], np.zeros((16, 8)))
+
+    def test_motion_history_fades_with_time(self):
+        mhi = motion.motion_history(_moving_square(), 16, 16).numpy()[-1, 8, :, 0]
+
+        # the square moved over columns 0 .. 15, latest movement is brightest
+        self.assertAllClose(mhi[[0, 4, 8, 12]], [1. - 2. / 3., 1. - 1. / 3., 1., 1.])
+
+    def test_decode_motion_as_clip_store_decoder(self):
+        ds = motion.synthetic_gestures(num_clips=2, frames=8, height=32, width=48)
+        params = {"num_segments": 4, "representation": "mhi", "height": 8, "width": 12}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = clip_store.get_or_export(ds, tmp, "train", params, decode_fn=motion.decode_motion)
+            self.assertEqual(clip_store.read_index(path)["shape"], [2] + list(motion.example_shape(params)))
+
+            batch = next(iter(clip_store.load(path, batch_size=2)))
+
+        self.assertEqual(batch["video"].shape, (2, 3, 8, 12, 1))
+        self.assertAllEqual(batch["label"], [0, 1])
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,198 @@
+""" frame by frame (stateful) inference of the ConvLSTM2D models
+
+the hidden & cell state of every ConvLSTM2D layer is kept between calls, each new frame costs
+one recurrent step (plus the dense head) and yields the prediction for the clip so far
+
+    classifier = StatefulVideoClassifier(model, height=240, width=320)
+    for i, probabilities in classifier.run(frames_from_directory("clips/UP/clip_0")):
+        print(i, probabilities.argmax())
+
+    python streaming.py --weights ckpt.weights.h5 --frames 32    # latency vs whole clip re-evaluation
+
+the models are trained on `num_segments` frames sampled over a whole clip (see `decode_video_segment`),
+`stride` only feeds every n-th frame to get closer to that frame rate on live streams
+
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
+
+import numpy as np
+import tensorflow as tf
+
+import models
+
+
+def frames_from_directory(path):
+    """yields the uint8 frames of a clip directory (`{clip}_{frame}.jpg`) in frame order"""
+
+    for image in sorted(Path(path).glob("*.jpg"), key=lambda i: int(i.stem.split("_")[-1])):
+        yield tf.io.decode_jpeg(tf.io.read_file(str(image)), channels=3)
+
+
+class StatefulVideoClassifier:
+    """feeds frames one at a time to a trained ConvLSTM2D_a / ConvLSTM2D_multihead
+
+    params:
+        model: trained (built) model with `recurrent_layers` & `head`
+        height, width: model input size, other frames are resized (area)
+        stride: only every `stride`-th pushed frame advances the state
+    """
+
+    def __init__(self, model, height=240, width=320, stride=1):
+        if stride < 1:
+            raise ValueError("stride must be positive")
+
+        self.model = model
+        self.size = (height, width)
+        self.stride = stride
+
+        self.cells = [layer.cell for layer in model.recurrent_layers()]
+        self.reset()
+
+    def reset(self):
+        """start a new clip"""
+
+        self.states = [cell.get_initial_state(batch_size=1) for cell in self.cells]
+        self.count = 0
+        self.probabilities = None
+
+        # seconds per pushed frame
+        self.latencies = []
+
+    def _preprocess(self, frame):
+        """uint8 or float [0, 1] frame -> float (1, height, width, 3) like `decoders.decode_video`"""
+
+        frame = tf.convert_to_tensor(frame)
+        if frame.dtype == tf.uint8:
+            frame = tf.cast(frame, tf.float32) / 255.
+
+        if tuple(frame.shape[:2]) != self.size:
+            frame = tf.image.resize(frame, self.size, method="area")
+
+        return frame[None]
+
+    @tf.function
+    def _step(self, frame, states):
+        """one recurrent step of every ConvLSTM2D layer, returns (probabilities, new states)"""
+
+        hidden, new_states = [], []
+        for cell, state in zip(self.cells, states):
+            h, state = cell(frame, state, training=False)
+            hidden.append(h)
+            new_states.append(state)
+
+        return self.model.head(hidden)[0], new_states
+
+    def push(self, frame):
+        """feed one (height, width, 3) frame, returns the probabilities of the clip so far
+
+        (frames skipped by `stride` return the previous probabilities, None before the first step)
+        """
+
+        start = time.perf_counter()
+
+        if self.count % self.stride == 0:
+            probabilities, self.states = self._step(self._preprocess(frame), self.states)
+            self.probabilities = probabilities.numpy()
+
+        self.count += 1
+        self.latencies.append(time.perf_counter() - start)
+
+        return self.probabilities
+
+    def run(self, frames):
+        """yields (frame index, probabilities) for every frame of a directory / generator / array"""
+
+        for i, frame in enumerate(frames):
+            yield i, self.push(frame)
+
+    def latency(self) -> dict:
+        """per frame latency percentiles (ms) since the last `reset`"""
+
+        latencies = np.asarray(self.latencies) * 1000
+
+        return {
+            "frames": len(latencies),
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p99": float(np.percentile(latencies, 99)),
+        }
+
+
+def reevaluate(model, clip: np.ndarray) -> tuple:
+    """baseline: re-run the whole clip so far for every new frame, returns ((frames, classes), seconds per frame)"""
+
+    predict = tf.function(lambda x: model(x, training=False), reduce_retracing=True)
+
+    # trace every clip length once, timing should not include tracing
+    for t in range(1, len(clip) + 1):
+        predict(clip[None, :t])
+
+    latencies = []
+    probabilities = []
+    for t in range(1, len(clip) + 1):
+        start = time.perf_counter()
+        probabilities.append(predict(clip[None, :t])[0].numpy())
+        latencies.append(time.perf_counter() - start)
+
+    return np.stack(probabilities), np.asarray(latencies)
+
+
+def benchmark(model, clip: np.ndarray) -> dict:
+    """stateful vs whole clip re-evaluation on one float clip (frames, height, width, 3)"""
+
+    classifier = StatefulVideoClassifier(model, clip.shape[1], clip.shape[2])
+    classifier.push(clip[0])  # trace
+    classifier.reset()
+
+    rolling = np.stack([probabilities for _, probabilities in classifier.run(clip)])
+    expected, latencies = reevaluate(model, clip)
+
+    return {
+        **classifier.latency(),
+        "reevaluate_ms_p50": float(np.percentile(latencies, 50) * 1000),
+        "reevaluate_ms_last": float(latencies[-1] * 1000),
+        "max_abs_diff": float(np.max(np.abs(rolling - expected))),
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=["ConvLSTM2D_a", "ConvLSTM2D_multihead"], default="ConvLSTM2D_a")
+    parser.add_argument("--weights", help="weights saved by train.py (default: untrained model)")
+    parser.add_argument("--clip", help="clip directory of jpeg frames (default: random frames)")
+    parser.add_argument("--frames", type=int, default=32, help="frames of the random clip")
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--width", type=int, default=320)
+    args = parser.parse_args()
+
+    if args.clip:
+        clip = np.stack([
+            tf.image.resize(frame, (args.height, args.width), method="area").numpy() / 255.
+            for frame in frames_from_directory(args.clip)
+        ]).astype(np.float32)
+    else:
+        clip = np.random.default_rng(0).uniform(size=(args.frames, args.height, args.width, 3)).astype(np.float32)
+
+    input_shape = (1,) + clip.shape
+    model = getattr(models, args.model)(input_shape)
+    model(clip[None, :1])  # build
+    if args.weights:
+        model.load_weights(args.weights)
+
+    r = benchmark(model, clip)
+
+    print(f"{args.model}, {len(clip)} frames of {args.height}x{args.width}")
+    print(f"stateful:     p50 {r['latency_ms_p50']:8.2f} ms/frame   p99 {r['latency_ms_p99']:8.2f} ms/frame")
+    print(f"re-evaluate:  p50 {r['reevaluate_ms_p50']:8.2f} ms/frame   last frame {r['reevaluate_ms_last']:8.2f} ms")
+    print(f"max |stateful - re-evaluate| = {r['max_abs_diff']:.2e}")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,71 @@
+"""tests for streaming.py"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import models
+import streaming
+
+
+def _model(Model, frames=5, height=16, width=16):
+    model = Model((1, frames, height, width, 3))
+    model(tf.zeros((1, 1, height, width, 3)))  # build
+    return model
+
+
+class StatefulVideoClassifierTest(tf.test.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clip = np.random.default_rng(0).uniform(size=(5, 16, 16, 3)).astype(np.float32)
+
+    def test_rolling_predictions_match_the_clip_so_far(self):
+        for Model in [models.ConvLSTM2D_a, models.ConvLSTM2D_multihead]:
+            model = _model(Model)
+            classifier = streaming.StatefulVideoClassifier(model, 16, 16)
+
+            for i, probabilities in classifier.run(self.clip):
+                self.assertAllClose(probabilities, model(self.clip[None, : i + 1])[0], atol=1e-5)
+
+    def test_reset_starts_a_new_clip(self):
+        model = _model(models.ConvLSTM2D_a)
+        classifier = streaming.StatefulVideoClassifier(model, 16, 16)
+
+        first = classifier.push(self.clip[0])
+        classifier.push(self.clip[1])
+        classifier.reset()
+
+        self.assertAllClose(classifier.push(self.clip[0]), first)
+
+    def test_stride_skips_frames(self):
+        model = _model(models.ConvLSTM2D_a)
+        classifier = streaming.StatefulVideoClassifier(model, 16, 16, stride=2)
+
+        predictions = [probabilities for _, probabilities in classifier.run(self.clip)]
+
+        self.assertAllClose(predictions[1], predictions[0])
+        self.assertAllClose(predictions[4], model(self.clip[None, ::2])[0], atol=1e-5)
+
+    def test_uint8_frames_are_scaled_and_resized(self):
+        model = _model(models.ConvLSTM2D_a)
+        classifier = streaming.StatefulVideoClassifier(model, 16, 16)
+
+        frame = np.full((32, 32, 3), 255, dtype=np.uint8)
+        self.assertAllClose(classifier.push(frame), model(tf.ones((1, 1, 16, 16, 3)))[0], atol=1e-5)
+
+    def test_frames_from_directory_in_frame_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in [0, 1, 2, 10]:
+                frame = tf.fill((8, 8, 3), tf.constant(20 * i, tf.uint8))
+                (Path(tmp) / f"clip_{i}.jpg").write_bytes(tf.io.encode_jpeg(frame).numpy())
+
+            values = [int(frame[0, 0, 0]) for frame in streaming.frames_from_directory(tmp)]
+
+        self.assertAllClose(values, [0, 20, 40, 200], atol=2)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -1,6 +1,7 @@
 import functools
 import os
 import logging
+import sys
 from pathlib import Path
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1' 
@@ -23,24 +24,176 @@ fh.setLevel(logging.DEBUG)
 fh.setFormatter(formatter)
 logger.addHandler(fh)
 
-physical_devices = tf.config.list_physical_devices('GPU')
-tf.config.experimental.set_memory_growth(physical_devices[0], True)
+for device in tf.config.list_physical_devices('GPU'):  # none on the CPU training nodes
+    tf.config.experimental.set_memory_growth(device, True)
 tf.config.optimizer.set_experimental_options({'layout_optimizer': False})
 
 import ai_wearables_video_gestures.ai_wearables_video_gestures
+
+# shared code (repo root)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common import inference
+from common import step_timing
     
+import clip_store
+import data_service
 import data_utils
 import decoders
+import distributed
+import embeddings
 import models
+import motion
+
+
+# builder config, eg. "ai_wearables_video_gestures/120x160_seg8" (pre-resized & pre-sampled at build time)
+DATASET = "ai_wearables_video_gestures/default"
+
+# decode train & validation clips once into a memory mapped store (set None to decode every epoch)
+CLIP_STORE = "./clip_store"
+
+# decode, sample & batch train & validation clips on tf.data service workers instead of the
+# trainer's cores, eg. "grpc://localhost:5050" (see `data_service.py`, takes precedence over CLIP_STORE)
+DATA_SERVICE = None
+
+# train on a compact motion representation ("diff" or "mhi", grayscale 60x80, see `motion.py`)
+# instead of the RGB frames, None: RGB
+MOTION = None
+
+# train a light temporal head (HEAD, see `embeddings.HEADS`) on per frame embeddings of this frozen
+# backbone (see `embeddings.BACKBONES`), computed once and cached in EMBEDDING_STORE, None: ConvLSTM2D_a
+BACKBONE = None
+HEAD = "lstm"
+EMBEDDING_STORE = "./embedding_store"
+
+# execution mode, see `common/execution_benchmark.py` for step times & accuracy parity on this machine
+MIXED_PRECISION = False  # bfloat16 compute (softmax stays float32)
+JIT_COMPILE = "auto"  # True: XLA, "auto": XLA on GPU only
+
+
+def train_distributed(strategy, ds_info, batch, decode_fn, params, input_shape, epochs):
+    """multi-worker mode (TF_CONFIG lists several workers), see `distributed.py`
+
+    every worker decodes its own even split of the train & validation clips, `batch` is the per
+    worker batch, the global batch is `batch * workers`
+    """
+
+    workers = distributed.num_workers(strategy)
+    index = distributed.worker_index(strategy)
+
+    splits = {name: tfds.even_splits(name, n=workers)[index] for name in ["train", "validation"]}
+    shards = tfds.load(
+        DATASET,
+        split=list(splits.values()),
+        data_dir="./data",
+        decoders={"video": tfds.decode.SkipDecoding()},
+    )
+
+    datasets = {}
+    with tf.device("CPU"):
+        for name, ds in zip(splits, shards):
+            if CLIP_STORE is not None and DATA_SERVICE is None:
+                # one store per worker and cluster size (workers may share the file system)
+                store = clip_store_root() / f"worker_{index}_of_{workers}"
+                ds = clip_store.load(
+                    clip_store.get_or_export(ds, store, name, params, decode_fn=decode_fn, source=clip_store.source(ds_info)),
+                    batch,
+                    shuffle=name == "train",
+                )
+            else:
+                ds = ds.map(functools.partial(decode_fn, **params)).batch(batch).prefetch(batch)
+
+            ds = ds.map(lambda ex : (ex["video"], tf.one_hot(ex["label"], depth=6)))
+            if DATA_SERVICE is not None:
+                ds = data_service.distribute(ds, DATA_SERVICE)
+
+            datasets[name] = ds.repeat()
+
+    # the collectives of a step wait for every worker: same number of steps everywhere (the
+    # smallest even split holds at least `num_examples // workers` clips)
+    steps = {name: max(1, ds_info.splits[name].num_examples // workers // batch) for name in splits}
+
+    def model_fn():
+        model = models.ConvLSTM2D_a(input_shape, mixed_precision=MIXED_PRECISION)
+        model.build_graph(input_shape)
+        return model
+
+    model, _ = distributed.fit(
+        strategy,
+        model_fn,
+        lambda input_context: datasets["train"],
+        global_batch_size=batch * workers,
+        epochs=epochs,
+        steps_per_epoch=steps["train"],
+        checkpoint_dir=Path.cwd() / "ckpt_distributed",
+        val_dataset_fn=lambda input_context: datasets["validation"],
+        val_steps=steps["validation"],
+        weights_path=Path.cwd() / "ckpt.weights.h5",
+    )
+
+    return model
+
+
+def train_head(train, val, test, ds_info, segments, batch=32, epochs=200):
+    """temporal head on the cached embeddings of every sampled frame (BACKBONE, see `embeddings.py`)"""
+
+    params = {"backbone": BACKBONE, "num_segments": segments}
+    root = Path(EMBEDDING_STORE) / DATASET
+    stores = {
+        split: embeddings.get_or_export(ds, root, split, params, source=clip_store.source(ds_info))
+        for split, ds in [("train", train), ("validation", val), ("test", test)]
+    }
+
+    def supervised(split, shuffle=False):
+        return clip_store.load(stores[split], batch, shuffle=shuffle).map(
+            lambda ex : (ex["video"], tf.one_hot(ex["label"], depth=6))
+        )
+
+    stats = step_timing.PipelineStats()
+
+    # (batch, frames, features)
+    input_shape = (batch,) + tuple(clip_store.read_index(stores["train"])["shape"][1:])
+
+    model = embeddings.HEADS[HEAD](input_shape, mixed_precision=MIXED_PRECISION, jit_compile=JIT_COMPILE)
+    model.build_graph(input_shape)
+    model.compile(optimizer="Adam", loss="categorical_crossentropy", metrics=["accuracy"])
+
+    print(model.build_graph(input_shape).summary(line_length=160))
+
+    model.fit(
+        stats.deliver(supervised("train", shuffle=True)),
+        validation_data=supervised("validation"),
+        epochs=epochs,
+        verbose=1,
+        callbacks=[
+            tf.keras.callbacks.ModelCheckpoint(
+                Path.cwd() / f"ckpt_{BACKBONE}_{HEAD}.weights.h5",
+                monitor="val_loss",
+                save_best_only=True,
+                save_weights_only=True,
+            ),
+            step_timing.StepTimer(stats, Path.cwd() / "step_timing.jsonl"),
+        ],
+    )
+
+    test_results(model, clip_store.load(stores["test"], batch))
+
+
+def clip_store_root():
+    # RGB & motion stores side by side (a split keeps one store per root)
+    root = Path(CLIP_STORE) / DATASET
+    return root if MOTION is None else root / MOTION
 
 
 def main():
-    ds = tfds.load(
-        "ai_wearables_video_gestures",
+    # before any other op (MultiWorkerMirroredStrategy sets up the cluster)
+    strategy = distributed.strategy()
+
+    ds, ds_info = tfds.load(
+        DATASET,
         data_dir="./data",
         decoders={"video": tfds.decode.SkipDecoding()},  # skip decoding for now
         # decoders=tfds.decode.PartialDecoding({'video': False, 'label': True, 'frames': True, 'id': True}),
-        with_info=False,
+        with_info=True,
         as_supervised=False,  # set True to only return (video, label) tuple
     )
     
@@ -58,18 +211,57 @@ def main():
     
     batch = 16
     segments = 8
+
+    if BACKBONE is not None:
+        train_head(train, val, test, ds_info, segments)
+        return
+
+    # configs without resizing leave height & width undefined (240x320)
+    _, height, width, channels = ds_info.features["video"].shape
+    if MOTION is None:
+        decode_fn, params = decoders.decode_video_segment, {"num_segments": segments}
+    else:
+        # full size frames are decoded at 60x80 directly (jpeg DCT scaling)
+        decode_fn, params = motion.decode_motion, {"num_segments": segments, "representation": MOTION, "ratio": 1 if height else 4}
+
+    input_shape = (batch,) + motion.example_shape(params, height or 240, width or 320, channels)
+
+    with tf.device("CPU"):
+        test = test.map(functools.partial(decode_fn, **params)).batch(batch).prefetch(batch)
+
+    if distributed.num_workers(strategy) > 1:
+        model = train_distributed(strategy, ds_info, batch, decode_fn, params, input_shape, epochs=200)
+        if distributed.is_chief(strategy):
+            test_results(model, test)
+        return
+
+    # time blocked on input vs. in the train step, per stage latencies (python stages can not run on
+    # tf.data service workers), written to step_timing.jsonl & summarized in tensorflow.log per epoch
+    stats = step_timing.PipelineStats(time_stages=DATA_SERVICE is None)
+
     with tf.device("CPU"):
-        train = train.map(functools.partial(decoders.decode_video_segment, num_segments=segments)).batch(batch).prefetch(batch)
-        train = train.map(lambda ex : (ex["video"], tf.one_hot(ex["label"], depth=6)))
-        
-        val = val.map(functools.partial(decoders.decode_video_segment, num_segments=segments)).batch(batch).prefetch(batch)
+        if CLIP_STORE is not None and DATA_SERVICE is None:
+            store, source = clip_store_root(), clip_store.source(ds_info)
+            train = clip_store.load(
+                clip_store.get_or_export(train, store, "train", params, decode_fn=decode_fn, source=source), batch, shuffle=True
+            )
+            val = clip_store.load(
+                clip_store.get_or_export(val, store, "validation", params, decode_fn=decode_fn, source=source), batch
+            )
+        else:
+            train = stats.map(train, functools.partial(decode_fn, **params), "decode").batch(batch).prefetch(batch)
+            val = val.map(functools.partial(decode_fn, **params)).batch(batch).prefetch(batch)
+
+        train = stats.map(train, lambda ex : (ex["video"], tf.one_hot(ex["label"], depth=6)), "one_hot")
         val = val.map(lambda ex : (ex["video"], tf.one_hot(ex["label"], depth=6)))
-        
-        test = test.map(functools.partial(decoders.decode_video_segment, num_segments=segments)).batch(batch).prefetch(batch)
-        
-    input_shape = (batch, segments, 240, 320, 3)
 
-    model = models.ConvLSTM2D_a(input_shape)
+        if DATA_SERVICE is not None:
+            train = data_service.distribute(train, DATA_SERVICE)
+            val = data_service.distribute(val, DATA_SERVICE)
+
+        train = stats.deliver(train)
+
+    model = models.ConvLSTM2D_a(input_shape, mixed_precision=MIXED_PRECISION, jit_compile=JIT_COMPILE)
     model.build_graph(input_shape)
     model.compile(optimizer="Adam", loss="categorical_crossentropy", metrics=["accuracy"])
     
@@ -93,7 +285,7 @@ def main():
             # ),
             ## Save checkpoints ##
             tf.keras.callbacks.ModelCheckpoint(
-                Path.cwd() / "ckpt",  # file path/name to save the model
+                Path.cwd() / "ckpt.weights.h5",  # file path/name to save the model
                 monitor="val_loss",
                 verbose=0,
                 save_best_only=True,
@@ -101,29 +293,28 @@ def main():
                 mode="auto",
                 save_freq="epoch",  # If save_freq is an integer, it will save after n batches (not epochs)
             ),
-            tf.keras.callbacks.TensorBoard()
+            tf.keras.callbacks.TensorBoard(),
+            step_timing.StepTimer(stats, Path.cwd() / "step_timing.jsonl"),
         ],
     )
     
-    with open('submission_video.csv', "w") as f:
-        f.write("id,gesture\n")
+    test_results(model, test)
+
+    del model
 
-        for batch in test.as_numpy_iterator():
-            results = model.predict(batch["video"])
-            
-            for example, result in zip(batch["id"], results):               
-                f.write(f"{str(example.decode('utf-8'))},{np.argmax(result)}\n")
+
+def test_results(model, test):
+    # one pass: submission + test set metrics
+    results = inference.run(
+        model, test, inputs="video", num_classes=6, labels="label", submission="submission_video.csv"
+    )
 
     print('predictions complete')
     
     print('test set results')
-    with tf.device("CPU"):
-        test = test.map(lambda ex : (ex["video"], tf.one_hot(ex["label"], depth=6)))
-    
-    test_metrics = model.evaluate(test)
-    print(f"loss={test_metrics[0]}\taccuracy={test_metrics[1]}")
-    
-    del model            
+    print(f"loss={results['loss']}\taccuracy={results['accuracy']}")
+    print(results["confusion_matrix"])
+
 
 if __name__ == "__main__":
     